@@ -0,0 +1,451 @@
+"""
+ad_archive.py
+Hot/cold split of competitor_ads.
+
+Ads that ended more than ARCHIVE_AFTER_DAYS ago are moved out of
+competitor_ads into `archived_ads` at the end of every ingest, so the hot
+table — which brand snapshots, the facet index, the vector index and the
+count triggers all work over — grows with live activity, not with history.
+
+An archived row keeps the columns that ads are filtered, sorted and
+aggregated on as plain columns, so totals, date-range pruning and rollup
+rebuilds never decompress anything. Everything else (headline, body copy,
+CTA, confidences, ...) is one zlib-compressed JSON payload per row, expanded
+only for rows actually returned. A single ad's payload is too small for
+zlib to find much repetition on its own, so payloads are compressed against
+a preset dictionary sampled from archived payloads (`archive_dictionaries`,
+content-addressed and immutable); that is worth roughly 3x over plain
+per-row zlib on the mock data.
+
+Archived ads keep their contribution to every aggregate:
+  - `archived_filter_counts` (ad_counts) keeps /api/ads totals exact;
+  - `archived_ad_rollup` and `archived_weekly_spend` hold what
+    brand_snapshot would have derived from the rows — counts per label and
+    days_running, spend sums, weekly spend — folded in when they move;
+  - the `all_ads` view (plain columns of both tables) feeds the sketch,
+    sample and anomaly rebuilds;
+  - ad_spend_history never depended on the rows.
+
+Readers decide per query whether the archive is needed. Every archived ad
+ended on or before `horizon()`, so a date range that starts after it is
+answered from the hot table alone.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+from datetime import date, timedelta
+from typing import Any, Iterable
+
+import ad_batch
+import weekly_spend
+
+# <= 0 disables archiving
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+COMPRESSION_LEVEL = 9
+# zlib's window: a longer preset dictionary would not be seen
+DICT_BYTES = 32 * 1024
+
+# Kept as real columns: filters, sort keys, rollup inputs, dedup
+PLAIN_COLUMNS: tuple[str, ...] = (
+    "ad_id", "competitor_name", "brand", "vertical", "ad_format",
+    "message_theme", "emotional_tone", "estimated_spend_min", "estimated_spend_max",
+    "start_date", "end_date", "is_active", "days_running", "source",
+    "content_hash", "created_at",
+)
+# Everything else competitor_ads holds, compressed together
+PAYLOAD_COLUMNS: tuple[str, ...] = tuple(c for c in ad_batch.COLUMNS if c not in PLAIN_COLUMNS)
+# competitor_ads column order, for rows rebuilt from the archive
+AD_COLUMNS: tuple[str, ...] = (*ad_batch.COLUMNS, "created_at")
+
+# Columns that the all_ads view exposes from both tables
+_VIEW_COLUMNS = ", ".join(PLAIN_COLUMNS)
+
+# Rollup key; NULL labels are stored as '' like ad_counts
+_ROLLUP_KEY = (
+    "brand", "competitor_name", "vertical", "ad_format",
+    "message_theme", "emotional_tone", "days_running",
+)
+
+CREATE_ARCHIVE_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS archived_ads (
+        ad_id               TEXT PRIMARY KEY,
+        competitor_name     TEXT,
+        brand               TEXT,
+        vertical            TEXT,
+        ad_format           TEXT,
+        message_theme       TEXT,
+        emotional_tone      TEXT,
+        estimated_spend_min INTEGER,
+        estimated_spend_max INTEGER,
+        start_date          TEXT,
+        end_date            TEXT,
+        is_active           INTEGER NOT NULL DEFAULT 0,
+        days_running        INTEGER,
+        source              TEXT,
+        content_hash        TEXT,
+        created_at          TEXT,
+        archived_at         TEXT NOT NULL DEFAULT (datetime('now')),
+        dict_id             TEXT NOT NULL REFERENCES archive_dictionaries(id),
+        payload_z           BLOB NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS archive_dictionaries (
+        id          TEXT PRIMARY KEY,     -- blake2b of the dictionary
+        zdict_z     BLOB NOT NULL,
+        size        INTEGER NOT NULL,
+        created_at  TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_archived_end_date ON archived_ads(end_date);",
+    "CREATE INDEX IF NOT EXISTS idx_archived_start_date ON archived_ads(start_date);",
+    "CREATE INDEX IF NOT EXISTS idx_archived_days ON archived_ads(days_running);",
+    "CREATE INDEX IF NOT EXISTS idx_archived_spend_max ON archived_ads(estimated_spend_max);",
+    f"""
+    CREATE TABLE IF NOT EXISTS archived_ad_rollup (
+        brand            TEXT NOT NULL,
+        competitor_name  TEXT NOT NULL,
+        vertical         TEXT NOT NULL,
+        ad_format        TEXT NOT NULL,
+        message_theme    TEXT NOT NULL,
+        emotional_tone   TEXT NOT NULL,
+        days_running     INTEGER NOT NULL,
+        n                INTEGER NOT NULL,
+        spend_sum        REAL NOT NULL,    -- sum of (min + max) / 2
+        PRIMARY KEY ({", ".join(_ROLLUP_KEY)})
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS archived_weekly_spend (
+        brand       TEXT NOT NULL,
+        week_start  INTEGER NOT NULL,   -- day number of the Monday
+        spend       REAL NOT NULL,
+        ad_count    INTEGER NOT NULL,
+        PRIMARY KEY (brand, week_start)
+    ) WITHOUT ROWID;
+    """,
+    f"""
+    CREATE VIEW IF NOT EXISTS all_ads AS
+        SELECT {_VIEW_COLUMNS} FROM competitor_ads
+        UNION ALL
+        SELECT {_VIEW_COLUMNS} FROM archived_ads;
+    """,
+]
+
+
+# ---------------------------------------------------------------------------
+# Encoding helpers
+# ---------------------------------------------------------------------------
+
+# Dictionaries never change once written, so their id is a safe cache key
+_dicts: dict[str, bytes] = {}
+
+
+def _payload(row: sqlite3.Row) -> bytes:
+    return json.dumps({c: row[c] for c in PAYLOAD_COLUMNS}, separators=(",", ":")).encode()
+
+
+def _dictionary(conn: sqlite3.Connection, payloads: list[bytes]) -> tuple[str, bytes]:
+    """
+    The newest dictionary, or a new one sampled from `payloads` when that
+    would be larger (until dictionaries reach DICT_BYTES, then they are
+    reused). zlib matches best near the end, so the sample is the tail.
+    """
+    sample = b"".join(payloads)[-DICT_BYTES:]
+    latest = conn.execute(
+        "SELECT id, size FROM archive_dictionaries ORDER BY rowid DESC LIMIT 1;"
+    ).fetchone()
+    if latest is not None and latest[1] >= len(sample):
+        return latest[0], _load_dictionary(conn, latest[0])
+    dict_id = hashlib.blake2b(sample, digest_size=16).hexdigest()
+    conn.execute(
+        "INSERT OR IGNORE INTO archive_dictionaries (id, zdict_z, size) VALUES (?, ?, ?);",
+        [dict_id, zlib.compress(sample, COMPRESSION_LEVEL), len(sample)],
+    )
+    _dicts[dict_id] = sample
+    return dict_id, sample
+
+
+def _load_dictionary(conn: sqlite3.Connection, dict_id: str) -> bytes:
+    zdict = _dicts.get(dict_id)
+    if zdict is None:
+        row = conn.execute(
+            "SELECT zdict_z FROM archive_dictionaries WHERE id = ?;", [dict_id]
+        ).fetchone()
+        zdict = _dicts[dict_id] = zlib.decompress(row[0])
+    return zdict
+
+
+def _compressor(zdict: bytes) -> Any:
+    """A compressor primed with `zdict`; copy() it per payload (cheaper than re-priming)."""
+    return zlib.compressobj(COMPRESSION_LEVEL, zdict=zdict)
+
+
+def _compress(primed: Any, payload: bytes) -> bytes:
+    c = primed.copy()
+    return c.compress(payload) + c.flush()
+
+
+def _expand(
+    conn: sqlite3.Connection, plain: dict[str, Any], dict_id: str, payload_z: bytes
+) -> dict[str, Any]:
+    """A competitor_ads-shaped dict from an archived row."""
+    d = zlib.decompressobj(zdict=_load_dictionary(conn, dict_id))
+    row = {**plain, **json.loads(d.decompress(payload_z) + d.flush())}
+    return {c: row.get(c) for c in AD_COLUMNS}
+
+
+# ---------------------------------------------------------------------------
+# Rollups
+# ---------------------------------------------------------------------------
+
+def _fold(conn: sqlite3.Connection, rows: list[sqlite3.Row], sign: int) -> None:
+    """Add (sign=1) or remove (sign=-1) rows' contribution to the rollups."""
+    import numpy as np  # heavy; deferred so startup doesn't pay for it
+
+    groups: dict[tuple, list[float]] = {}
+    by_brand: dict[str, list[tuple[int, int, float]]] = {}
+    for r in rows:
+        mid = ((r["estimated_spend_min"] or 0) + (r["estimated_spend_max"] or 0)) / 2.0
+        key = tuple(
+            (r[c] or 0) if c == "days_running" else (r[c] or "") for c in _ROLLUP_KEY
+        )
+        acc = groups.setdefault(key, [0, 0.0])
+        acc[0] += sign
+        acc[1] += sign * mid
+        if r["start_day"] is not None:
+            by_brand.setdefault(r["brand"] or "", []).append((r["start_day"], r["end_day"], mid))
+
+    conn.executemany(
+        f"""
+        INSERT INTO archived_ad_rollup ({", ".join(_ROLLUP_KEY)}, n, spend_sum)
+        VALUES ({", ".join("?" * (len(_ROLLUP_KEY) + 2))})
+        ON CONFLICT ({", ".join(_ROLLUP_KEY)}) DO UPDATE SET
+            n = n + excluded.n, spend_sum = spend_sum + excluded.spend_sum;
+        """,
+        [(*key, n, spend) for key, (n, spend) in groups.items()],
+    )
+    conn.execute("DELETE FROM archived_ad_rollup WHERE n <= 0;")
+
+    for brand, spans in by_brand.items():
+        starts, ends, daily = (np.array(col) for col in zip(*spans))
+        origin, spend, counts = weekly_spend.spread_intervals(starts, ends, daily)
+        conn.executemany(
+            """
+            INSERT INTO archived_weekly_spend (brand, week_start, spend, ad_count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (brand, week_start) DO UPDATE SET
+                spend = spend + excluded.spend, ad_count = ad_count + excluded.ad_count;
+            """,
+            [
+                (brand, origin + i * 7, sign * float(spend[i]), sign * int(counts[i]))
+                for i in range(len(spend))
+                if counts[i]
+            ],
+        )
+    conn.execute("DELETE FROM archived_weekly_spend WHERE ad_count <= 0;")
+
+
+_ROLLUP_SOURCE_SQL = f"""
+    SELECT {_VIEW_COLUMNS},
+           CAST(julianday(start_date) - 2440587.5 AS INTEGER) AS start_day,
+           CAST(julianday(end_date) - 2440587.5 AS INTEGER)   AS end_day
+    FROM {{table}} {{where}};
+"""
+
+
+def rebuild_rollups(conn: sqlite3.Connection) -> None:
+    """Recompute both rollups from archived_ads' plain columns. Caller commits."""
+    conn.execute("DELETE FROM archived_ad_rollup;")
+    conn.execute("DELETE FROM archived_weekly_spend;")
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    _fold(conn, cur.execute(_ROLLUP_SOURCE_SQL.format(table="archived_ads", where="")).fetchall(), 1)
+
+
+# ---------------------------------------------------------------------------
+# Moving rows
+# ---------------------------------------------------------------------------
+
+def archive_ended(
+    conn: sqlite3.Connection,
+    today: date | None = None,
+    after_days: int = ARCHIVE_AFTER_DAYS,
+) -> int:
+    """
+    Move ads that ended more than `after_days` ago into the archive. Runs in
+    the caller's transaction; the caller bumps data_version and commits.
+    """
+    if after_days <= 0:
+        return 0
+    cutoff = ((today or date.today()) - timedelta(days=after_days)).isoformat()
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    rows = cur.execute(
+        f"""
+        SELECT {", ".join(AD_COLUMNS)},
+               CAST(julianday(start_date) - 2440587.5 AS INTEGER) AS start_day,
+               CAST(julianday(end_date) - 2440587.5 AS INTEGER)   AS end_day
+        FROM competitor_ads
+        WHERE is_active = 0 AND end_date < ?;
+        """,
+        [cutoff],
+    ).fetchall()
+    if not rows:
+        return 0
+
+    payloads = [_payload(r) for r in rows]
+    dict_id, zdict = _dictionary(conn, payloads)
+    primed = _compressor(zdict)
+    conn.executemany(
+        f"""
+        INSERT INTO archived_ads ({_VIEW_COLUMNS}, dict_id, payload_z)
+        VALUES ({", ".join("?" * (len(PLAIN_COLUMNS) + 2))});
+        """,
+        (
+            (*(r[c] for c in PLAIN_COLUMNS), dict_id, _compress(primed, payload))
+            for r, payload in zip(rows, payloads)
+        ),
+    )
+    ids = [(r["ad_id"],) for r in rows]
+    conn.executemany("DELETE FROM competitor_ads WHERE ad_id = ?;", ids)
+    # Relabelling an archived ad would be wasted work
+    conn.executemany("DELETE FROM enrichment_queue WHERE ad_id = ?;", ids)
+    _fold(conn, rows, 1)
+    return len(rows)
+
+
+def restore(conn: sqlite3.Connection, ad_ids: Iterable[str]) -> int:
+    """
+    Take ads back out of the archive (an ingest saw them change) so they can
+    be re-inserted into competitor_ads. Caller commits.
+    """
+    ids = list(ad_ids)
+    if not ids:
+        return 0
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    rows = [
+        r
+        for i in range(0, len(ids), 500)
+        for r in cur.execute(
+            _ROLLUP_SOURCE_SQL.format(
+                table="archived_ads",
+                where=f"WHERE ad_id IN ({','.join('?' * len(ids[i:i + 500]))})",
+            ),
+            ids[i:i + 500],
+        ).fetchall()
+    ]
+    _fold(conn, rows, -1)
+    conn.executemany("DELETE FROM archived_ads WHERE ad_id = ?;", [(r["ad_id"],) for r in rows])
+    return len(rows)
+
+
+def clear(conn: sqlite3.Connection, source: str) -> int:
+    """Drop archived ads from one source (clear_existing) and recompute rollups."""
+    deleted = conn.execute("DELETE FROM archived_ads WHERE source = ?;", [source]).rowcount
+    if deleted:
+        rebuild_rollups(conn)
+    return deleted
+
+
+# ---------------------------------------------------------------------------
+# Reads
+# ---------------------------------------------------------------------------
+
+def horizon(conn: sqlite3.Connection) -> str | None:
+    """Latest end_date in the archive (an index lookup), or None when empty."""
+    return conn.execute("SELECT MAX(end_date) FROM archived_ads;").fetchone()[0]
+
+
+def needed(conn: sqlite3.Connection, since: date | None) -> bool:
+    """Whether ads running on or after `since` (all ads if None) may be archived."""
+    latest = horizon(conn)
+    return latest is not None and (since is None or since.isoformat() <= latest)
+
+
+def stored_hashes(conn: sqlite3.Connection, ad_ids: list[str]) -> dict[str, str | None]:
+    """ad_id → content_hash for the given ids that are archived."""
+    return {
+        ad_id: content_hash
+        for i in range(0, len(ad_ids), 500)
+        for ad_id, content_hash in conn.execute(
+            f"SELECT ad_id, content_hash FROM archived_ads "
+            f"WHERE ad_id IN ({','.join('?' * len(ad_ids[i:i + 500]))});",
+            ad_ids[i:i + 500],
+        )
+    }
+
+
+def fetch(
+    conn: sqlite3.Connection,
+    where: str,
+    params: list[Any],
+    limit: int,
+    order: str = "start_date DESC",
+) -> list[dict]:
+    """
+    Archived ads matching a WHERE over plain columns (newest start first by
+    default), expanded to the same dicts /api/ads returns.
+    """
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute(
+        f"SELECT {_VIEW_COLUMNS}, dict_id, payload_z FROM archived_ads {where} "
+        f"ORDER BY {order} LIMIT ?;",
+        [*params, limit],
+    )
+    out = []
+    for row in cur:
+        d = _expand(conn, dict(zip(PLAIN_COLUMNS, row)), row[-2], row[-1])
+        d["is_active"] = False
+        out.append(d)
+    return out
+
+
+def get(conn: sqlite3.Connection, ad_id: str) -> dict[str, Any] | None:
+    rows = fetch(conn, "WHERE ad_id = ?", [ad_id], 1)
+    return rows[0] if rows else None
+
+
+def rollup(conn: sqlite3.Connection, brand: str | None) -> list[sqlite3.Row]:
+    """Archived contribution per (labels, days_running) for brand_snapshot."""
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    return cur.execute(
+        f"""
+        SELECT {", ".join(f"NULLIF({c}, '') AS {c}" if c != "days_running" else c
+                          for c in _ROLLUP_KEY)}, n, spend_sum
+        FROM archived_ad_rollup {"WHERE brand = ?" if brand else ""};
+        """,
+        [brand] if brand else [],
+    ).fetchall()
+
+
+def weekly(conn: sqlite3.Connection, brand: str | None) -> dict[int, tuple[float, int]]:
+    """Archived spend and ad count per week (summed over brands when None)."""
+    return {
+        ws: (spend, count)
+        for ws, spend, count in conn.execute(
+            f"""
+            SELECT week_start, SUM(spend), SUM(ad_count) FROM archived_weekly_spend
+            {"WHERE brand = ?" if brand else ""} GROUP BY week_start;
+            """,
+            [brand] if brand else [],
+        )
+    }
+
+
+def top(conn: sqlite3.Connection, brand: str | None, column: str, n: int) -> list[dict]:
+    """The `n` archived ads with the largest `column` (days_running or spend max)."""
+    assert column in ("days_running", "estimated_spend_max")
+    return fetch(
+        conn, "WHERE brand = ?" if brand else "", [brand] if brand else [], n, f"{column} DESC"
+    )
+
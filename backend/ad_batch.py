@@ -0,0 +1,302 @@
+"""
+ad_batch.py
+Columnar container for ad records on the ingest path.
+
+An AdRecordBatch stores one array per column instead of one dict per ad.
+Low-cardinality text columns (competitor, brand, theme, headline, dates,
+...) are interned: each value is stored once in the column's vocabulary and
+rows hold a small integer code in an `array('I')`. Numeric columns are
+typed `array`s. Only the genuinely unique columns (id, ad_id, content_hash)
+are plain lists of strings.
+
+`batch[i]` returns an AdRow — a two-slot view that reads through to the
+columns — so code written against `rec["brand"]` keeps working without a
+dict being built per row. Bulk inserts use `batch.rows(columns)`, which
+yields plain tuples for `executemany`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from array import array
+from collections import Counter
+from datetime import date
+from itertools import islice
+from operator import itemgetter
+from typing import Any, Iterable, Iterator, Mapping
+
+# Record fields in competitor_ads column order (generated id/created_at excluded)
+COLUMNS: tuple[str, ...] = (
+    "id", "ad_id", "competitor_name", "competitor_page_id",
+    "brand", "vertical", "ad_format", "message_theme", "emotional_tone",
+    "headline", "body_text", "cta", "platform",
+    "estimated_spend_min", "estimated_spend_max",
+    "start_date", "end_date", "is_active", "days_running",
+    "num_cards", "country", "source",
+    "theme_confidence", "tone_confidence", "label_source",
+    "content_hash",
+)
+
+# The ad as the source ships it; content_hash covers exactly these, so a
+# re-ingest that leaves them alone is a no-op. days_running grows by one a
+# day while an ad runs, and label confidence and provenance are derived here,
+# so none of those are hashed.
+CONTENT_FIELDS: tuple[str, ...] = (
+    "competitor_name", "brand", "ad_format", "message_theme", "emotional_tone",
+    "headline", "body_text", "estimated_spend_min", "estimated_spend_max",
+    "start_date", "end_date", "is_active",
+)
+# What an ingest that does write an existing ad may change (identity columns
+# such as id and page_id are kept)
+UPDATE_FIELDS: tuple[str, ...] = (
+    *CONTENT_FIELDS, "days_running", "theme_confidence", "tone_confidence", "label_source",
+)
+# Labels that LLM enrichment may have replaced after ingest
+LABEL_FIELDS: tuple[str, ...] = (
+    "message_theme", "emotional_tone", "theme_confidence", "tone_confidence", "label_source",
+)
+
+
+def days_running_sql(prefix: str = "") -> str:
+    """
+    Current days_running as an SQL expression; bind today's ISO date to its
+    `?`. The stored value is as of the ad's last write, which for an active
+    ad is no longer today.
+    """
+    return (
+        f"CASE WHEN {prefix}is_active AND {prefix}start_date IS NOT NULL "
+        f"THEN CAST(julianday(?) - julianday({prefix}start_date) AS INTEGER) "
+        f"ELSE {prefix}days_running END"
+    )
+
+
+def current_days_running(ad: Mapping[str, Any], today: date) -> int | None:
+    """days_running_sql for a row already read."""
+    if ad["is_active"] and ad["start_date"]:
+        return (today - date.fromisoformat(ad["start_date"])).days
+    return ad["days_running"]
+
+
+_PLAIN = {"id", "ad_id", "content_hash"}
+_INTEGER = {"estimated_spend_min", "estimated_spend_max", "days_running", "num_cards"}
+_REAL = {"theme_confidence", "tone_confidence"}
+_BOOL = {"is_active"}
+_INTERNED = set(COLUMNS) - _PLAIN - _INTEGER - _REAL - _BOOL
+
+# Typed arrays can't hold None; these sentinels stand in for NULL
+_NULL_INT = -(2**63)
+_NULL_REAL = float("nan")
+
+_ALL_FIELDS = itemgetter(*COLUMNS)
+
+_DEFAULTS: dict[str, Any] = {
+    "theme_confidence": 1.0,
+    "tone_confidence": 1.0,
+    "label_source": "source",  # ad_classifier.SOURCE_LABELED
+    "source": "mock",
+}
+
+
+class AdRow:
+    """Read/write view of one row of an AdRecordBatch."""
+
+    __slots__ = ("_batch", "_i")
+
+    def __init__(self, batch: AdRecordBatch, i: int) -> None:
+        self._batch = batch
+        self._i = i
+
+    def __getitem__(self, name: str) -> Any:
+        return self._batch.value(name, self._i)
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        self._batch.set(self._i, name, value)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(COLUMNS)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        value = self[name] if name in self._batch.columns else None
+        return default if value is None else value
+
+    def to_dict(self) -> dict[str, Any]:
+        return {name: self[name] for name in COLUMNS}
+
+
+class AdRecordBatch:
+    def __init__(self) -> None:
+        self.columns: dict[str, Any] = {}
+        self._vocab: dict[str, list[Any]] = {}
+        self._codes: dict[str, dict[Any, int]] = {}
+        for name in COLUMNS:
+            if name in _PLAIN:
+                self.columns[name] = []
+            elif name in _INTEGER:
+                self.columns[name] = array("q")
+            elif name in _REAL:
+                self.columns[name] = array("d")
+            elif name in _BOOL:
+                self.columns[name] = array("b")
+            else:
+                self.columns[name] = array("I")
+                self._vocab[name] = []
+                self._codes[name] = {}
+
+    def __len__(self) -> int:
+        return len(self.columns["ad_id"])
+
+    def __getitem__(self, i: int) -> AdRow:
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return AdRow(self, i % len(self))
+
+    def __iter__(self) -> Iterator[AdRow]:
+        for i in range(len(self)):
+            yield AdRow(self, i)
+
+    # -- encoding ------------------------------------------------------------
+
+    def _code(self, name: str, value: Any) -> int:
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._vocab[name])
+            self._vocab[name].append(value)
+        return code
+
+    def _encode(self, name: str, value: Any) -> Any:
+        if name in _INTERNED:
+            return self._code(name, value)
+        if name in _INTEGER:
+            return _NULL_INT if value is None else int(value)
+        if name in _REAL:
+            return _NULL_REAL if value is None else float(value)
+        if name in _BOOL:
+            return 1 if value else 0
+        return value
+
+    def value(self, name: str, i: int) -> Any:
+        raw = self.columns[name][i]
+        if name in _INTERNED:
+            return self._vocab[name][raw]
+        if name in _INTEGER:
+            return None if raw == _NULL_INT else raw
+        if name in _REAL:
+            return None if raw != raw else raw  # NaN is NULL
+        if name in _BOOL:
+            return bool(raw)
+        return raw
+
+    # -- building ------------------------------------------------------------
+
+    def append(self, **fields: Any) -> None:
+        """Add one record; missing fields take their default (or NULL)."""
+        for name in COLUMNS:
+            value = fields.get(name, _DEFAULTS.get(name))
+            self.columns[name].append(self._encode(name, value))
+
+    def extend(self, records: Iterable[Mapping[str, Any]]) -> None:
+        """Bulk append, encoded a column at a time rather than a field at a time."""
+        records = list(records)
+        if not records:
+            return
+        try:
+            # Transpose in C when every record carries every field
+            by_column = zip(*map(_ALL_FIELDS, records))
+        except KeyError:
+            by_column = (
+                [rec.get(name, _DEFAULTS.get(name)) for rec in records] for name in COLUMNS
+            )
+        for name, values in zip(COLUMNS, by_column):
+            col = self.columns[name]
+            if name in _INTERNED:
+                codes = self._codes[name]
+                for value in set(values).difference(codes):
+                    self._code(name, value)
+                col.fromlist(list(map(codes.__getitem__, values)))
+            elif name in _INTEGER:
+                col.fromlist([_NULL_INT if v is None else int(v) for v in values])
+            elif name in _REAL:
+                col.fromlist([_NULL_REAL if v is None else float(v) for v in values])
+            elif name in _BOOL:
+                col.fromlist([1 if v else 0 for v in values])
+            else:
+                col.extend(values)
+
+    @classmethod
+    def from_records(
+        cls, records: Iterable[Mapping[str, Any]], chunk: int = 10_000
+    ) -> AdRecordBatch:
+        """Build from mappings, holding at most `chunk` of them at a time."""
+        batch = cls()
+        records = iter(records)
+        while pending := list(islice(records, chunk)):
+            batch.extend(pending)
+        return batch
+
+    def set(self, i: int, name: str, value: Any) -> None:
+        self.columns[name][i] = self._encode(name, value)
+
+    def take(self, indices: Iterable[int]) -> AdRecordBatch:
+        """New batch with the given rows; vocabularies are shared, not copied."""
+        out = AdRecordBatch.__new__(AdRecordBatch)
+        out._vocab, out._codes = self._vocab, self._codes
+        idx = list(indices)
+        out.columns = {}
+        for name, col in self.columns.items():
+            picked = [col[i] for i in idx]
+            out.columns[name] = picked if isinstance(col, list) else array(col.typecode, picked)
+        return out
+
+    # -- reading -------------------------------------------------------------
+
+    def column(self, name: str) -> list[Any]:
+        """Decoded values of one column."""
+        if name in _INTERNED:
+            vocab = self._vocab[name]
+            return [vocab[c] for c in self.columns[name]]
+        return [self.value(name, i) for i in range(len(self))]
+
+    def value_counts(self, name: str) -> dict[Any, int]:
+        """Per-value row counts, computed on the codes without decoding rows."""
+        if name not in _INTERNED:
+            return dict(Counter(self.column(name)))
+        vocab = self._vocab[name]
+        return {vocab[c]: n for c, n in Counter(self.columns[name]).most_common()}
+
+    def _decoded(self, name: str, start: int, stop: int) -> list[Any]:
+        col = self.columns[name]
+        if name in _INTERNED:
+            return list(map(self._vocab[name].__getitem__, col[start:stop]))
+        if name in _INTEGER:
+            return [None if v == _NULL_INT else v for v in col[start:stop]]
+        if name in _REAL:
+            return [None if v != v else v for v in col[start:stop]]
+        return col[start:stop]  # plain lists; is_active stays 0/1 as SQLite stores it
+
+    def hash_content(self) -> list[str]:
+        """
+        Fill content_hash for every row from CONTENT_FIELDS and return it.
+        Values are hashed decoded, so a row read back from SQLite hashes the
+        same as the record that wrote it.
+        """
+        columns = [self._decoded(name, 0, len(self)) for name in CONTENT_FIELDS]
+        is_active = CONTENT_FIELDS.index("is_active")
+        hashes = []
+        for values in zip(*columns):
+            values = list(values)
+            values[is_active] = bool(values[is_active])
+            # repr of str/int/float/bool/None is stable across Python versions
+            digest = hashlib.blake2b(repr(values).encode(), digest_size=16)
+            hashes.append(digest.hexdigest())
+        self.columns["content_hash"] = hashes
+        return hashes
+
+    def rows(
+        self, names: Iterable[str] = COLUMNS, chunk: int = 10_000
+    ) -> Iterator[tuple[Any, ...]]:
+        """Decoded tuples for executemany, built a chunk of columns at a time."""
+        names = tuple(names)
+        for start in range(0, len(self), chunk):
+            stop = min(start + chunk, len(self))
+            yield from zip(*(self._decoded(name, start, stop) for name in names))
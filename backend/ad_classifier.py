@@ -0,0 +1,362 @@
+"""
+ad_classifier.py
+Local, CPU-only labelling of message_theme and emotional_tone.
+
+Scraped ads arrive without the labels generate_mock_ads assigns. Instead of
+one LLM call per ad, two softmax-regression heads (theme, tone) share the
+hashed unigram+bigram features from ad_vectors and label a whole ingest
+batch with a couple of matrix products.
+
+Training corpus: the mock COPY_BANK, the curated examples below and the
+labelled rows already in `competitor_ads` (labels shipped with the record,
+or written back by LLM enrichment), one example per distinct text. So every
+enriched ad teaches the model, and the share of ads it has to route falls
+as the corpus grows. The model is trained at first use, and again in the
+background once RETRAIN_MIN_NEW more labelled rows exist.
+
+Thresholds are calibrated, not fixed. Cross-validation on the corpus gives
+held-out predictions; each head's threshold is the lowest confidence at
+which those were right at least CALIBRATION_TARGET of the time. Every label
+is stored with the model's probability for it, and ads where either head
+falls below its threshold are put on `enrichment_queue` so only those are
+sent on for LLM enrichment. `evaluate` and `check_quality` measure accuracy
+and routed share on held-out ads against a fixed band (bench.py
+ad_classifier runs it).
+"""
+
+from __future__ import annotations
+
+import random
+import sqlite3
+import threading
+from typing import TYPE_CHECKING, Any, Iterable
+
+import ad_vectors
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from ad_batch import AdRecordBatch
+
+TRAIN_ITERATIONS = 300
+LEARNING_RATE = 2.0
+L2 = 1e-4
+
+# Each head's threshold: held-out predictions at or above it were right this often
+CALIBRATION_TARGET = 0.8
+CALIBRATION_FOLDS = 3
+# Fewest held-out predictions a threshold may rest on
+MIN_CALIBRATION_SUPPORT = 5
+
+# Training cost grows with the corpus; the newest labelled rows are kept
+MAX_TRAINING_EXAMPLES = 1000
+RETRAIN_MIN_NEW = 100
+
+# Band for check_quality: labels kept without the LLM must be right this
+# often, and at most this share of ads may be routed
+QUALITY_MIN_ACCURACY = 0.95
+QUALITY_MAX_ROUTED = 0.35
+
+# Where a label came from: shipped with the record, or predicted here
+SOURCE_LABELED = "source"
+SOURCE_CLASSIFIER = "classifier"
+# Labels worth learning from ("llm" is enrichment.SOURCE_LLM)
+TRAINING_SOURCES = (SOURCE_LABELED, "llm")
+
+
+class ClassifierQualityError(AssertionError):
+    """Held-out accuracy or routed share is outside the quality band."""
+
+CREATE_QUEUE_SQL = """
+CREATE TABLE IF NOT EXISTS enrichment_queue (
+    ad_id      TEXT PRIMARY KEY,
+    reason     TEXT NOT NULL,
+    queued_at  TEXT NOT NULL DEFAULT (datetime('now'))
+);
+"""
+
+# Hand-labelled copy in the style of real scraped ads, complementing the
+# templated COPY_BANK: (text, message_theme, emotional_tone)
+CURATED_EXAMPLES: list[tuple[str, str, str]] = [
+    ("Bald spots spreading? Minoxidil 5% with biotin, see regrowth in 90 days", "hair_loss", "fear"),
+    ("Doctor-formulated hair growth kit, 2 lakh reviews, 4.5 stars", "hair_loss", "trust"),
+    ("No more afternoon slump. Natural energy gummies with B12 and ginseng", "energy", "aspiration"),
+    ("Running on empty? Your iron levels might be why you're always tired", "energy", "fear"),
+    ("Build your family's immunity this winter with vitamin C and zinc", "immunity", "aspiration"),
+    ("Kids falling sick every month? Boost their immunity before school reopens", "immunity", "fear"),
+    ("Lose 5 kg in 8 weeks with our metabolism-boosting apple cider vinegar tablets", "weight", "aspiration"),
+    ("Sale ends tonight: weight management combo at 50% off", "weight", "urgency"),
+    ("Last longer in bed, naturally. Ayurvedic stamina capsules for men", "performance", "aspiration"),
+    ("Trusted by 1 lakh men: clinically tested testosterone support", "performance", "trust"),
+    ("Clear skin, confident you. Acne care routine dermatologists love", "confidence", "aspiration"),
+    ("Thousands of women switched to our glow serum — join them", "confidence", "social_proof"),
+    ("Is your baby getting enough DHA? Pediatrician-recommended nutrition drops", "parenting", "fear"),
+    ("New moms swear by this lactation supplement — over 50,000 happy parents", "parenting", "social_proof"),
+    ("Tear-free, pH 5.5 baby wash, dermatologically tested and safe for newborns", "safety", "trust"),
+    ("Toxin-free diapers: only 100 packs left at launch price", "safety", "urgency"),
+    ("Diaper rash? Not on our watch. Our cream is the bottom line", "safety", "humor"),
+    ("Your gym buddy is jealous of your energy. We're not sorry", "energy", "humor"),
+]
+
+
+# ---------------------------------------------------------------------------
+# Model
+# ---------------------------------------------------------------------------
+
+def _features(texts: list[str]) -> np.ndarray:
+    return ad_vectors.normalize(ad_vectors.hashed_tf(texts))
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+class _Head:
+    """Multinomial logistic regression trained by full-batch gradient descent."""
+
+    def __init__(self, x: np.ndarray, labels: list[str]) -> None:
+        import numpy as np
+
+        self.classes = sorted(set(labels))
+        index = {c: i for i, c in enumerate(self.classes)}
+        y = np.zeros((len(labels), len(self.classes)), dtype=np.float32)
+        y[np.arange(len(labels)), [index[l] for l in labels]] = 1.0
+
+        self.w = np.zeros((x.shape[1], len(self.classes)), dtype=np.float32)
+        self.b = np.zeros(len(self.classes), dtype=np.float32)
+        for _ in range(TRAIN_ITERATIONS):
+            grad = (_softmax(x @ self.w + self.b) - y) / len(labels)
+            self.w -= LEARNING_RATE * (x.T @ grad + L2 * self.w)
+            self.b -= LEARNING_RATE * grad.sum(axis=0)
+
+    def predict(self, x: np.ndarray) -> tuple[list[str], np.ndarray]:
+        proba = _softmax(x @ self.w + self.b)
+        best = proba.argmax(axis=1)
+        return [self.classes[i] for i in best], proba[range(len(best)), best]
+
+
+def _calibrate(confidence: np.ndarray, correct: np.ndarray) -> float:
+    """
+    Lowest confidence at which the held-out predictions at or above it were
+    right at least CALIBRATION_TARGET of the time. If no such cut rests on
+    MIN_CALIBRATION_SUPPORT predictions, only labels more confident than any
+    held-out prediction are kept.
+    """
+    import numpy as np
+
+    order = np.argsort(-confidence)
+    hit_rate = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+    ok = np.nonzero(hit_rate[MIN_CALIBRATION_SUPPORT - 1:] >= CALIBRATION_TARGET)[0]
+    if len(ok):
+        return float(confidence[order][ok[-1] + MIN_CALIBRATION_SUPPORT - 1])
+    return float(np.nextafter(confidence.max(), np.inf)) if len(confidence) else float("inf")
+
+
+class ThemeToneClassifier:
+    def __init__(self, examples: list[tuple[str, str, str]]) -> None:
+        x = _features([text for text, _, _ in examples])
+        self.theme = _Head(x, [theme for _, theme, _ in examples])
+        self.tone = _Head(x, [tone for _, _, tone in examples])
+        # Until calibrate() runs, every prediction counts as unsure
+        self.theme_threshold = float("inf")
+        self.tone_threshold = float("inf")
+        self.examples = len(examples)
+
+    def classify(self, texts: list[str]) -> dict[str, Any]:
+        """Vectorized labels and confidences for a batch of ad texts."""
+        x = _features(texts)
+        themes, theme_conf = self.theme.predict(x)
+        tones, tone_conf = self.tone.predict(x)
+        return {
+            "message_theme": themes,
+            "theme_confidence": theme_conf.tolist(),
+            "emotional_tone": tones,
+            "tone_confidence": tone_conf.tolist(),
+        }
+
+    def is_confident(self, theme_confidence: float, tone_confidence: float) -> bool:
+        return theme_confidence >= self.theme_threshold and tone_confidence >= self.tone_threshold
+
+    def calibrate(self, examples: list[tuple[str, str, str]]) -> None:
+        """Set both thresholds from CALIBRATION_FOLDS-fold held-out predictions."""
+        import numpy as np
+
+        order = list(range(len(examples)))
+        random.Random(0).shuffle(order)
+        confidence = np.zeros((len(examples), 2))
+        correct = np.zeros((len(examples), 2), dtype=bool)
+        for f in range(CALIBRATION_FOLDS):
+            held_out = order[f::CALIBRATION_FOLDS]
+            skip = set(held_out)
+            fold = ThemeToneClassifier([e for i, e in enumerate(examples) if i not in skip])
+            out = fold.classify([examples[i][0] for i in held_out])
+            for j, i in enumerate(held_out):
+                confidence[i] = out["theme_confidence"][j], out["tone_confidence"][j]
+                correct[i] = (
+                    out["message_theme"][j] == examples[i][1],
+                    out["emotional_tone"][j] == examples[i][2],
+                )
+        self.theme_threshold = _calibrate(confidence[:, 0], correct[:, 0])
+        self.tone_threshold = _calibrate(confidence[:, 1], correct[:, 1])
+
+
+def training_examples(conn: sqlite3.Connection | None = None) -> list[tuple[str, str, str]]:
+    """COPY_BANK, the curated examples and (with `conn`) labelled rows, one per text."""
+    from scraper.mock_data import COPY_BANK
+
+    bank = [
+        (f"{headline} {body}", theme, tone)
+        for theme, tones in COPY_BANK.items()
+        for tone, copies in tones.items()
+        for headline, body in copies
+    ]
+    corpus = {text: (text, theme, tone) for text, theme, tone in bank + CURATED_EXAMPLES}
+    if conn is not None:
+        limit = max(MAX_TRAINING_EXAMPLES - len(corpus), 0)
+        rows = conn.execute(
+            f"""
+            SELECT headline, body_text, message_theme, emotional_tone
+            FROM competitor_ads
+            WHERE label_source IN ({",".join("?" * len(TRAINING_SOURCES))})
+              AND message_theme IS NOT NULL AND emotional_tone IS NOT NULL
+            ORDER BY created_at DESC
+            LIMIT ?;
+            """,
+            [*TRAINING_SOURCES, limit * 4],  # duplicates of known copy are common
+        ).fetchall()
+        for headline, body, theme, tone in rows:
+            text = f"{headline or ''} {body or ''}"
+            if text not in corpus and len(corpus) >= MAX_TRAINING_EXAMPLES:
+                break
+            corpus[text] = (text, theme, tone)
+    return list(corpus.values())
+
+
+def _labeled_rows(conn: sqlite3.Connection) -> int:
+    return conn.execute(
+        f"SELECT COUNT(*) FROM competitor_ads "
+        f"WHERE label_source IN ({','.join('?' * len(TRAINING_SOURCES))});",
+        TRAINING_SOURCES,
+    ).fetchone()[0]
+
+
+def train(examples: list[tuple[str, str, str]]) -> ThemeToneClassifier:
+    model = ThemeToneClassifier(examples)
+    model.calibrate(examples)
+    return model
+
+
+_model: ThemeToneClassifier | None = None
+_trained_rows = 0
+_retraining = False
+_lock = threading.Lock()
+
+
+def _retrain(examples: list[tuple[str, str, str]], rows: int) -> None:
+    global _model, _trained_rows, _retraining
+    try:
+        model = train(examples)
+        with _lock:
+            _model, _trained_rows = model, rows
+    finally:
+        _retraining = False
+
+
+def get_model(conn: sqlite3.Connection | None = None) -> ThemeToneClassifier:
+    """
+    The current model. The first call trains it (from `conn`'s labelled rows
+    too, if given). Later calls with `conn` start a background retrain once
+    RETRAIN_MIN_NEW more labelled rows exist, and keep serving the current
+    model meanwhile.
+    """
+    global _model, _trained_rows, _retraining
+    rows = _labeled_rows(conn) if conn is not None else 0
+    with _lock:
+        if _model is None:
+            _model, _trained_rows = train(training_examples(conn)), rows
+        elif conn is not None and not _retraining and rows - _trained_rows >= RETRAIN_MIN_NEW:
+            _retraining = True
+            threading.Thread(
+                target=_retrain, args=(training_examples(conn), rows),
+                name="classifier-retrain", daemon=True,
+            ).start()
+        return _model
+
+
+def evaluate(
+    model: ThemeToneClassifier, examples: list[tuple[str, str, str]]
+) -> dict[str, Any]:
+    """Held-out quality: how many ads are routed, and how often kept labels are right."""
+    out = model.classify([text for text, _, _ in examples])
+    kept = right = 0
+    for i, (_, theme, tone) in enumerate(examples):
+        if model.is_confident(out["theme_confidence"][i], out["tone_confidence"][i]):
+            kept += 1
+            right += out["message_theme"][i] == theme and out["emotional_tone"][i] == tone
+    return {
+        "ads": len(examples),
+        "routed": round(1 - kept / len(examples), 3) if examples else 0.0,
+        "kept_accuracy": round(right / kept, 3) if kept else None,
+    }
+
+
+def check_quality(quality: dict[str, Any]) -> None:
+    """Raise ClassifierQualityError if `evaluate`'s result is outside the band."""
+    if quality["routed"] > QUALITY_MAX_ROUTED:
+        raise ClassifierQualityError(
+            f"routed {quality['routed']:.1%} of ads, more than {QUALITY_MAX_ROUTED:.0%}"
+        )
+    accuracy = quality["kept_accuracy"]
+    if accuracy is not None and accuracy < QUALITY_MIN_ACCURACY:
+        raise ClassifierQualityError(
+            f"kept labels {accuracy:.1%} right, less than {QUALITY_MIN_ACCURACY:.0%}"
+        )
+
+
+# ---------------------------------------------------------------------------
+# Ingest
+# ---------------------------------------------------------------------------
+
+def label_records(records: AdRecordBatch, conn: sqlite3.Connection | None = None) -> list[str]:
+    """
+    Fill in missing message_theme / emotional_tone in place, setting
+    theme_confidence, tone_confidence and label_source on the rows it
+    labels (the batch defaults the rest to 1.0 / "source").
+    Returns the ad_ids whose predicted labels are below the thresholds.
+    `conn` lets the model learn from (and retrain on) the stored labels.
+    """
+    themes = records.column("message_theme")
+    tones = records.column("emotional_tone")
+    unlabeled = [i for i in range(len(records)) if not themes[i] or not tones[i]]
+    if not unlabeled:
+        return []
+
+    model = get_model(conn)
+    predicted = model.classify(
+        [f"{records.value('headline', i) or ''} {records.value('body_text', i) or ''}"
+         for i in unlabeled]
+    )
+    low_confidence = []
+    for j, i in enumerate(unlabeled):
+        rec = records[i]
+        for field, conf in (("message_theme", "theme_confidence"),
+                            ("emotional_tone", "tone_confidence")):
+            if not rec[field]:
+                rec[field] = predicted[field][j]
+                rec[conf] = round(predicted[conf][j], 4)
+        rec["label_source"] = SOURCE_CLASSIFIER
+        if not model.is_confident(rec["theme_confidence"], rec["tone_confidence"]):
+            low_confidence.append(rec["ad_id"])
+    return low_confidence
+
+
+def enqueue(conn: sqlite3.Connection, ad_ids: Iterable[str], reason: str) -> None:
+    """Route ads for LLM enrichment; caller commits."""
+    conn.executemany(
+        "INSERT OR IGNORE INTO enrichment_queue (ad_id, reason) VALUES (?, ?);",
+        [(ad_id, reason) for ad_id in ad_ids],
+    )
@@ -0,0 +1,151 @@
+"""
+ad_counts.py
+Exact /api/ads totals without scanning competitor_ads.
+
+`ad_filter_counts` holds one row per distinct combination of the six
+filterable columns (brand, competitor, theme, tone, format, is_active) with
+the number of ads that have it. Triggers on competitor_ads keep it exact at
+write time — inserts, deletes, upserts and enrichment relabels all go
+through them, in the writer's own transaction, from every worker.
+
+A total for any filter selection is the SUM(n) over the matching
+combinations. The table size is bounded by the label vocabularies (a few
+hundred rows for the mock data, ~13k at most), not by the number of ads, so
+the cost stays flat as competitor_ads grows.
+
+NULL labels are stored as '' so the combination key stays unique; the API
+never filters on an empty value.
+
+`archived_filter_counts` is the same table for ad_archive's `archived_ads`,
+so totals over hot + archive stay exact without scanning either.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from typing import Any
+
+# Same filter names as /api/ads and facets.DIMENSIONS
+COLUMNS: dict[str, str] = {
+    "brand": "brand",
+    "competitor": "competitor_name",
+    "theme": "message_theme",
+    "tone": "emotional_tone",
+    "ad_format": "ad_format",
+    "is_active": "is_active",
+}
+
+_KEY = ", ".join(COLUMNS.values())
+
+
+def _values(ref: str) -> str:
+    return ", ".join(f"COALESCE({ref}.{c}, '')" for c in COLUMNS.values())
+
+
+def _match(ref: str) -> str:
+    return " AND ".join(f"{c} = COALESCE({ref}.{c}, '')" for c in COLUMNS.values())
+
+
+def _create_sql(source: str, counts: str) -> list[str]:
+    """The counts table for `source` plus the triggers that keep it exact."""
+    add_new = f"""
+        INSERT INTO {counts} ({_KEY}, n) VALUES ({_values("NEW")}, 1)
+        ON CONFLICT ({_KEY}) DO UPDATE SET n = n + 1;
+    """
+    remove_old = f"""
+        UPDATE {counts} SET n = n - 1 WHERE {_match("OLD")};
+        DELETE FROM {counts} WHERE n = 0 AND {_match("OLD")};
+    """
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS {counts} (
+            brand            TEXT NOT NULL,
+            competitor_name  TEXT NOT NULL,
+            message_theme    TEXT NOT NULL,
+            emotional_tone   TEXT NOT NULL,
+            ad_format        TEXT NOT NULL,
+            is_active        INTEGER NOT NULL,
+            n                INTEGER NOT NULL,
+            PRIMARY KEY ({_KEY})
+        ) WITHOUT ROWID;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {counts}_insert
+        AFTER INSERT ON {source} BEGIN {add_new} END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {counts}_delete
+        AFTER DELETE ON {source} BEGIN {remove_old} END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {counts}_update
+        AFTER UPDATE OF {_KEY} ON {source}
+        WHEN {" OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in COLUMNS.values())}
+        BEGIN {remove_old} {add_new} END;
+        """,
+    ]
+
+
+CREATE_COUNTS_SQL = _create_sql("competitor_ads", "ad_filter_counts")
+# Same shape for ad_archive's cold table
+CREATE_ARCHIVED_COUNTS_SQL = _create_sql("archived_ads", "archived_filter_counts")
+
+
+# archived flag → (source table, counts table)
+_TABLES = {
+    False: ("competitor_ads", "ad_filter_counts"),
+    True: ("archived_ads", "archived_filter_counts"),
+}
+
+
+def rebuild(conn: sqlite3.Connection, archived: bool = False) -> int:
+    """Recount from competitor_ads (or archived_ads). Caller commits."""
+    source, counts = _TABLES[archived]
+    conn.execute(f"DELETE FROM {counts};")
+    conn.execute(
+        f"""
+        INSERT INTO {counts} ({_KEY}, n)
+        SELECT {", ".join(f"COALESCE({c}, '')" for c in COLUMNS.values())}, COUNT(*)
+        FROM {source}
+        GROUP BY 1, 2, 3, 4, 5, 6;
+        """
+    )
+    return conn.execute(f"SELECT COUNT(*) FROM {counts};").fetchone()[0]
+
+
+def _where(selection: dict[str, Any], skip: str | None = None) -> tuple[str, list[Any]]:
+    conditions, params = [], []
+    for name, value in selection.items():
+        if value is None or name == skip:
+            continue
+        conditions.append(f"{COLUMNS[name]} = ?")
+        params.append((1 if value else 0) if name == "is_active" else value)
+    return ("WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+
+def total(conn: sqlite3.Connection, selection: dict[str, Any], archived: bool = False) -> int:
+    """Exact number of ads matching the (AND-combined) filter selection."""
+    where, params = _where(selection)
+    return conn.execute(
+        f"SELECT COALESCE(SUM(n), 0) FROM {_TABLES[archived][1]} {where};", params
+    ).fetchone()[0]
+
+
+def facet_counts(
+    conn: sqlite3.Connection, selection: dict[str, Any], archived: bool = False
+) -> dict[str, dict[Any, int]]:
+    """
+    Per-value counts for every filter, each ignoring its own selection (the
+    facets.FacetIndex.counts rule), from the counts table alone.
+    """
+    out: dict[str, dict[Any, int]] = {}
+    for name, column in COLUMNS.items():
+        where, params = _where(selection, skip=name)
+        out[name] = {
+            (bool(value) if name == "is_active" else value or None): n
+            for value, n in conn.execute(
+                f"SELECT {column}, SUM(n) FROM {_TABLES[archived][1]} {where} GROUP BY 1;",
+                params,
+            )
+        }
+    return out
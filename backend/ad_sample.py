@@ -0,0 +1,292 @@
+"""
+ad_sample.py
+Maintained stratified sample of competitor_ads for approximate aggregates.
+
+Strata are (brand, competitor_name). Each stratum keeps a bottom-k sample:
+every ad gets a pseudo-random priority from a hash of its ad_id, and the
+SAMPLE_PER_STRATUM ads with the lowest priorities form the sample. That is
+a uniform sample without replacement that can be maintained incrementally —
+a new ad enters only if it beats the stratum's current k-th priority — and
+it never needs to be redrawn. Stratum populations are counted exactly
+alongside it.
+
+Sampled rows are joined back to all_ads (hot and archived ads) by ad_id at
+query time, so later upserts (is_active, days_running, ...) are always
+reflected. Query cost depends on the number of strata × k, not on the size
+of the table.
+
+Estimates use the standard stratified estimator: a stratum total is
+N_h · mean_h with variance N_h² (1 − n_h/N_h) s_h² / n_h, summed over
+strata; intervals are normal-approximation 95% CIs. A fully sampled stratum
+(N_h ≤ k) contributes exactly, so small datasets get exact answers.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import sqlite3
+from collections import Counter
+from datetime import date
+from typing import Any, Iterable
+
+import ad_batch
+import brand_snapshot
+import weekly_spend
+from spend_history import day_number
+
+SAMPLE_PER_STRATUM = 256
+Z_95 = 1.96
+
+CREATE_SAMPLE_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS ad_sample_strata (
+        brand           TEXT NOT NULL,
+        competitor_name TEXT NOT NULL,
+        population      INTEGER NOT NULL,
+        PRIMARY KEY (brand, competitor_name)
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ad_sample (
+        brand           TEXT NOT NULL,
+        competitor_name TEXT NOT NULL,
+        priority        REAL NOT NULL,
+        ad_id           TEXT NOT NULL,
+        PRIMARY KEY (brand, competitor_name, priority, ad_id)
+    ) WITHOUT ROWID;
+    """,
+]
+
+
+def _priority(ad_id: str) -> float:
+    h = hashlib.blake2b(ad_id.encode(), digest_size=8).digest()
+    return int.from_bytes(h, "big") / 2.0**64
+
+
+# ---------------------------------------------------------------------------
+# Maintenance
+# ---------------------------------------------------------------------------
+
+def observe(conn: sqlite3.Connection, records: Iterable[Any]) -> int:
+    """
+    Add newly ingested ads to their strata. Only pass ads that were not in
+    the table before; caller commits.
+    """
+    strata: dict[tuple[str, str], list[str]] = {}
+    for rec in records:
+        strata.setdefault((rec["brand"], rec["competitor_name"]), []).append(rec["ad_id"])
+
+    for (brand, competitor), ad_ids in strata.items():
+        conn.execute(
+            """
+            INSERT INTO ad_sample_strata (brand, competitor_name, population)
+            VALUES (?, ?, ?)
+            ON CONFLICT(brand, competitor_name)
+                DO UPDATE SET population = population + excluded.population;
+            """,
+            [brand, competitor, len(ad_ids)],
+        )
+        # Only the k lowest priorities of the batch can possibly survive
+        candidates = sorted((_priority(a), a) for a in ad_ids)[:SAMPLE_PER_STRATUM]
+        conn.executemany(
+            "INSERT OR IGNORE INTO ad_sample (brand, competitor_name, priority, ad_id) "
+            "VALUES (?, ?, ?, ?);",
+            [(brand, competitor, p, a) for p, a in candidates],
+        )
+        conn.execute(
+            """
+            DELETE FROM ad_sample
+            WHERE brand = ? AND competitor_name = ? AND priority > (
+                SELECT priority FROM ad_sample
+                WHERE brand = ? AND competitor_name = ?
+                ORDER BY priority LIMIT 1 OFFSET ?
+            );
+            """,
+            [brand, competitor, brand, competitor, SAMPLE_PER_STRATUM - 1],
+        )
+    return sum(len(a) for a in strata.values())
+
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """
+    Recreate strata and sample from hot and archived ads (schema backfill,
+    clear_existing).
+    """
+    conn.execute("DELETE FROM ad_sample_strata;")
+    conn.execute("DELETE FROM ad_sample;")
+    rows = conn.execute("SELECT brand, competitor_name, ad_id FROM all_ads;").fetchall()
+    return observe(conn, [{"brand": b, "competitor_name": c, "ad_id": a} for b, c, a in rows])
+
+
+# ---------------------------------------------------------------------------
+# Estimation
+# ---------------------------------------------------------------------------
+
+class _Stratum:
+    __slots__ = ("population", "rows")
+
+    def __init__(self, population: int) -> None:
+        self.population = population
+        self.rows: list[sqlite3.Row] = []
+
+    @property
+    def weight(self) -> float:
+        return self.population / len(self.rows)
+
+
+def _mean_var(values: list[float]) -> tuple[float, float]:
+    n = len(values)
+    mean = sum(values) / n
+    var = sum((v - mean) ** 2 for v in values) / (n - 1) if n > 1 else 0.0
+    return mean, var
+
+
+def _total(strata: Iterable[_Stratum], value: Any) -> tuple[float, float]:
+    """Stratified estimate of sum(value(row)) and its 95% half-width."""
+    est = var = 0.0
+    for s in strata:
+        n, N = len(s.rows), s.population
+        mean, s2 = _mean_var([float(value(r)) for r in s.rows])
+        est += N * mean
+        var += N * N * (1 - n / N) * s2 / n
+    return est, Z_95 * math.sqrt(var)
+
+
+def _interval(est: float, half: float, digits: int = 0) -> dict[str, Any]:
+    return {
+        "estimate": brand_snapshot.round_half_away(est, digits),
+        "ci95": [
+            brand_snapshot.round_half_away(max(est - half, 0.0), digits),
+            brand_snapshot.round_half_away(est + half, digits),
+        ],
+    }
+
+
+def _load(conn: sqlite3.Connection, brand: str | None) -> dict[tuple[str, str], _Stratum]:
+    params = [brand] if brand else []
+    strata = {
+        (b, c): _Stratum(n)
+        for b, c, n in conn.execute(
+            "SELECT brand, competitor_name, population FROM ad_sample_strata "
+            + ("WHERE brand = ?;" if brand else ";"),
+            params,
+        )
+    }
+    rows = conn.execute(
+        f"""
+        SELECT s.brand, s.competitor_name, a.vertical, a.ad_format, a.message_theme,
+               a.emotional_tone, a.is_active,
+               {ad_batch.days_running_sql("a.")} AS days_running,
+               (a.estimated_spend_min + a.estimated_spend_max) / 2.0 AS mid,
+               CAST(julianday(a.start_date) - 2440587.5 AS INTEGER) AS start_day,
+               CAST(julianday(a.end_date) - 2440587.5 AS INTEGER)   AS end_day
+        FROM ad_sample s JOIN all_ads a ON a.ad_id = s.ad_id
+        {"WHERE s.brand = ?" if brand else ""};
+        """,
+        [date.today().isoformat(), *params],
+    ).fetchall()
+    for r in rows:
+        strata[(r["brand"], r["competitor_name"])].rows.append(r)
+    return {k: s for k, s in strata.items() if s.rows}
+
+
+def _category_totals(strata: list[_Stratum], key: Any) -> dict[Any, tuple[float, float]]:
+    """
+    Stratified count estimate and 95% half-width for every value of
+    key(row) in one pass; for a 0/1 indicator s² = n/(n−1) · p(1−p).
+    """
+    est: dict[Any, float] = {}
+    var: dict[Any, float] = {}
+    per_stratum = []
+    for s in strata:
+        per_stratum.append((s, Counter(key(r) for r in s.rows)))
+        for name in per_stratum[-1][1]:
+            est.setdefault(name, 0.0)
+            var.setdefault(name, 0.0)
+    for s, counts in per_stratum:
+        n, N = len(s.rows), s.population
+        for name in est:
+            p = counts.get(name, 0) / n
+            est[name] += N * p
+            if n > 1:
+                var[name] += N * N * (1 - n / N) * (n / (n - 1)) * p * (1 - p) / n
+    return {name: (est[name], Z_95 * math.sqrt(var[name])) for name in est}
+
+
+def _distribution(strata: list[_Stratum], column: str) -> list[dict[str, Any]]:
+    totals = _category_totals(strata, lambda r: r[column])
+    out = [{"name": name, "value": _interval(est, half)} for name, (est, half) in totals.items()]
+    return sorted(out, key=lambda d: d["value"]["estimate"], reverse=True)
+
+
+def competitors(conn: sqlite3.Connection, brand: str | None) -> list[dict[str, Any]]:
+    """Approximate counterpart of BrandSnapshot.competitor_stats."""
+    out = []
+    for (b, name), s in _load(conn, brand).items():
+        n, N = len(s.rows), s.population
+        active, active_half = _total([s], lambda r: r["is_active"] or 0)
+        mean, s2 = _mean_var([r["mid"] for r in s.rows])
+        themes = Counter(r["message_theme"] for r in s.rows)
+        out.append({
+            "competitor_name": name,
+            "brand": b,
+            "vertical": s.rows[0]["vertical"],
+            "total_ads": N,
+            "active_ads": _interval(active, active_half),
+            "avg_spend": _interval(mean, Z_95 * math.sqrt((1 - n / N) * s2 / n)),
+            "sample_max_days_running": max(r["days_running"] or 0 for r in s.rows),
+            "top_theme": themes.most_common(1)[0][0],
+            "sample_size": n,
+        })
+    return sorted(out, key=lambda d: d["total_ads"], reverse=True)
+
+
+def trends(conn: sqlite3.Connection, brand: str | None, today: date | None = None) -> dict[str, Any]:
+    """Approximate counterpart of /api/trends; weekly_spend is a point estimate."""
+    import numpy as np  # heavy; deferred so startup doesn't pay for it
+
+    by_key = _load(conn, brand)
+    strata = list(by_key.values())
+    today_day = day_number(today or date.today())
+
+    def bucket_of(r: sqlite3.Row) -> str:
+        return brand_snapshot.longevity_bucket(r["days_running"] or 0)
+
+    bucket_min: dict[str, int] = {}
+    for r in (r for s in strata for r in s.rows):
+        label = bucket_of(r)
+        bucket_min[label] = min(bucket_min.get(label, r["days_running"] or 0), r["days_running"] or 0)
+    bucket_totals = _category_totals(strata, bucket_of)
+    longevity = [
+        {"bucket": label, "count": _interval(*bucket_totals[label])}
+        for label in sorted(bucket_min, key=bucket_min.__getitem__)
+    ]
+
+    spenders = []
+    for (b, name), s in by_key.items():
+        est, half = _total([s], lambda r: r["mid"])
+        spenders.append({"competitor_name": name, "brand": b, "total_spend": _interval(est, half)})
+    spenders.sort(key=lambda d: d["total_spend"]["estimate"], reverse=True)
+
+    sampled = [(r, s.weight) for s in strata for r in s.rows if r["start_day"] is not None]
+    weekly = weekly_spend.weekly_from_arrays(
+        conn,
+        np.array([r["start_day"] for r, _ in sampled]),
+        np.array([r["end_day"] if r["end_day"] is not None else today_day for r, _ in sampled]),
+        np.array([r["mid"] * w for r, w in sampled]),
+    )
+    for week in weekly:
+        # The raw count is of sampled ads, not an estimate of live ads
+        week["sampled_ads"] = week.pop("ad_count")
+
+    return {
+        "weekly_spend": weekly,
+        "theme_distribution": _distribution(strata, "message_theme"),
+        "format_distribution": _distribution(strata, "ad_format"),
+        "tone_distribution": _distribution(strata, "emotional_tone"),
+        "longevity_buckets": longevity,
+        "top_spenders": spenders[: brand_snapshot.TOP_SPENDERS_N],
+        "sample_size": sum(len(s.rows) for s in strata),
+        "population": sum(s.population for s in strata),
+    }
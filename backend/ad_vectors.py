@@ -0,0 +1,460 @@
+"""
+ad_vectors.py
+Local "ads like this one" search: hashed-n-gram LSA embeddings plus an IVF
+index, all in NumPy, with no network access.
+
+Embedding: headline + body_text is tokenized into word unigrams and bigrams,
+each hashed (crc32) into HASH_DIM buckets with TF-IDF weights, then
+projected onto the top EMBED_DIM right singular vectors of a fitted sample
+(truncated SVD, i.e. latent semantic analysis) and L2-normalized, so a dot
+product is a cosine similarity.
+
+Index: spherical k-means over the embeddings gives ~sqrt(n) centroids; each
+ad lives in the inverted list of its nearest centroid. A query scores only
+the NPROBE lists closest to the query vector, which keeps lookups in the
+low milliseconds at a million ads.
+
+Storage lives in a directory next to the database:
+
+    meta.json       synced data version, row count, last indexed rowid, ...
+    model.npz       idf, projection and centroids
+    vectors.f32     n × EMBED_DIM float32, opened with np.memmap
+    rowids.i64      competitor_ads rowid per vector row (ascending)
+    lists.i32       centroid id per vector row
+    tombstones.i64  indexed rowids since deleted from competitor_ads
+
+Archived ads are not in the index (they leave competitor_ads). Their copy,
+like that of an ad ingested since the last sync, is embedded at query time
+with the fitted model and searched against the indexed ads.
+
+Queries never maintain the index. A query that finds the loaded index
+behind the data version starts a background sync and is answered from the
+index it has. The sync embeds and appends new ads (rowid above the last
+indexed one) with the fitted model, and records deleted ads (archived or
+cleared) as tombstones that queries skip. The model is refitted from
+scratch, still in the background, only when more than half of the indexed
+rows are tombstones or the table has doubled since the last fit. Text edits
+to already-indexed ads are picked up on the next refit. A file lock
+serializes index maintenance across worker processes.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Generator, Iterable
+
+import data_version
+
+if TYPE_CHECKING:
+    import numpy as np
+
+HASH_DIM = 2048
+EMBED_DIM = 64
+FIT_SAMPLE = 20_000
+KMEANS_ITERATIONS = 10
+NPROBE = 16
+BATCH = 4096
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+# ---------------------------------------------------------------------------
+# Embedding
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=1 << 16)
+def _bucket(term: str) -> int:
+    return zlib.crc32(term.encode()) % HASH_DIM
+
+
+def _terms(text: str) -> list[int]:
+    words = _TOKEN_RE.findall(text.lower())
+    return [_bucket(w) for w in words] + [
+        _bucket(f"{a} {b}") for a, b in zip(words, words[1:])
+    ]
+
+
+def hashed_tf(texts: list[str]) -> np.ndarray:
+    """Dense batch of sublinear term frequencies over the hash buckets."""
+    import numpy as np
+
+    x = np.zeros((len(texts), HASH_DIM), dtype=np.float32)
+    for i, text in enumerate(texts):
+        buckets = _terms(text)
+        if buckets:
+            np.add.at(x[i], buckets, 1.0)
+    np.log1p(x, out=x)
+    return x
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def _fit(texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """IDF weights and HASH_DIM × EMBED_DIM projection from a sample."""
+    import numpy as np
+
+    tf = hashed_tf(texts)
+    df = np.count_nonzero(tf, axis=0)
+    idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+    x = tf * idf
+    # Right singular vectors of x are the eigenvectors of xᵀx (HASH_DIM²,
+    # independent of the sample size)
+    eigvals, eigvecs = np.linalg.eigh(x.T @ x)
+    top = np.argsort(eigvals)[::-1][:EMBED_DIM]
+    return idf, eigvecs[:, top].astype(np.float32)
+
+
+def _embed(texts: list[str], idf: np.ndarray, projection: np.ndarray) -> np.ndarray:
+    return normalize((hashed_tf(texts) * idf) @ projection).astype("float32")
+
+
+def _kmeans(vectors: np.ndarray, k: int) -> np.ndarray:
+    """Spherical k-means; returns k unit-length centroids."""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]
+        centroids = normalize(sums)
+    return centroids.astype(np.float32)
+
+
+# ---------------------------------------------------------------------------
+# On-disk index
+# ---------------------------------------------------------------------------
+
+_dir: Path | None = None
+_db_path: Path | None = None
+
+
+def configure(db_path: Path) -> Path:
+    """Keep the index next to `db_path` (override with VECTOR_INDEX_DIR)."""
+    global _dir, _db_path
+    db_path = _db_path = Path(db_path)
+    _dir = Path(os.getenv("VECTOR_INDEX_DIR") or db_path.parent / f"{db_path.name}.vectors")
+    _dir.mkdir(parents=True, exist_ok=True)
+    return _dir
+
+
+@contextmanager
+def _file_lock(directory: Path) -> Generator[None, None, None]:
+    with open(directory / ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_meta(directory: Path) -> dict[str, Any] | None:
+    try:
+        return json.loads((directory / "meta.json").read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(directory: Path, meta: dict[str, Any]) -> None:
+    tmp = directory / "meta.json.tmp"
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, directory / "meta.json")
+
+
+def _ad_texts(
+    conn: sqlite3.Connection, after_rowid: int = 0
+) -> Iterable[tuple[list[int], list[str]]]:
+    """Yield (rowids, texts) batches in rowid order."""
+    cur = conn.execute(
+        "SELECT rowid, COALESCE(headline, '') || ' ' || COALESCE(body_text, '') "
+        "FROM competitor_ads WHERE rowid > ? ORDER BY rowid;",
+        [after_rowid],
+    )
+    while batch := cur.fetchmany(BATCH):
+        yield [r[0] for r in batch], [r[1] for r in batch]
+
+
+def _append(directory: Path, rowids: list[int], vectors: np.ndarray, lists: np.ndarray) -> None:
+    import numpy as np
+
+    with open(directory / "vectors.f32", "ab") as f:
+        f.write(vectors.astype(np.float32).tobytes())
+    with open(directory / "rowids.i64", "ab") as f:
+        f.write(np.asarray(rowids, dtype=np.int64).tobytes())
+    with open(directory / "lists.i32", "ab") as f:
+        f.write(lists.astype(np.int32).tobytes())
+
+
+def _build(conn: sqlite3.Connection, directory: Path, version: int) -> None:
+    """Fit the model on a sample and embed every ad from scratch."""
+    import numpy as np
+
+    for name in ("meta.json", "vectors.f32", "rowids.i64", "lists.i32", "tombstones.i64", "model.npz"):
+        (directory / name).unlink(missing_ok=True)
+
+    count = conn.execute("SELECT COUNT(*) FROM competitor_ads;").fetchone()[0]
+    sample = [
+        r[0]
+        for r in conn.execute(
+            "SELECT COALESCE(headline, '') || ' ' || COALESCE(body_text, '') "
+            "FROM competitor_ads ORDER BY random() LIMIT ?;",
+            [FIT_SAMPLE],
+        )
+    ]
+    if not sample:
+        _write_meta(
+            directory, {"version": version, "count": 0, "last_rowid": 0, "fit_count": 0, "dead": 0}
+        )
+        return
+
+    idf, projection = _fit(sample)
+    sample_vectors = _embed(sample, idf, projection)
+    centroids = _kmeans(sample_vectors, max(1, min(len(sample), int(math.sqrt(count)))))
+    np.savez(directory / "model.npz", idf=idf, projection=projection, centroids=centroids)
+
+    count = last_rowid = 0
+    for rowids, texts in _ad_texts(conn):
+        vectors = _embed(texts, idf, projection)
+        _append(directory, rowids, vectors, np.argmax(vectors @ centroids.T, axis=1))
+        count += len(rowids)
+        last_rowid = rowids[-1]
+    _write_meta(
+        directory,
+        {"version": version, "count": count, "last_rowid": last_rowid, "fit_count": count, "dead": 0},
+    )
+
+
+def _extend(conn: sqlite3.Connection, directory: Path, meta: dict[str, Any], version: int) -> None:
+    """Embed and append ads ingested since the last sync, using the fitted model."""
+    import numpy as np
+
+    model = np.load(directory / "model.npz")
+    idf, projection, centroids = model["idf"], model["projection"], model["centroids"]
+    for rowids, texts in _ad_texts(conn, meta["last_rowid"]):
+        vectors = _embed(texts, idf, projection)
+        _append(directory, rowids, vectors, np.argmax(vectors @ centroids.T, axis=1))
+        meta["count"] += len(rowids)
+        meta["last_rowid"] = rowids[-1]
+    meta["version"] = version
+    _write_meta(directory, meta)
+
+
+def _tombstone(conn: sqlite3.Connection, directory: Path, meta: dict[str, Any]) -> None:
+    """Record every indexed rowid that is no longer in competitor_ads."""
+    import numpy as np
+
+    rowids = np.fromfile(directory / "rowids.i64", dtype=np.int64, count=meta["count"])
+    existing = np.fromiter(
+        (r[0] for r in conn.execute(
+            "SELECT rowid FROM competitor_ads WHERE rowid <= ? ORDER BY rowid;",
+            [meta["last_rowid"]],
+        )),
+        dtype=np.int64,
+    )
+    dead = rowids[~np.isin(rowids, existing, assume_unique=True)]
+    tmp = directory / "tombstones.i64.tmp"
+    dead.tofile(tmp)
+    os.replace(tmp, directory / "tombstones.i64")
+    meta["dead"] = len(dead)
+
+
+def sync(conn: sqlite3.Connection, directory: Path | None = None) -> dict[str, Any]:
+    """Bring the on-disk index up to the current data version."""
+    directory = directory or _dir
+    if directory is None:
+        raise ValueError("ad_vectors.configure() has not been called")
+    with _file_lock(directory):
+        # One read transaction: every count and scan below sees the same snapshot
+        conn.execute("BEGIN;")
+        try:
+            return _sync_locked(conn, directory)
+        finally:
+            conn.rollback()
+
+
+def _sync_locked(conn: sqlite3.Connection, directory: Path) -> dict[str, Any]:
+    """Extend, tombstone or rebuild the index; caller holds the file lock."""
+    version = data_version.current(conn)
+    meta = _read_meta(directory)
+    if meta is not None and meta["version"] == version:
+        return meta
+    total = conn.execute("SELECT COUNT(*) FROM competitor_ads;").fetchone()[0]
+    kept = conn.execute(
+        "SELECT COUNT(*) FROM competitor_ads WHERE rowid <= ?;",
+        [meta["last_rowid"] if meta else 0],
+    ).fetchone()[0]
+    if (
+        meta is None
+        or meta["count"] == 0
+        or 2 * (meta["count"] - kept) > meta["count"]  # mostly tombstones
+        or total > 2 * meta["fit_count"]               # model fitted on too small a corpus
+    ):
+        _build(conn, directory, version)
+    else:
+        if kept != meta["count"] - meta.get("dead", 0):  # rows deleted since the last sync
+            _tombstone(conn, directory, meta)
+        _extend(conn, directory, meta, version)
+    return _read_meta(directory)
+
+
+# ---------------------------------------------------------------------------
+# Query
+# ---------------------------------------------------------------------------
+
+class VectorIndex:
+    def __init__(self, directory: Path, meta: dict[str, Any]) -> None:
+        import numpy as np
+
+        self.version = meta["version"]
+        n = meta["count"]
+        if n == 0:
+            self.vectors = np.zeros((0, EMBED_DIM), dtype=np.float32)
+            self.rowids = np.zeros(0, dtype=np.int64)
+            self.alive = np.zeros(0, dtype=bool)
+            self.centroids = np.zeros((0, EMBED_DIM), dtype=np.float32)
+            self.idf = self.projection = None
+            self.order = self.offsets = np.zeros(1, dtype=np.int64)
+            return
+
+        self.vectors = np.memmap(directory / "vectors.f32", dtype=np.float32, mode="r",
+                                 shape=(n, EMBED_DIM))
+        self.rowids = np.fromfile(directory / "rowids.i64", dtype=np.int64, count=n)
+        lists = np.fromfile(directory / "lists.i32", dtype=np.int32, count=n)
+        self.alive = np.ones(n, dtype=bool)
+        if meta.get("dead"):
+            dead = np.fromfile(directory / "tombstones.i64", dtype=np.int64)
+            self.alive[np.searchsorted(self.rowids, dead)] = False
+        model = np.load(directory / "model.npz")
+        self.idf, self.projection = model["idf"], model["projection"]
+        self.centroids = model["centroids"]
+        # Inverted lists: row positions grouped by centroid
+        self.order = np.argsort(lists, kind="stable")
+        self.offsets = np.searchsorted(lists[self.order], np.arange(len(self.centroids) + 1))
+
+    def _position(self, rowid: int) -> int | None:
+        import numpy as np
+
+        pos = int(np.searchsorted(self.rowids, rowid))
+        if pos >= len(self.rowids) or self.rowids[pos] != rowid or not self.alive[pos]:
+            return None
+        return pos
+
+    def __contains__(self, rowid: int) -> bool:
+        return self._position(rowid) is not None
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed copy that is not in the index (an archived or just-ingested ad)."""
+        import numpy as np
+
+        if self.idf is None:
+            return np.zeros(EMBED_DIM, dtype=np.float32)
+        return _embed([text], self.idf, self.projection)[0]
+
+    def neighbors(self, rowid: int, k: int) -> list[tuple[int, float]]:
+        """Approximate top-k (rowid, cosine similarity) for an indexed ad."""
+        import numpy as np
+
+        pos = self._position(rowid)
+        if pos is None:
+            return []
+        return self.search(np.asarray(self.vectors[pos]), k, exclude=pos)
+
+    def search(self, query: np.ndarray, k: int, exclude: int = -1) -> list[tuple[int, float]]:
+        """Approximate top-k (rowid, cosine similarity) for a unit-length query vector."""
+        import numpy as np
+
+        if len(self.rowids) == 0:
+            return []
+        probe = np.argsort(self.centroids @ query)[::-1][:NPROBE]
+        candidates = np.concatenate(
+            [self.order[self.offsets[c]:self.offsets[c + 1]] for c in probe]
+        )
+        # Sorted positions turn the memmap gather into mostly-sequential reads
+        candidates = np.sort(candidates[(candidates != exclude) & self.alive[candidates]])
+        if len(candidates) == 0:
+            return []
+        scores = self.vectors[candidates] @ query
+        top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.rowids[candidates[i]]), float(scores[i])) for i in top]
+
+
+_index: VectorIndex | None = None
+_wanted = 0        # newest data version a query has asked for
+_syncing = False
+_thread: threading.Thread | None = None
+_lock = threading.Lock()
+
+
+def _load(directory: Path) -> VectorIndex:
+    # Under the file lock, so another worker's rebuild is never read half-written
+    with _file_lock(directory):
+        return VectorIndex(directory, _read_meta(directory))
+
+
+def _sync_in_background() -> None:
+    global _index, _syncing
+    try:
+        while True:
+            conn = sqlite3.connect(_db_path, timeout=30)
+            try:
+                sync(conn)
+            finally:
+                conn.close()
+            index = _load(_dir)
+            with _lock:
+                _index = index
+                # An ingest during the sync asks for a newer version: go again
+                if index.version >= _wanted:
+                    return
+    finally:
+        with _lock:
+            _syncing = False
+
+
+def refresh(conn: sqlite3.Connection) -> None:
+    """Start a background sync if the loaded index is behind `conn`'s data version."""
+    global _wanted, _syncing, _thread
+    version = data_version.current(conn)
+    with _lock:
+        _wanted = max(_wanted, version)
+        if (_index is None or _index.version < version) and not _syncing:
+            _syncing = True
+            _thread = threading.Thread(target=_sync_in_background, name="vector-sync", daemon=True)
+            _thread.start()
+
+
+def wait(timeout: float | None = None) -> None:
+    """Block until the background sync, if one is running, has finished."""
+    thread = _thread
+    if thread is not None:
+        thread.join(timeout)
+
+
+def get_index(conn: sqlite3.Connection) -> VectorIndex | None:
+    """
+    The loaded index, which may be a data version behind: a query never
+    waits for a sync, it starts one in the background. None until the
+    first sync has finished.
+    """
+    refresh(conn)
+    return _index
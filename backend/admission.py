@@ -0,0 +1,146 @@
+"""
+admission.py
+Admission control for expensive endpoints.
+
+Requests are mapped to a cost class before they reach FastAPI's threadpool.
+Each class has its own concurrency limit and a bounded wait queue; when the
+queue is full, or a queued request waits too long, the request is rejected
+immediately with 503 and a Retry-After header instead of piling up. Requests
+that map to no class (health checks, /api/ads, ...) are never held back,
+so a burst of brief generation cannot starve cheap reads.
+
+Limits are per worker process.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable
+
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict[str, Any]]]
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+
+class CostClass:
+    """Concurrency limit + bounded queue for one class of endpoints."""
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        queue: int,
+        wait_timeout_s: float,
+        retry_after_s: int,
+    ) -> None:
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.wait_timeout_s = wait_timeout_s
+        self.retry_after_s = retry_after_s
+
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self._sem: asyncio.Semaphore | None = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the server's running loop
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.limit)
+        return self._sem
+
+    async def acquire(self) -> bool:
+        sem = self._semaphore()
+        if sem.locked():
+            if self.waiting >= self.queue:
+                self.rejected_queue_full += 1
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(sem.acquire(), self.wait_timeout_s)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await sem.acquire()
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore().release()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "queue_limit": self.queue,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware. `classify(method, path, query_string)` returns the
+    name of a cost class, or None to let the request straight through.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        classes: list[CostClass],
+        classify: Callable[[str, str, str], str | None],
+    ) -> None:
+        self.app = app
+        self.classes = {c.name: c for c in classes}
+        self.classify = classify
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        name = self.classify(
+            scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1")
+        )
+        cost_class = self.classes.get(name) if name else None
+        if cost_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await cost_class.acquire():
+            await _reject(send, cost_class)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            cost_class.release()
+
+
+async def _reject(send: Send, cost_class: CostClass) -> None:
+    body = json.dumps(
+        {"detail": f"Server busy ({cost_class.name} requests). Retry shortly."}
+    ).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(cost_class.retry_after_s).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
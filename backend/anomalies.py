@@ -0,0 +1,289 @@
+"""
+anomalies.py
+Streaming spike detection for competitor spend and theme launches.
+
+Each tracked series keeps an exponentially weighted mean and variance
+(EWMA, span EWMA_SPAN_DAYS) in `anomaly_state`, together with the value of
+the day still in progress. Ingest updates that open bucket at O(1) per row:
+
+- competitor_spend  — gauge: a competitor's estimated daily spend (mid of
+                      min/max, summed over its active ads) as of today's
+                      snapshot; re-snapshotting the same day overwrites it.
+- theme_launches    — counter: new ads first seen per message theme per day.
+
+When an observation arrives for a later day, the open bucket is closed: its
+z-score against the EWMA is computed *before* folding it in, a row is
+written to `anomalies` if z ≥ Z_THRESHOLD after WARMUP_DAYS, and the
+statistics are updated. Counter series fold in zeros for days with no
+launches; gauge series skip days without a snapshot.
+
+`replay()` rebuilds all state from ad_spend_history and all_ads (hot and
+archived ads) in one pass, so thresholds can be changed and history re-scored.
+"""
+
+from __future__ import annotations
+
+import math
+import sqlite3
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Iterable
+
+from spend_history import day_number, day_to_date
+
+EWMA_SPAN_DAYS = 14
+ALPHA = 2 / (EWMA_SPAN_DAYS + 1)
+Z_THRESHOLD = 3.0
+WARMUP_DAYS = 7
+# Floors on the standard deviation so flat series don't flag tiny wiggles
+MIN_SD_FRACTION = 0.1
+MIN_SD_ABS = 1.0
+MAX_GAP_FILL_DAYS = 60
+
+KIND_SPEND = "competitor_spend"
+KIND_LAUNCHES = "theme_launches"
+COUNTER_KINDS = {KIND_LAUNCHES}
+
+CREATE_ANOMALY_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS anomaly_state (
+        kind     TEXT NOT NULL,
+        key      TEXT NOT NULL,
+        day      INTEGER NOT NULL,
+        current  REAL NOT NULL,
+        mean     REAL NOT NULL DEFAULT 0,
+        var      REAL NOT NULL DEFAULT 0,
+        n        INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (kind, key)
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS anomalies (
+        kind      TEXT NOT NULL,
+        key       TEXT NOT NULL,
+        day       INTEGER NOT NULL,
+        value     REAL NOT NULL,
+        expected  REAL NOT NULL,
+        z         REAL NOT NULL,
+        PRIMARY KEY (kind, key, day)
+    ) WITHOUT ROWID;
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_anomalies_day ON anomalies(day);",
+]
+
+
+# ---------------------------------------------------------------------------
+# Online statistics
+# ---------------------------------------------------------------------------
+
+@dataclass
+class _Series:
+    day: int
+    current: float
+    mean: float = 0.0
+    var: float = 0.0
+    n: int = 0
+
+    def z(self, x: float) -> float:
+        sd = max(math.sqrt(self.var), MIN_SD_FRACTION * abs(self.mean), MIN_SD_ABS)
+        return (x - self.mean) / sd
+
+    def _fold(self, x: float) -> float | None:
+        """Score x against the statistics so far, then fold it in."""
+        z = self.z(x) if self.n >= WARMUP_DAYS else None
+        if self.n == 0:
+            self.mean = x
+        else:
+            diff = x - self.mean
+            incr = ALPHA * diff
+            self.mean += incr
+            self.var = (1 - ALPHA) * (self.var + diff * incr)
+        self.n += 1
+        return z
+
+    def advance(self, day: int, counter: bool) -> list[tuple[int, float, float, float]]:
+        """Close buckets before `day`; returns (day, value, expected, z) spikes."""
+        spikes = []
+        if day <= self.day:
+            return spikes
+        closing = [(self.day, self.current)]
+        if counter:
+            gap_start = max(self.day + 1, day - MAX_GAP_FILL_DAYS)
+            closing += [(d, 0.0) for d in range(gap_start, day)]
+        for d, x in closing:
+            expected = self.mean
+            z = self._fold(x)
+            if z is not None and z >= Z_THRESHOLD:
+                spikes.append((d, x, expected, z))
+        self.day, self.current = day, 0.0
+        return spikes
+
+
+class _Tracker:
+    """Loads touched series lazily, applies observations, writes back."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.series: dict[tuple[str, str], _Series] = {}
+        self.spikes: list[tuple[str, str, int, float, float, float]] = []
+
+    def _get(self, kind: str, key: str, day: int) -> _Series:
+        s = self.series.get((kind, key))
+        if s is None:
+            row = self.conn.execute(
+                "SELECT day, current, mean, var, n FROM anomaly_state WHERE kind = ? AND key = ?;",
+                [kind, key],
+            ).fetchone()
+            s = _Series(*row) if row else _Series(day, 0.0)
+            self.series[(kind, key)] = s
+        return s
+
+    def observe(self, kind: str, key: str, day: int, value: float) -> None:
+        s = self._get(kind, key, day)
+        if day < s.day:
+            return  # bucket already closed; late data is ignored
+        for spike in s.advance(day, kind in COUNTER_KINDS):
+            self.spikes.append((kind, key, *spike))
+        if kind in COUNTER_KINDS:
+            s.current += value
+        else:
+            s.current = value
+
+    def flush(self) -> int:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO anomaly_state (kind, key, day, current, mean, var, n) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?);",
+            [(k, key, s.day, s.current, s.mean, s.var, s.n) for (k, key), s in self.series.items()],
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO anomalies (kind, key, day, value, expected, z) "
+            "VALUES (?, ?, ?, ?, ?, ?);",
+            self.spikes,
+        )
+        return len(self.spikes)
+
+
+# ---------------------------------------------------------------------------
+# Ingest hooks
+# ---------------------------------------------------------------------------
+
+def observe_ingest(
+    conn: sqlite3.Connection, new_records: Iterable[Any], today: date | None = None
+) -> int:
+    """
+    Count newly seen ads per theme and take today's per-competitor spend
+    from the snapshot spend_history just wrote. Caller commits.
+    """
+    day = day_number(today or date.today())
+    tracker = _Tracker(conn)
+
+    launches: dict[str, int] = defaultdict(int)
+    for rec in new_records:
+        if rec["message_theme"]:
+            launches[rec["message_theme"]] += 1
+    for theme, count in launches.items():
+        tracker.observe(KIND_LAUNCHES, theme, day, count)
+
+    for name, spend in conn.execute(
+        """
+        SELECT k.value, SUM((h.spend_min + h.spend_max) / 2.0)
+        FROM ad_spend_history h JOIN history_keys k ON k.id = h.competitor_key
+        WHERE h.day = ?
+        GROUP BY k.value;
+        """,
+        [day],
+    ):
+        tracker.observe(KIND_SPEND, name, day, spend)
+    return tracker.flush()
+
+
+def replay(conn: sqlite3.Connection) -> int:
+    """
+    Rebuild state and anomalies from stored history. Caller commits.
+    """
+    conn.execute("DELETE FROM anomaly_state;")
+    conn.execute("DELETE FROM anomalies;")
+
+    events: list[tuple[int, str, str, float]] = [
+        (day, KIND_SPEND, name, spend)
+        for name, day, spend in conn.execute(
+            """
+            SELECT k.value, h.day, SUM((h.spend_min + h.spend_max) / 2.0)
+            FROM ad_spend_history h JOIN history_keys k ON k.id = h.competitor_key
+            GROUP BY k.value, h.day;
+            """
+        )
+    ]
+    events += [
+        (day_number(date.fromisoformat(first_seen)), KIND_LAUNCHES, theme, count)
+        for theme, first_seen, count in conn.execute(
+            """
+            SELECT message_theme, date(created_at), COUNT(*)
+            FROM all_ads
+            WHERE message_theme IS NOT NULL AND created_at IS NOT NULL
+            GROUP BY message_theme, date(created_at);
+            """
+        )
+    ]
+    events.sort()
+
+    tracker = _Tracker(conn)
+    for day, kind, key, value in events:
+        tracker.observe(kind, key, day, value)
+    return tracker.flush()
+
+
+# ---------------------------------------------------------------------------
+# Query
+# ---------------------------------------------------------------------------
+
+def recent(
+    conn: sqlite3.Connection,
+    kind: str | None = None,
+    since: date | None = None,
+    limit: int = 100,
+    today: date | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Closed-day anomalies (newest first), preceded by today's still-open
+    buckets whose running value already exceeds the threshold (`live: true`).
+    A series last observed on an earlier day is not live.
+    """
+    conditions, params = [], []
+    if kind:
+        conditions.append("kind = ?")
+        params.append(kind)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    live = []
+    open_day = day_number(today or date.today())
+    for k, key, day, current, mean, var, n in conn.execute(
+        f"SELECT kind, key, day, current, mean, var, n FROM anomaly_state "
+        f"{where + ' AND' if where else 'WHERE'} day = ?;",
+        [*params, open_day],
+    ):
+        s = _Series(day, current, mean, var, n)
+        if n >= WARMUP_DAYS and s.z(current) >= Z_THRESHOLD:
+            live.append((k, key, day, current, mean, s.z(current), True))
+
+    if since:
+        conditions.append("day >= ?")
+        params.append(day_number(since))
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    closed = conn.execute(
+        f"SELECT kind, key, day, value, expected, z FROM anomalies {where} "
+        f"ORDER BY day DESC, z DESC LIMIT ?;",
+        [*params, limit],
+    ).fetchall()
+
+    return [
+        {
+            "kind": k, "key": key, "date": day_to_date(day).isoformat(),
+            "value": round(value, 1), "expected": round(expected, 1), "z": round(z, 2),
+            "live": is_live,
+        }
+        for k, key, day, value, expected, z, is_live in [
+            *sorted(live, key=lambda r: -r[5]), *[(*r, False) for r in closed]
+        ]
+    ][:limit]
@@ -0,0 +1,1290 @@
+"""
+bench.py
+Micro-benchmarks for the backend's hot paths.
+
+    python bench.py                 # run everything
+    python bench.py weekly_spend    # run selected benchmarks by name
+
+Each benchmark returns a dict of measurements which is printed as one line.
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from typing import Any, Callable
+
+BENCHMARKS: dict[str, Callable[[], dict[str, Any]]] = {}
+
+
+def benchmark(fn: Callable[[], dict[str, Any]]) -> Callable[[], dict[str, Any]]:
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+def _best_of(fn: Callable[[], Any], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _check(condition: bool, message: str) -> None:
+    """Fail the benchmark when a behaviour it measures is not what it should be."""
+    if not condition:
+        raise AssertionError(message)
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+@benchmark
+def weekly_spend() -> dict[str, Any]:
+    """Interval engine over 10M ads with a realistic start/duration/spend mix."""
+    import numpy as np
+
+    from weekly_spend import spread_intervals
+
+    n = 10_000_000
+    rng = np.random.default_rng(0)
+    today = 20_000
+    starts = today - rng.integers(1, 365, n)
+    ends = np.minimum(starts + rng.geometric(1 / 30, n), today)
+    daily = rng.lognormal(9, 1, n)
+
+    seconds = _best_of(lambda: spread_intervals(starts, ends, daily))
+    return {"ads": n, "seconds": round(seconds, 3)}
+
+
+@benchmark
+def facets() -> dict[str, Any]:
+    """Facet counts for a 3-filter selection over 1M ads (target < 10 ms)."""
+    import random
+
+    from facets import FacetIndex
+
+    n = 1_000_000
+    rng = random.Random(0)
+    cardinality = {
+        "brand": 3, "competitor": 15, "theme": 8, "tone": 6, "ad_format": 3, "is_active": 2,
+    }
+    bitmaps: dict[str, dict[Any, int]] = {}
+    for dim, k in cardinality.items():
+        bufs = [bytearray((n + 7) // 8) for _ in range(k)]
+        for pos in range(n):
+            bufs[rng.randrange(k)][pos >> 3] |= 1 << (pos & 7)
+        bitmaps[dim] = {f"{dim}{i}": int.from_bytes(b, "little") for i, b in enumerate(bufs)}
+    index = FacetIndex(0, n, bitmaps)
+    selection = {"brand": "brand0", "ad_format": "ad_format1", "is_active": "is_active0"}
+
+    seconds = _best_of(lambda: index.counts(selection), repeat=10)
+    return {"ads": n, "ms": round(seconds * 1000, 2)}
+
+
+def _synthetic_db(path: str, n: int) -> None:
+    """Schema plus `n` ads cloned from the mock generator with fresh ad_ids."""
+    import sqlite3
+
+    import schema
+    from scraper.mock_data import generate_mock_ads
+
+    template = generate_mock_ads()
+    conn = sqlite3.connect(path)
+    schema.ensure_schema(conn)
+    columns = list(template[0])
+    conn.executemany(
+        f"INSERT INTO competitor_ads ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))});",
+        (
+            [f"syn-{i}" if c in ("id", "ad_id") else template[i % len(template)][c]
+             for c in columns]
+            for i in range(n)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def _point_main_at(db: Any) -> Any:
+    """Import main and aim it, and the modules it configures, at `db`."""
+    from pathlib import Path
+
+    import main
+
+    main.DB_PATH = Path(db)
+    for module in (main.ad_vectors, main.creative_assets, main.replica):
+        module.configure(main.DB_PATH)
+    return main
+
+
+@benchmark
+def approx_aggregates() -> dict[str, Any]:
+    """Exact snapshot vs. stratified-sample trends at 20k and 200k ads."""
+    import sqlite3
+    import tempfile
+    from pathlib import Path
+
+    import ad_sample
+    import brand_snapshot
+
+    out: dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in (20_000, 200_000):
+            db = str(Path(tmp) / f"ads-{n}.db")
+            _synthetic_db(db, n)
+            conn = sqlite3.connect(db)
+            conn.row_factory = sqlite3.Row
+            ad_sample.rebuild(conn)
+            conn.commit()
+
+            exact = brand_snapshot.compute(conn, None, [])
+            approx = ad_sample.trends(conn, None)
+            truth = {d["name"]: d["count"] for d in exact.theme_distribution}
+            covered = sum(
+                d["value"]["ci95"][0] <= truth[d["name"]] <= d["value"]["ci95"][1]
+                for d in approx["theme_distribution"]
+            )
+            out[f"exact_{n}_ms"] = round(
+                _best_of(lambda: brand_snapshot.compute(conn, None, [])) * 1000, 1
+            )
+            out[f"approx_{n}_ms"] = round(_best_of(lambda: ad_sample.trends(conn, None)) * 1000, 1)
+            out[f"theme_ci_coverage_{n}"] = f"{covered}/{len(truth)}"
+            conn.close()
+    return out
+
+
+@benchmark
+def ad_neighbors() -> dict[str, Any]:
+    """Embedding throughput on mock copy; IVF query latency over 1M vectors (target < 10 ms)."""
+    import json
+    import tempfile
+    from pathlib import Path
+
+    import numpy as np
+
+    import ad_vectors
+    from scraper.mock_data import generate_mock_ads
+
+    ads = generate_mock_ads()
+    texts = [f"{a['headline']} {a['body_text']}" for a in ads] * (50_000 // len(ads))
+    idf, projection = ad_vectors._fit(texts[:5000])
+    embed_s = _best_of(lambda: ad_vectors._embed(texts, idf, projection), repeat=1)
+
+    n, k = 1_000_000, 1000
+    rng = np.random.default_rng(0)
+    topics = ad_vectors.normalize(rng.standard_normal((200, ad_vectors.EMBED_DIM)))
+    vectors = ad_vectors.normalize(
+        topics[rng.integers(0, 200, n)] + 0.1 * rng.standard_normal((n, ad_vectors.EMBED_DIM))
+    ).astype(np.float32)
+    centroids = ad_vectors._kmeans(vectors[:20_000], k)
+    lists = np.concatenate(
+        [np.argmax(vectors[i:i + 100_000] @ centroids.T, axis=1) for i in range(0, n, 100_000)]
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        np.savez(directory / "model.npz", idf=idf, projection=projection, centroids=centroids)
+        ad_vectors._append(directory, list(range(1, n + 1)), vectors, lists)
+        meta = {"version": 0, "count": n, "last_rowid": n, "fit_count": n, "dead": 0}
+        (directory / "meta.json").write_text(json.dumps(meta))
+        index = ad_vectors.VectorIndex(directory, meta)
+
+        queries = rng.integers(1, n + 1, 200)
+        t0 = time.perf_counter()
+        results = [index.neighbors(int(q), 10) for q in queries]
+        query_s = (time.perf_counter() - t0) / len(queries)
+
+        # Recall@10 against brute force on a few queries
+        recall = []
+        for q, got in list(zip(queries, results))[:20]:
+            scores = vectors @ vectors[q - 1]
+            scores[q - 1] = -np.inf
+            exact = set((np.argsort(-scores)[:10] + 1).tolist())
+            recall.append(len(exact & {r for r, _ in got}) / 10)
+
+        # A tenth of the ads archived since the last fit: skipped, not refitted
+        dead = np.sort(rng.choice(np.arange(1, n + 1), size=n // 10, replace=False))
+        dead.tofile(directory / "tombstones.i64")
+        index = ad_vectors.VectorIndex(directory, {**meta, "dead": len(dead)})
+        t0 = time.perf_counter()
+        tombstoned = [index.neighbors(int(q), 10) for q in queries]
+        tombstoned_s = (time.perf_counter() - t0) / len(queries)
+        _check(
+            not np.isin([r for hits in tombstoned for r, _ in hits], dead).any(),
+            "a tombstoned ad was returned as a neighbor",
+        )
+
+    return {
+        "embed_ads_per_s": round(len(texts) / embed_s),
+        "vectors": n,
+        "query_ms": round(query_s * 1000, 2),
+        "tombstoned_query_ms": round(tombstoned_s * 1000, 2),
+        "recall_at_10": round(float(np.mean(recall)), 3),
+    }
+
+
+@benchmark
+def ad_classifier() -> dict[str, Any]:
+    """
+    Theme/tone classifier: training and calibration time, batch throughput,
+    and routing quality on a stream of mock ads where a fifth of the copy
+    has never been labelled. Fails if the quality band is not met.
+    """
+    import random
+
+    import ad_classifier as clf
+    from scraper.mock_data import generate_mock_ads
+
+    examples = clf.training_examples()
+    train_s = _best_of(lambda: clf.train(examples), repeat=1)
+
+    model = clf.train(examples)
+    texts = [text for text, _, _ in examples] * (50_000 // len(examples))
+    classify_s = _best_of(lambda: model.classify(texts), repeat=1)
+
+    # Hold a fifth of the distinct copy out of training: that is novel creative
+    rng = random.Random(0)
+    copy = sorted({text for text, _, _ in examples})
+    novel = set(rng.sample(copy, len(copy) // 5))
+    known = [e for e in examples if e[0] not in novel]
+    model = clf.train(known)
+
+    random.seed(0)
+    records = generate_mock_ads()
+    stream = [
+        (
+            f"{records.value('headline', i)} {records.value('body_text', i)}",
+            records.value("message_theme", i),
+            records.value("emotional_tone", i),
+        )
+        for i in range(len(records))
+    ]
+    quality = clf.evaluate(model, stream)
+    unseen = clf.evaluate(model, [e for e in stream if e[0] in novel])
+    # Once enrichment has labelled the novel copy, it is learnt from too
+    relearned = clf.evaluate(clf.train(examples), stream)
+    clf.check_quality(quality)
+    clf.check_quality(relearned)
+
+    return {
+        "train_ms": round(train_s * 1000),
+        "ads_per_s": round(len(texts) / classify_s),
+        "stream_ads": quality["ads"],
+        "novel_share": round(unseen["ads"] / quality["ads"], 3),
+        "routed": quality["routed"],
+        "kept_accuracy": quality["kept_accuracy"],
+        "novel_routed": unseen["routed"],
+        "routed_after_enrichment": relearned["routed"],
+    }
+
+
+@benchmark
+def enrichment_pipeline() -> dict[str, Any]:
+    """Enrichment run over 5k queued ads against the local stub LLM (every 7th call fails)."""
+    import asyncio
+    import sqlite3
+    import tempfile
+    from pathlib import Path
+
+    import anthropic
+
+    import enrichment
+    import stub_llm
+
+    server = stub_llm.serve_in_thread(0, fail_every=7)
+
+    async def run(conn: sqlite3.Connection) -> enrichment.RunStats:
+        # A client per run: each asyncio.run has its own loop, and the client is closed with it
+        async with anthropic.AsyncAnthropic(
+            api_key="stub", base_url=server.base_url, max_retries=0
+        ) as client:
+            return await enrichment.run(conn, client, max_ads=5000)
+
+    out: dict[str, Any] = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = str(Path(tmp) / "ads.db")
+            _synthetic_db(db, 5000)
+            conn = sqlite3.connect(db)
+            for label in ("cold", "warm"):
+                conn.execute(
+                    "INSERT OR IGNORE INTO enrichment_queue (ad_id, reason) "
+                    "SELECT ad_id, 'bench' FROM competitor_ads;"
+                )
+                t0 = time.perf_counter()
+                stats = asyncio.run(run(conn))
+                conn.commit()
+                out[f"{label}_s"] = round(time.perf_counter() - t0, 3)
+                out[f"{label}_requests"] = stats.requests
+                out[f"{label}_retries"] = stats.retries
+                out[f"{label}_cache_hits"] = stats.cache_hits
+            out.update(ads=stats.queued, unique_creatives=stats.unique_creatives)
+            conn.close()
+    finally:
+        server.shutdown()
+    return out
+
+
+@benchmark
+def brief_prompt_cache() -> dict[str, Any]:
+    """Briefs for every brand, twice, against the stub LLM: is the prefix stable, and marked for caching only when it pays?"""
+    import os
+    import tempfile
+    from pathlib import Path
+
+    import main
+    import prompt_cache
+    import stub_llm
+
+    server = stub_llm.serve_in_thread(0, min_cache_tokens=prompt_cache.MIN_CACHE_TOKENS)
+    saved = {k: os.environ.get(k) for k in ("ANTHROPIC_API_KEY", "ANTHROPIC_BASE_URL")}
+    os.environ.update(ANTHROPIC_API_KEY="stub", ANTHROPIC_BASE_URL=server.base_url)
+    out: dict[str, Any] = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = str(Path(tmp) / "ads.db")
+            _synthetic_db(db, 5000)
+            _point_main_at(db)
+            usages = [main.generate_brief(brand)["usage"] for _ in range(2) for brand in main.BRAND_LABELS]
+    finally:
+        server.shutdown()
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    prefix_tokens = prompt_cache.estimate_tokens(main.BRIEF_PREFIX)
+    out.update(
+        calls=len(usages),
+        prefix_tokens=prefix_tokens,
+        above_sonnet_minimum=prefix_tokens >= prompt_cache.MIN_CACHE_TOKENS,
+        cache_marked_calls=len(server.prefixes),
+        cache_write_tokens=sum(u["cache_creation_input_tokens"] for u in usages),
+        cache_read_tokens=sum(u["cache_read_input_tokens"] for u in usages),
+        uncached_input_tokens=sum(u["input_tokens"] for u in usages),
+        prefix_variants=prompt_cache.stats()["brief"]["prefix_variants"],
+    )
+    _check(out["prefix_variants"] == 1, f"brief prefix varied across calls: {out['prefix_variants']} digests")
+    _check(
+        out["above_sonnet_minimum"] or not server.prefixes,
+        "a prefix below the cache minimum was marked for caching (a write with no read to follow)",
+    )
+    return out
+
+
+@benchmark
+def llm_tail_latency() -> dict[str, Any]:
+    """100 summary calls against the stub LLM, every 25th stalling 2s: plain vs. hedged, then a dead upstream."""
+    import os
+
+    import llm_client
+    import stub_llm
+
+    request = {
+        "model": "claude-haiku-4-5-20251001",
+        "max_tokens": 50,
+        "messages": [{"role": "user", "content": "Summarise the week."}],
+    }
+    server = stub_llm.serve_in_thread(0, slow_every=25, slow_s=2.0)
+    saved = {k: os.environ.get(k) for k in ("ANTHROPIC_API_KEY", "ANTHROPIC_BASE_URL")}
+    os.environ.update(ANTHROPIC_API_KEY="stub", ANTHROPIC_BASE_URL=server.base_url)
+    out: dict[str, Any] = {}
+    try:
+        llm_client.client()  # import and pool setup outside the timings
+        for label, hedge in (("plain", False), ("hedged", True)):
+            latencies = []
+            for _ in range(100):
+                t0 = time.perf_counter()
+                llm_client.call(f"bench_{label}", 4.0, hedge=hedge, **request)
+                latencies.append(time.perf_counter() - t0)
+            latencies.sort()
+            out[f"{label}_p50_ms"] = round(latencies[49] * 1000, 1)
+            out[f"{label}_p99_ms"] = round(latencies[98] * 1000, 1)
+        out["hedges"] = llm_client.stats()["calls"]["bench_hedged"]["hedges"]
+
+        # Upstream stops answering: calls fail at the deadline until the breaker opens
+        server.slow_every = 1
+        failures = []
+        for _ in range(llm_client.BREAKER_FAILURES + 3):
+            t0 = time.perf_counter()
+            try:
+                llm_client.call("bench_dead", 0.3, **request)
+            except llm_client.LLMUnavailable as exc:
+                failures.append((exc.reason, time.perf_counter() - t0))
+        out["deadline_fail_ms"] = round(failures[0][1] * 1000, 1)
+        out["open_breaker_fail_ms"] = round(failures[-1][1] * 1000, 2)
+        out["breaker"] = llm_client.breaker("bench_dead").state
+    finally:
+        server.shutdown()
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    return out
+
+
+@benchmark
+def creative_asset_cache() -> dict[str, Any]:
+    """3000 creatives (300 distinct images, most under several URLs) from a fake CDN with 30ms latency."""
+    import asyncio
+    import sqlite3
+    import tempfile
+    from pathlib import Path
+
+    import creative_assets
+    import fake_cdn
+
+    cdn = fake_cdn.serve_in_thread(0, latency_s=0.03)
+    # The fake CDN is on loopback, which the fetcher refuses by default
+    saved = creative_assets.ALLOWED_HOSTS, creative_assets.ALLOW_PRIVATE_ADDRESSES
+    creative_assets.ALLOWED_HOSTS, creative_assets.ALLOW_PRIVATE_ADDRESSES = ("127.0.0.1",), True
+    out: dict[str, Any] = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = str(Path(tmp) / "ads.db")
+            _synthetic_db(db, 3000)
+            creative_assets.configure(Path(db))
+            conn = sqlite3.connect(db)
+            ad_ids = [r[0] for r in conn.execute("SELECT ad_id FROM competitor_ads ORDER BY ad_id;")]
+            # Every 3rd ad links the canonical URL, the rest a per-ad alias of the same image
+            creatives = [
+                (
+                    ad_id, 0, "image",
+                    f"{cdn.base_url}/img/{i % 300}.png" if i % 3 == 0
+                    else f"{cdn.base_url}/alias/{i}/{i % 300}.png",
+                )
+                for i, ad_id in enumerate(ad_ids)
+            ]
+            creative_assets.register(conn, creatives)
+            stats = asyncio.run(creative_assets.fetch_pending(conn, limit=len(creatives)))
+            conn.commit()
+            files = sum(1 for p in Path(tmp, "ads.db.assets").rglob("*") if p.is_file())
+            out.update(
+                creatives=stats.creatives,
+                downloads=stats.urls,
+                fetch_s=stats.seconds,
+                serial_estimate_s=round(stats.urls * cdn.latency_s, 1),
+                connections=len(cdn.connections),
+                peak_concurrency=cdn.peak_concurrency,
+                stored_assets=stats.new_assets,
+                files_on_disk=files,
+                downloaded_mb=round(stats.bytes_downloaded / 2**20, 1),
+                stored_mb=round(stats.bytes_stored / 2**20, 1),
+                thumbnails=stats.thumbnails,
+            )
+            _check(stats.resolved == len(creatives) and not stats.failed, f"unresolved creatives: {stats}")
+            _check(stats.new_assets == 300, f"{stats.new_assets} assets stored for 300 distinct images")
+            _check(
+                stats.duplicate_content == stats.urls - 300,
+                f"{stats.duplicate_content} duplicate downloads, expected {stats.urls - 300}",
+            )
+            expected_thumbs = 300 if creative_assets.Image is not None else 0
+            _check(stats.thumbnails == expected_thumbs, f"{stats.thumbnails} thumbnails, expected {expected_thumbs}")
+            _check(files == 300 + expected_thumbs, f"{files} files on disk, expected {300 + expected_thumbs}")
+            if creative_assets.Image is not None:
+                digest = conn.execute("SELECT hash FROM creative_assets LIMIT 1;").fetchone()[0]
+                with creative_assets.Image.open(creative_assets.path(digest, thumb=True)) as im:
+                    _check(
+                        im.format == "JPEG" and max(im.size) <= creative_assets.THUMB_PX,
+                        f"thumbnail is {im.format} {im.size}",
+                    )
+
+            # A second ad reusing a known URL needs no download
+            requests_before = len(cdn.requests)
+            creative_assets.register(conn, [(ad_ids[1], 1, "image", creatives[0][3])])
+            again = asyncio.run(creative_assets.fetch_pending(conn))
+            conn.commit()
+            out["reused_url_downloads"] = len(cdn.requests) - requests_before
+            out["reused_urls"] = again.reused_urls
+            _check(out["reused_url_downloads"] == 0 and again.resolved == 1, "a known URL was downloaded again")
+
+            # Failures are kept and retried: a flaky URL recovers, an expired one gives up
+            creative_assets.register(conn, [
+                (ad_ids[2], 1, "image", f"{cdn.base_url}/flaky/7.png"),
+                (ad_ids[3], 1, "image", f"{cdn.base_url}/expired/7.png"),
+            ])
+            runs = []
+            for _ in range(creative_assets.MAX_ATTEMPTS + 1):
+                runs.append(asyncio.run(creative_assets.fetch_pending(conn)))
+                conn.commit()
+            out["retry_runs"] = [(r.resolved, r.failed) for r in runs]
+            _check(
+                out["retry_runs"] == [(0, 2), (1, 1), (0, 1), (0, 0)],
+                f"retry runs (resolved, failed): {out['retry_runs']}",
+            )
+
+            # Redirects are checked hop by hop, and loopback is refused unless allowed
+            creative_assets.register(conn, [
+                (ad_ids[4], 1, "image", f"{cdn.base_url}/redirect?to={cdn.base_url}/img/1.png"),
+                (ad_ids[5], 1, "image",
+                 f"{cdn.base_url}/redirect?to=http://localhost:{cdn.server_address[1]}/img/1.png"),
+            ])
+            redirected = asyncio.run(creative_assets.fetch_pending(conn))
+            conn.commit()
+
+            def error(ad_id: str) -> str:
+                row = conn.execute(
+                    "SELECT error FROM ad_creatives WHERE ad_id = ? AND position = 1;", [ad_id]
+                ).fetchone()
+                return row[0] or ""
+
+            _check(redirected.resolved == 1 and redirected.failed == 1, f"redirects: {redirected}")
+            _check("not allowed" in error(ad_ids[5]), f"redirect off the allow-list: {error(ad_ids[5])}")
+            creative_assets.ALLOW_PRIVATE_ADDRESSES = False
+            creative_assets.register(conn, [(ad_ids[6], 1, "image", f"{cdn.base_url}/img/2.png")])
+            private = asyncio.run(creative_assets.fetch_pending(conn))
+            conn.commit()
+            _check("non-public" in error(ad_ids[6]), f"loopback fetch: {error(ad_ids[6])}")
+            out["blocked"] = redirected.failed + private.failed
+            conn.close()
+    finally:
+        creative_assets.ALLOWED_HOSTS, creative_assets.ALLOW_PRIVATE_ADDRESSES = saved
+        cdn.shutdown()
+    return out
+
+
+@benchmark
+def anomaly_replay() -> dict[str, Any]:
+    """Replay a year of daily spend history (15 competitors × 40 ads) plus launches."""
+    import random
+    import sqlite3
+    import tempfile
+    from datetime import date, timedelta
+    from pathlib import Path
+
+    import anomalies
+    import spend_history
+
+    rng = random.Random(0)
+    today = date.today()
+    first = spend_history.day_number(today - timedelta(days=365))
+    with tempfile.TemporaryDirectory() as tmp:
+        db = str(Path(tmp) / "ads.db")
+        _synthetic_db(db, 50_000)
+        conn = sqlite3.connect(db)
+        keys = spend_history.intern_keys(conn, "competitor", (f"comp{i}" for i in range(15)))
+        rows = [
+            (keys[f"comp{c}"], first + d, a, base, base * 2, 1)
+            for c in range(15)
+            for a in range(40)
+            for base in [rng.randint(500, 20_000)]
+            for d in range(366)
+        ]
+        # One injected spike to make sure it is found
+        spike_day = first + 300
+        rows = [
+            (k, d, a, lo * 5, hi * 5, s) if (k, d) == (keys["comp3"], spike_day) else (k, d, a, lo, hi, s)
+            for k, d, a, lo, hi, s in rows
+        ]
+        conn.executemany("INSERT INTO ad_spend_history VALUES (?, ?, ?, ?, ?, ?);", rows)
+        conn.execute(
+            "UPDATE competitor_ads SET created_at = date('now', '-' || (rowid % 365) || ' days');"
+        )
+        conn.commit()
+
+        t0 = time.perf_counter()
+        found = anomalies.replay(conn)
+        seconds = time.perf_counter() - t0
+        spike_found = conn.execute(
+            "SELECT 1 FROM anomalies WHERE key = 'comp3' AND day = ?;", [spike_day]
+        ).fetchone() is not None
+        conn.close()
+    return {
+        "history_rows": len(rows),
+        "seconds": round(seconds, 3),
+        "anomalies": found,
+        "injected_spike_found": spike_found,
+    }
+
+
+@benchmark
+def spend_history_range() -> dict[str, Any]:
+    """spend_series range queries after a year of daily snapshots (2k active ads), with retention applied."""
+    import sqlite3
+    import tempfile
+    from datetime import date, timedelta
+    from pathlib import Path
+
+    import spend_history
+
+    today = date.today()
+    out: dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = str(Path(tmp) / "ads.db")
+        _synthetic_db(db, 2000)
+        conn = sqlite3.connect(db)
+        conn.row_factory = sqlite3.Row
+        conn.execute("UPDATE competitor_ads SET is_active = 1;")
+        t0 = time.perf_counter()
+        for days_ago in range(365, -1, -1):
+            spend_history.record_snapshot(conn, today - timedelta(days=days_ago))
+            conn.commit()
+        out["snapshot_ms_per_day"] = round((time.perf_counter() - t0) / 366 * 1000, 2)
+        out["history_rows"] = conn.execute("SELECT COUNT(*) FROM ad_spend_history;").fetchone()[0]
+
+        competitor, brand = conn.execute(
+            "SELECT competitor_name, brand FROM competitor_ads LIMIT 1;"
+        ).fetchone()
+        queries = {
+            "competitor_30d": dict(competitor=competitor, start=today - timedelta(days=30)),
+            "brand_90d": dict(brand=brand, start=today - timedelta(days=90)),
+            "brand_year_weekly": dict(brand=brand, start=today - timedelta(days=365), granularity="week"),
+            "all_year_weekly": dict(start=today - timedelta(days=365), granularity="week"),
+        }
+        for name, kwargs in queries.items():
+            out[f"{name}_points"] = len(spend_history.spend_series(conn, **kwargs))
+            out[f"{name}_ms"] = round(
+                _best_of(lambda: spend_history.spend_series(conn, **kwargs), repeat=5) * 1000, 2
+            )
+        conn.close()
+    return out
+
+
+def _time_to_status(port: int, path: str, deadline: float) -> float | None:
+    """Poll until `path` answers 200; returns elapsed seconds from now."""
+    import http.client
+
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", path)
+            if conn.getresponse().status == 200:
+                return time.perf_counter() - t0
+        except OSError:
+            pass
+        time.sleep(0.005)
+    return None
+
+
+def _free_port() -> int:
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn(db_path: str, port: int, workers: int = 1) -> Any:
+    import os
+    import subprocess
+    from pathlib import Path
+
+    env = {**os.environ, "ADS_DB_PATH": db_path, "ANTHROPIC_API_KEY": ""}
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ],
+        env=env,
+        cwd=Path(__file__).parent,
+    )
+
+
+def _boot(db_path: str) -> dict[str, Any]:
+    port = _free_port()
+    proc = _spawn(db_path, port)
+    try:
+        first = _time_to_status(port, "/health", 30)
+        ready = _time_to_status(port, "/ready", 30)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {
+        "first_request_s": round(first, 3) if first is not None else None,
+        "ready_s": round((first or 0) + (ready or 0), 3) if ready is not None else None,
+    }
+
+
+def _cloned_records(n: int) -> Any:
+    """`n` mock records as the generator yields them: fresh ids and date strings."""
+    from datetime import date
+
+    from scraper.mock_data import generate_mock_ads
+
+    template = [row.to_dict() for row in generate_mock_ads()]
+    for i in range(n):
+        rec = template[i % len(template)]
+        yield dict(
+            rec,
+            id=f"id-{i}",
+            ad_id=f"syn-{i}",
+            start_date=date.fromisoformat(rec["start_date"]).isoformat(),
+            end_date=rec["end_date"] and date.fromisoformat(rec["end_date"]).isoformat(),
+        )
+
+
+@benchmark
+def record_batch() -> dict[str, Any]:
+    """Peak memory, live allocations and build time for 1M ingest records: dicts vs. AdRecordBatch."""
+    import gc
+    import tracemalloc
+    from collections import Counter
+
+    from ad_batch import AdRecordBatch
+
+    n = 1_000_000
+
+    def as_dicts() -> list[dict]:
+        records = list(_cloned_records(n))
+        Counter(r["brand"] for r in records)
+        return records
+
+    def as_batch() -> AdRecordBatch:
+        batch = AdRecordBatch.from_records(_cloned_records(n))
+        batch.value_counts("brand")
+        return batch
+
+    out: dict[str, Any] = {"records": n}
+    for name, build in (("dicts", as_dicts), ("batch", as_batch)):
+        gc.collect()
+        blocks = sys.getallocatedblocks()
+        tracemalloc.start()
+        kept = build()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        out[f"{name}_peak_mb"] = round(peak / 2**20, 1)
+        out[f"{name}_live_blocks"] = sys.getallocatedblocks() - blocks
+        del kept
+        gc.collect()
+        out[f"{name}_build_s"] = round(_best_of(build, repeat=1), 2)
+    return out
+
+
+@benchmark
+def response_compression() -> dict[str, Any]:
+    """Size and CPU per /api/ads?limit=200 page by encoding, with and without text_limit."""
+    import gzip
+    import tempfile
+    from pathlib import Path
+
+    from starlette.responses import JSONResponse
+
+    import compression
+
+    out: dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Two seed runs: ~340 distinct mock ads with unique ids, as the app stores them
+        main = _point_main_at(Path(tmp) / "ads.db")
+        with main.get_db() as conn:
+            main.schema.ensure_schema(conn)
+        main.seed_mock_data()
+        main.seed_mock_data()
+        with main.get_db() as conn:
+            pages = {"mock": main._ads_page(conn, limit=200)}
+        main.ad_vectors.wait()  # the seeds started an index sync in tmp
+        # Scraped copy runs longer than the mock bank; 4x the mock body is typical
+        for d in pages["mock"]["data"]:
+            d["body_text_long"] = " ".join([d["body_text"]] * 4)
+        long_page = {**pages["mock"], "data": [
+            {**{k: v for k, v in d.items() if k != "body_text_long"}, "body_text": d["body_text_long"]}
+            for d in pages["mock"]["data"]
+        ]}
+        for d in pages["mock"]["data"]:
+            del d["body_text_long"]
+        pages["long"] = long_page
+        pages["long_text_limit"] = {**long_page, "data": [
+            {**d, **dict(zip(("body_text", "body_truncated"), main._truncate(d["body_text"], 140)))}
+            for d in long_page["data"]
+        ]}
+
+        encoders: dict[str, Callable[[bytes], bytes]] = {
+            f"gzip{level}": (lambda b, level=level: gzip.compress(b, compresslevel=level, mtime=0))
+            for level in (1, 6, 9)
+        }
+        if compression.brotli is not None:
+            for quality in (4, 11):
+                encoders[f"br{quality}"] = (
+                    lambda b, q=quality: compression.brotli.compress(b, quality=q)
+                )
+
+        for name, page in pages.items():
+            body = JSONResponse(page).body
+            out[f"{name}_kb"] = round(len(body) / 1024, 1)
+            for enc, fn in encoders.items():
+                packed = fn(body)
+                out[f"{name}_{enc}_kb"] = round(len(packed) / 1024, 1)
+                out[f"{name}_{enc}_ms"] = round(_best_of(lambda: fn(body), repeat=5) * 1000, 2)
+    return out
+
+
+@benchmark
+def list_totals() -> dict[str, Any]:
+    """/api/ads `total` at 200k ads: COUNT(*) vs. ad_filter_counts vs. facet bitmaps; trigger write cost."""
+    import sqlite3
+    import tempfile
+    from pathlib import Path
+
+    import ad_counts
+    import facets
+    import schema
+
+    n = 200_000
+    selections = {
+        "none": {},
+        "brand": {"brand": "man_matters"},
+        "brand_format_active": {"brand": "man_matters", "ad_format": "video", "is_active": True},
+    }
+    out: dict[str, Any] = {"ads": n}
+    with tempfile.TemporaryDirectory() as tmp:
+        for triggers in (False, True):
+            db = str(Path(tmp) / f"ads-{triggers}.db")
+            if not triggers:
+                # Same schema minus the count triggers, to price them on insert
+                conn = sqlite3.connect(db)
+                schema.ensure_schema(conn)
+                for name in ("insert", "delete", "update"):
+                    conn.execute(f"DROP TRIGGER ad_filter_counts_{name};")
+                conn.commit()
+                conn.close()
+            t0 = time.perf_counter()
+            _synthetic_db(db, n)
+            out[f"insert_{'with' if triggers else 'without'}_triggers_s"] = round(
+                time.perf_counter() - t0, 2
+            )
+
+        conn = sqlite3.connect(db)
+        index = facets.FacetIndex.build(conn)
+        for name, sel in selections.items():
+            where = " AND ".join(f"{ad_counts.COLUMNS[k]} = ?" for k in sel) or "1"
+            params = [int(v) if isinstance(v, bool) else v for v in sel.values()]
+            out[f"{name}_count_star_ms"] = round(_best_of(lambda: conn.execute(
+                f"SELECT COUNT(*) FROM competitor_ads WHERE {where};", params
+            ).fetchone()) * 1000, 2)
+            out[f"{name}_count_table_ms"] = round(
+                _best_of(lambda: ad_counts.total(conn, sel)) * 1000, 3
+            )
+            out[f"{name}_bitmap_ms"] = round(_best_of(lambda: index.total(sel)) * 1000, 3)
+        out["count_rows"] = conn.execute("SELECT COUNT(*) FROM ad_filter_counts;").fetchone()[0]
+        conn.close()
+    return out
+
+
+@benchmark
+def read_replica() -> dict[str, Any]:
+    """/api/ads-style read latency during clear-and-reload ingests: primary vs. snapshot."""
+    import os
+    import sqlite3
+    import tempfile
+    import threading
+    from pathlib import Path
+
+    import replica
+
+    n, churn = 100_000, 20_000
+    query = "SELECT * FROM competitor_ads ORDER BY start_date DESC LIMIT 50;"
+    out: dict[str, Any] = {"ads": n, "rows_rewritten_per_ingest": churn}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "ads.db"
+        _synthetic_db(str(db), n)
+        os.environ["READ_REPLICA"] = "1"
+        replica.configure(db)
+        t0 = time.perf_counter()
+        replica.refresh()
+        out["snapshot_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        stop = threading.Event()
+        ingests = 0
+
+        def ingest() -> None:
+            nonlocal ingests
+            conn = sqlite3.connect(db, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            while not stop.is_set():
+                rows = conn.execute(
+                    f"SELECT rowid, * FROM competitor_ads ORDER BY random() LIMIT {churn};"
+                ).fetchall()
+                conn.execute("BEGIN IMMEDIATE;")
+                conn.executemany("DELETE FROM competitor_ads WHERE rowid = ?;", [r[:1] for r in rows])
+                marks = ",".join("?" * (len(rows[0]) - 1))
+                conn.executemany(
+                    f"INSERT INTO competitor_ads VALUES ({marks});", [r[1:] for r in rows]
+                )
+                conn.commit()
+                ingests += 1
+            conn.close()
+
+        def sample(connect: Callable[[], sqlite3.Connection]) -> list[float]:
+            samples = []
+            deadline = time.perf_counter() + 5
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                conn = connect()
+                conn.execute(query).fetchall()
+                conn.close()
+                samples.append(time.perf_counter() - t0)
+            return sorted(samples)
+
+        writer = threading.Thread(target=ingest)
+        writer.start()
+        try:
+            results = {
+                "primary": sample(lambda: sqlite3.connect(db, timeout=30)),
+                "replica": sample(lambda: replica.connect()[0]),
+            }
+        finally:
+            stop.set()
+            writer.join()
+        for name, samples in results.items():
+            out[f"{name}_p50_ms"] = round(samples[len(samples) // 2] * 1000, 2)
+            out[f"{name}_p99_ms"] = round(samples[int(len(samples) * 0.99)] * 1000, 2)
+        out["ingests"] = ingests
+    return out
+
+
+@benchmark
+def noop_upserts() -> dict[str, Any]:
+    """Re-ingesting 50k unchanged ads: unconditional upsert vs. content-hash skip (time, WAL bytes)."""
+    import sqlite3
+    import tempfile
+    from pathlib import Path
+
+    import ad_batch
+    import main
+
+    n = 50_000
+    fields = [c for c in ad_batch.COLUMNS if c != "content_hash"]
+    blind_upsert = (
+        f"{main._INSERT_AD_SQL} ON CONFLICT(ad_id) DO UPDATE SET "
+        + ", ".join(f"{f} = excluded.{f}" for f in (*ad_batch.UPDATE_FIELDS, "content_hash"))
+        + ";"
+    )
+    out: dict[str, Any] = {"ads": n}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "ads.db"
+        _synthetic_db(str(db), n)
+        conn = sqlite3.connect(db)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA wal_autocheckpoint=0;")
+        batch = ad_batch.AdRecordBatch.from_records(
+            dict(zip(fields, row))
+            for row in conn.execute(f"SELECT {', '.join(fields)} FROM competitor_ads;")
+        )
+        hashes = batch.hash_content()
+        conn.executemany(
+            "UPDATE competitor_ads SET content_hash = ? WHERE ad_id = ?;",
+            zip(hashes, batch.column("ad_id")),
+        )
+        conn.commit()
+        ids = batch.column("ad_id")
+
+        def wal_bytes() -> int:
+            return Path(f"{db}-wal").stat().st_size
+
+        def blind() -> None:
+            conn.executemany(blind_upsert, batch.rows(ad_batch.COLUMNS))
+            conn.commit()
+
+        def hashed() -> None:
+            stored = {
+                ad_id: h
+                for i in range(0, n, 500)
+                for ad_id, h in conn.execute(
+                    f"SELECT ad_id, content_hash FROM competitor_ads "
+                    f"WHERE ad_id IN ({','.join('?' * len(ids[i:i + 500]))});",
+                    ids[i:i + 500],
+                )
+            }
+            changed = [i for i, ad_id in enumerate(ids) if stored.get(ad_id) != hashes[i]]
+            conn.executemany(main._UPSERT_AD_SQL, batch.take(changed).rows(ad_batch.COLUMNS))
+            conn.commit()
+
+        for name, fn in (("blind", blind), ("hashed", hashed)):
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+            t0 = time.perf_counter()
+            fn()
+            out[f"{name}_s"] = round(time.perf_counter() - t0, 2)
+            out[f"{name}_wal_mb"] = round(wal_bytes() / 2**20, 1)
+        t0 = time.perf_counter()
+        batch.hash_content()
+        out["hash_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        conn.close()
+    return out
+
+
+@benchmark
+def hot_cold_archive() -> dict[str, Any]:
+    """200k ads, 80% of them ended long ago: snapshot and /api/ads before vs. after archiving."""
+    import sqlite3
+    import tempfile
+    from datetime import date, timedelta
+    from pathlib import Path
+
+    import ad_archive
+    import brand_snapshot
+    import main
+
+    n = 200_000
+    out: dict[str, Any] = {"ads": n}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = str(Path(tmp) / "ads.db")
+        _synthetic_db(db, n)
+        conn = sqlite3.connect(db)
+        conn.row_factory = sqlite3.Row
+        # Four of every five clones become history: shifted back 90-360 days, ended
+        conn.execute(
+            """
+            UPDATE competitor_ads
+            SET start_date = date(start_date, printf('-%d days', 90 * (rowid % 5))),
+                end_date = date(
+                    COALESCE(end_date, date('now')), printf('-%d days', 90 * (rowid % 5))
+                ),
+                is_active = 0
+            WHERE rowid % 5 != 0;
+            """
+        )
+        conn.commit()
+        text_bytes = conn.execute(
+            "SELECT SUM(LENGTH(headline) + LENGTH(body_text)) FROM competitor_ads "
+            "WHERE is_active = 0 AND end_date < date('now', '-30 days');"
+        ).fetchone()[0]
+
+        _point_main_at(db)
+        recent = date.today() - timedelta(days=14)
+
+        def snapshot() -> None:
+            brand_snapshot.compute(conn, None, [])
+
+        def page(since: date | None) -> Callable[[], Any]:
+            return lambda: main.list_ads(
+                brand=None, competitor=None, theme=None, tone=None, ad_format=None,
+                is_active=None, since=since, limit=50, offset=0, text_limit=None,
+                count="exact",
+            )
+
+        before = brand_snapshot.compute(conn, None, [])
+        first_page = page(None)()["data"]
+        for stage in ("before", "after"):
+            if stage == "after":
+                t0 = time.perf_counter()
+                out["archived"] = ad_archive.archive_ended(conn)
+                conn.commit()
+                out["archive_s"] = round(time.perf_counter() - t0, 2)
+                out["hot_ads"] = conn.execute("SELECT COUNT(*) FROM competitor_ads;").fetchone()[0]
+            out[f"snapshot_{stage}_ms"] = round(_best_of(snapshot) * 1000, 1)
+            out[f"recent_page_{stage}_ms"] = round(_best_of(page(recent)) * 1000, 2)
+            out[f"all_time_page_{stage}_ms"] = round(_best_of(page(None)) * 1000, 2)
+
+        after = brand_snapshot.compute(conn, None, [])
+        out["snapshot_totals_equal"] = (
+            before.total_ads == after.total_ads
+            and before.total_est_spend == after.total_est_spend
+            and before.weekly_spend == after.weekly_spend
+            and before.theme_distribution == after.theme_distribution
+        )
+        out["first_page_equal"] = (
+            [d["start_date"] for d in first_page]
+            == [d["start_date"] for d in page(None)()["data"]]
+        )
+        stored = conn.execute(
+            "SELECT SUM(LENGTH(payload_z)) FROM archived_ads;"
+        ).fetchone()[0] + conn.execute(
+            "SELECT SUM(LENGTH(zdict_z)) FROM archive_dictionaries;"
+        ).fetchone()[0]
+        out["archived_headline_body_mb"] = round(text_bytes / 2**20, 1)
+        out["archived_payload_mb"] = round(stored / 2**20, 1)
+        conn.close()
+    return out
+
+
+@benchmark
+def dashboard_round_trips() -> dict[str, Any]:
+    """Dashboard load: /api/ads + /api/competitors + /api/trends vs. one /api/dashboard."""
+    import sqlite3
+    import tempfile
+    from pathlib import Path
+
+    from fastapi.testclient import TestClient
+
+    import data_version
+    import main
+
+    n = 50_000
+    out: dict[str, Any] = {"ads": n}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = str(Path(tmp) / "ads.db")
+        _synthetic_db(db, n)
+        _point_main_at(db)
+        conn = sqlite3.connect(db)
+        brand = conn.execute("SELECT brand FROM competitor_ads LIMIT 1;").fetchone()[0]
+        client = TestClient(main.app)
+        params = {"brand": brand, "limit": 200, "text_limit": 140}
+
+        def invalidate() -> None:
+            # Every round starts cold: new data version, no memoized snapshot
+            data_version.bump(conn)
+            conn.commit()
+
+        def separate() -> int:
+            invalidate()
+            responses = [
+                client.get("/api/ads", params=params),
+                client.get("/api/competitors", params={"brand": brand}),
+                client.get("/api/trends", params={"brand": brand}),
+            ]
+            return sum(len(r.content) for r in responses)
+
+        def combined() -> int:
+            invalidate()
+            return len(client.get("/api/dashboard", params=params).content)
+
+        out["separate_ms"] = round(_best_of(separate) * 1000, 1)
+        out["dashboard_ms"] = round(_best_of(combined) * 1000, 1)
+        out["separate_bytes"] = separate()
+        out["dashboard_bytes"] = combined()
+
+        # Revalidating with the section ETags after only the ad page changed
+        etags = client.get("/api/dashboard", params=params).json()["etags"]
+        held = {"If-None-Match": f"{etags['competitors']}, {etags['trends']}"}
+        out["revalidate_bytes"] = len(
+            client.get("/api/dashboard", params=params, headers=held).content
+        )
+        out["unchanged_status"] = client.get(
+            "/api/dashboard", params=params, headers={"If-None-Match": ", ".join(etags.values())}
+        ).status_code
+        conn.close()
+    return out
+
+
+@benchmark
+def cold_start() -> dict[str, Any]:
+    """Time from process spawn to first /health and /ready, empty vs. existing DB."""
+    import shutil
+    import tempfile
+    from pathlib import Path
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = str(Path(tmp) / "ads.db")
+        empty = _boot(db)           # creates schema, seeds in the background
+        current = _boot(db)         # schema current, data present
+        shutil.copy(Path(__file__).parent / "ads.db", Path(tmp) / "legacy.db")
+        legacy = _boot(str(Path(tmp) / "legacy.db"))  # unversioned DB, runs migrations
+
+    return {
+        **{f"empty_{k}": v for k, v in empty.items()},
+        **{f"legacy_{k}": v for k, v in legacy.items()},
+        **{f"current_{k}": v for k, v in current.items()},
+    }
+
+
+def _hammer(args: tuple[int, list[str], float]) -> int:
+    """One client process: keep-alive GETs round-robin over `paths` until the deadline."""
+    import http.client
+
+    port, paths, seconds = args
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    done = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        conn.request("GET", paths[done % len(paths)])
+        resp = conn.getresponse()
+        resp.read()
+        done += resp.status == 200
+    return done
+
+
+@benchmark
+def worker_scaling() -> dict[str, Any]:
+    """Aggregate-endpoint throughput with 1..N uvicorn workers sharing one DB."""
+    import multiprocessing
+    import os
+    import shutil
+    import tempfile
+    from pathlib import Path
+
+    paths = [
+        f"/api/{ep}?brand={b}"
+        for ep in ("trends", "competitors", "brief")
+        for b in ("bebodywise", "man_matters", "little_joys")
+    ]
+    max_workers = min(os.cpu_count() or 1, 8)
+    counts = sorted({1, 2, max_workers // 2 or 1, max_workers})
+    clients, seconds = max_workers * 4, 3.0
+    results: dict[str, Any] = {"clients": clients}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = str(Path(tmp) / "ads.db")
+        shutil.copy(Path(__file__).parent / "ads.db", db)
+        for workers in counts:
+            port = _free_port()
+            proc = _spawn(db, port, workers)
+            try:
+                _time_to_status(port, "/ready", 30)
+                with multiprocessing.Pool(clients) as pool:
+                    done = sum(pool.map(_hammer, [(port, paths, seconds)] * clients))
+            finally:
+                proc.terminate()
+                proc.wait()
+            results[f"rps_{workers}w"] = round(done / seconds)
+
+    return results
+
+
+def _latencies(args: tuple[int, str, float]) -> list[float]:
+    import http.client
+
+    port, path, seconds = args
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    samples: list[float] = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        t0 = time.perf_counter()
+        conn.request("GET", path)
+        conn.getresponse().read()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+@benchmark
+def cheap_p99_under_load() -> dict[str, Any]:
+    """p50/p99 of /api/ads while many clients hammer the aggregate endpoints."""
+    import json
+    import multiprocessing
+    import shutil
+    import tempfile
+    import urllib.request
+    from pathlib import Path
+
+    heavy = ["/api/trends", "/api/competitors"]
+    seconds = 3.0
+    with tempfile.TemporaryDirectory() as tmp:
+        db = str(Path(tmp) / "ads.db")
+        shutil.copy(Path(__file__).parent / "ads.db", db)
+        port = _free_port()
+        proc = _spawn(db, port)
+        try:
+            _time_to_status(port, "/ready", 30)
+            with multiprocessing.Pool(17) as pool:
+                load = pool.map_async(_hammer, [(port, heavy, seconds)] * 16)
+                samples = pool.map(_latencies, [(port, "/api/ads?limit=50", seconds)])[0]
+                load.get()
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as resp:
+                aggregate = json.load(resp)["admission"]["aggregate"]
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    samples.sort()
+    return {
+        "ads_p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+        "ads_p99_ms": round(samples[int(len(samples) * 0.99)] * 1000, 1),
+        "aggregate_rejected": aggregate["rejected_queue_full"] + aggregate["rejected_timeout"],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def main(names: list[str]) -> None:
+    for name in names or list(BENCHMARKS):
+        result = BENCHMARKS[name]()
+        print(f"{name:<28} " + "  ".join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
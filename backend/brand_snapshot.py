@@ -0,0 +1,299 @@
+"""
+brand_snapshot.py
+One-pass aggregate view of a brand's ads, shared by /api/brief,
+/api/brief/generate, /api/trends, /api/competitors and the prompt builders.
+
+A snapshot is computed from a single scan of `competitor_ads` (optionally
+filtered by brand) plus ad_archive's rollups, which stand in for archived
+ads without reading them, and memoized on (brand, data version, today), so
+repeated dashboard and brief requests reuse it until the next ingest
+commits. With several workers, a snapshot computed by one is published
+through shared_cache and picked up by the others.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import sqlite3
+import threading
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from datetime import date
+from typing import Any
+
+import ad_archive
+import ad_batch
+import data_version
+import shared_cache
+import weekly_spend
+from spend_history import day_number
+
+GAP_THRESHOLD_PCT = 15.0
+TOP_N = 5
+TOP_SPENDERS_N = 10
+
+# Brands come from request parameters; keep at most this many memoized
+MAX_CACHED_BRANDS = 16
+
+LONGEVITY_BUCKETS = [
+    (7, "0-6 days"),
+    (14, "7-13 days"),
+    (30, "14-29 days"),
+    (60, "30-59 days"),
+]
+LONGEVITY_OVERFLOW = "60+ days"
+
+
+@dataclass
+class BrandSnapshot:
+    brand: str | None
+    data_version: int
+    total_ads: int = 0
+    active_ads: int | None = None
+    competitor_count: int = 0
+    avg_days_running: float | None = None
+    total_est_spend: float | None = None
+    competitors: list[str] = field(default_factory=list)
+    # Distributions are [{"name", "count", "pct"}] sorted by count desc
+    format_distribution: list[dict[str, Any]] = field(default_factory=list)
+    theme_distribution: list[dict[str, Any]] = field(default_factory=list)
+    tone_distribution: list[dict[str, Any]] = field(default_factory=list)
+    longevity_buckets: list[dict[str, Any]] = field(default_factory=list)
+    competitor_stats: list[dict[str, Any]] = field(default_factory=list)
+    top_spenders: list[dict[str, Any]] = field(default_factory=list)
+    longest_running: list[dict[str, Any]] = field(default_factory=list)
+    highest_spend: list[dict[str, Any]] = field(default_factory=list)
+    weekly_spend: list[dict[str, Any]] = field(default_factory=list)
+    gaps: list[dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def top_theme(self) -> dict[str, Any] | None:
+        d = self.theme_distribution
+        return {"message_theme": d[0]["name"], "cnt": d[0]["count"]} if d else None
+
+    @property
+    def top_tone(self) -> dict[str, Any] | None:
+        d = self.tone_distribution
+        return {"emotional_tone": d[0]["name"], "cnt": d[0]["count"]} if d else None
+
+
+# ---------------------------------------------------------------------------
+# Computation
+# ---------------------------------------------------------------------------
+
+def round_half_away(x: float, digits: int = 0) -> float:
+    """Round half away from zero, matching SQLite's ROUND() used previously."""
+    scale = 10 ** digits
+    return math.copysign(math.floor(abs(x) * scale + 0.5) / scale, x)
+
+
+def _distribution(counter: Counter, total: int) -> list[dict[str, Any]]:
+    return [
+        {"name": name, "count": cnt, "pct": round_half_away(cnt * 100.0 / total, 1)}
+        for name, cnt in counter.most_common()
+    ]
+
+
+def longevity_bucket(days: int) -> str:
+    for upper, label in LONGEVITY_BUCKETS:
+        if days < upper:
+            return label
+    return LONGEVITY_OVERFLOW
+
+
+def compute(
+    conn: sqlite3.Connection,
+    brand: str | None,
+    gap_themes: list[str],
+    today: date | None = None,
+) -> BrandSnapshot:
+    """
+    Build a snapshot from one scan over the brand's hot rows (all rows if
+    None) and the archive's rollups.
+    """
+    version = data_version.current(conn)
+    today = today or date.today()
+    where = "WHERE brand = ?" if brand else ""
+    params = [today.isoformat(), *([brand] if brand else [])]
+    rows = conn.execute(
+        f"""
+        SELECT competitor_name, brand, vertical, ad_format, message_theme,
+               emotional_tone, headline, is_active,
+               {ad_batch.days_running_sql()} AS days_running,
+               estimated_spend_min, estimated_spend_max,
+               CAST(julianday(start_date) - 2440587.5 AS INTEGER) AS start_day,
+               CAST(julianday(end_date) - 2440587.5 AS INTEGER)   AS end_day
+        FROM competitor_ads {where};
+        """,
+        params,
+    ).fetchall()
+
+    archived = ad_archive.rollup(conn, brand)
+
+    snap = BrandSnapshot(brand=brand, data_version=version)
+    if not rows and not archived:
+        snap.gaps = [{"theme": t, "pct": 0.0} for t in gap_themes]
+        return snap
+
+    formats: Counter = Counter()
+    themes: Counter = Counter()
+    tones: Counter = Counter()
+    buckets: Counter = Counter()
+    bucket_min: dict[str, int] = {}
+    competitors: dict[str, None] = {}
+    comp_stats: dict[tuple, dict[str, Any]] = {}
+    comp_themes: dict[str, Counter] = {}
+    comp_spend: dict[tuple, float] = {}
+    total = active = days_total = 0
+    spend_total = 0.0
+    today_day = day_number(today)
+    starts: list[int] = []
+    ends: list[int] = []
+    daily: list[float] = []
+
+    def tally(r: sqlite3.Row, n: int, spend: float, active_n: int) -> None:
+        """Count `n` ads sharing r's labels and days_running, with `spend` in total."""
+        nonlocal total, active, days_total, spend_total
+        name = r["competitor_name"]
+        days = r["days_running"] or 0
+
+        total += n
+        active += active_n
+        days_total += days * n
+        spend_total += spend
+        formats[r["ad_format"]] += n
+        themes[r["message_theme"]] += n
+        tones[r["emotional_tone"]] += n
+        bucket = longevity_bucket(days)
+        buckets[bucket] += n
+        bucket_min[bucket] = min(bucket_min.get(bucket, days), days)
+        competitors.setdefault(name, None)
+
+        key = (name, r["brand"], r["vertical"])
+        stats = comp_stats.get(key)
+        if stats is None:
+            stats = comp_stats[key] = {
+                "competitor_name": name, "brand": r["brand"], "vertical": r["vertical"],
+                "total_ads": 0, "active_ads": 0, "spend_sum": 0.0, "max_days_running": days,
+            }
+        stats["total_ads"] += n
+        stats["active_ads"] += active_n
+        stats["spend_sum"] += spend
+        stats["max_days_running"] = max(stats["max_days_running"], days)
+        comp_themes.setdefault(name, Counter())[r["message_theme"]] += n
+        comp_spend[(name, r["brand"])] = comp_spend.get((name, r["brand"]), 0.0) + spend
+
+    for r in rows:
+        mid = ((r["estimated_spend_min"] or 0) + (r["estimated_spend_max"] or 0)) / 2.0
+        tally(r, 1, mid, r["is_active"] or 0)
+        if r["start_day"] is not None:
+            starts.append(r["start_day"])
+            ends.append(r["end_day"] if r["end_day"] is not None else today_day)
+            daily.append(mid)
+    # Archived ads are all ended; their weekly spend was spread when they moved
+    for r in archived:
+        tally(r, r["n"], r["spend_sum"], 0)
+
+    snap.total_ads = total
+    snap.active_ads = active
+    snap.competitor_count = len(competitors)
+    snap.avg_days_running = round_half_away(days_total / total, 1)
+    snap.total_est_spend = round_half_away(spend_total)
+    snap.competitors = list(competitors)
+    snap.format_distribution = _distribution(formats, total)
+    snap.theme_distribution = _distribution(themes, total)
+    snap.tone_distribution = _distribution(tones, total)
+    snap.longevity_buckets = [
+        {"bucket": b, "count": buckets[b]} for b in sorted(buckets, key=bucket_min.__getitem__)
+    ]
+
+    for stats in sorted(comp_stats.values(), key=lambda s: s["total_ads"], reverse=True):
+        spend_sum = stats.pop("spend_sum")
+        stats["avg_spend"] = round_half_away(spend_sum / stats["total_ads"])
+        stats["top_theme"] = comp_themes[stats["competitor_name"]].most_common(1)[0][0]
+        snap.competitor_stats.append(stats)
+
+    snap.top_spenders = [
+        {"competitor_name": name, "brand": b, "total_spend": round_half_away(spend)}
+        for (name, b), spend in heapq.nlargest(
+            TOP_SPENDERS_N, comp_spend.items(), key=lambda kv: kv[1]
+        )
+    ]
+    # The archive's own top N are candidates too (an index scan each)
+    longest = [*rows, *(ad_archive.top(conn, brand, "days_running", TOP_N) if archived else [])]
+    snap.longest_running = [
+        {
+            "competitor_name": r["competitor_name"], "headline": r["headline"],
+            "days_running": r["days_running"], "message_theme": r["message_theme"],
+            "emotional_tone": r["emotional_tone"], "ad_format": r["ad_format"],
+        }
+        for r in heapq.nlargest(TOP_N, longest, key=lambda r: r["days_running"] or 0)
+    ]
+    costliest = [
+        *rows, *(ad_archive.top(conn, brand, "estimated_spend_max", TOP_N) if archived else [])
+    ]
+    snap.highest_spend = [
+        {
+            "competitor_name": r["competitor_name"], "headline": r["headline"],
+            "estimated_spend_max": r["estimated_spend_max"], "ad_format": r["ad_format"],
+        }
+        for r in heapq.nlargest(TOP_N, costliest, key=lambda r: r["estimated_spend_max"] or 0)
+    ]
+    import numpy as np  # heavy; deferred so startup doesn't pay for it
+
+    snap.weekly_spend = weekly_spend.weekly_from_arrays(
+        conn, np.array(starts), np.array(ends), np.array(daily),
+        carried=ad_archive.weekly(conn, brand) if archived else None,
+    )
+
+    theme_pcts = {d["name"]: d["pct"] for d in snap.theme_distribution}
+    snap.gaps = [
+        {"theme": t, "pct": theme_pcts.get(t, 0.0)}
+        for t in gap_themes
+        if theme_pcts.get(t, 0.0) < GAP_THRESHOLD_PCT
+    ]
+    return snap
+
+
+# ---------------------------------------------------------------------------
+# Memoization
+# ---------------------------------------------------------------------------
+
+_cache: dict[str | None, BrandSnapshot] = {}
+_cache_day: dict[str | None, date] = {}
+_lock = threading.Lock()
+
+
+def get(conn: sqlite3.Connection, brand: str | None, gap_themes: list[str]) -> BrandSnapshot:
+    """
+    Return the memoized snapshot for `brand`, recomputing after any ingest.
+    Checks this process first, then the cross-worker shared cache.
+    """
+    version = data_version.current(conn)
+    today = date.today()
+    with _lock:
+        snap = _cache.get(brand)
+        if snap is not None and snap.data_version == version and _cache_day[brand] == today:
+            return snap
+
+    database_id = data_version.database_id(conn)
+    shared_key = f"snapshot:{brand or ''}:{today.isoformat()}"
+    shared = shared_cache.get(shared_key, database_id, version)
+    if shared is not None:
+        snap = BrandSnapshot(**shared)
+    else:
+        snap = compute(conn, brand, gap_themes, today)
+        # An unknown brand gives an empty snapshot: cheap to rebuild, not worth a file
+        if snap.total_ads:
+            shared_cache.put(shared_key, database_id, snap.data_version, asdict(snap))
+
+    with _lock:
+        _cache.pop(brand, None)
+        _cache[brand] = snap
+        _cache_day[brand] = today
+        # Dicts keep insertion order, so the first key is the least recently stored
+        while len(_cache) > MAX_CACHED_BRANDS:
+            oldest = next(iter(_cache))
+            del _cache[oldest], _cache_day[oldest]
+    return snap
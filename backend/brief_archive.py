@@ -0,0 +1,238 @@
+"""
+brief_archive.py
+Compressed, paginated storage for generated briefs.
+
+Markdown and stats are stored zlib-compressed in `brief_archive` and only
+decompressed when a single brief is fetched; history listings read metadata
+columns only. Listings use keyset pagination over the
+(brand, generated_at DESC, id DESC) index, so page N costs the same as page 1.
+
+Retention: every brief from the last RETAIN_ALL_DAYS is kept; older ones are
+thinned to the latest brief per brand per week, which keeps years of weekly
+history small.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import sqlite3
+import uuid
+import zlib
+from typing import Any
+
+RETAIN_ALL_DAYS = 30
+COMPRESSION_LEVEL = 9
+
+CREATE_ARCHIVE_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS brief_archive (
+        id              TEXT PRIMARY KEY,
+        brand           TEXT NOT NULL,
+        generated_at    TEXT NOT NULL,
+        markdown_z      BLOB NOT NULL,
+        stats_z         BLOB,
+        markdown_chars  INTEGER NOT NULL,
+        stored_bytes    INTEGER NOT NULL
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_brief_archive_brand_time "
+    "ON brief_archive(brand, generated_at DESC, id DESC);",
+]
+
+_METADATA_COLUMNS = "id, brand, generated_at, markdown_chars, stored_bytes"
+
+
+# ---------------------------------------------------------------------------
+# Encoding helpers
+# ---------------------------------------------------------------------------
+
+def _compress(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def _decompress(blob: bytes | None) -> str | None:
+    return zlib.decompress(blob).decode("utf-8") if blob is not None else None
+
+
+def encode_cursor(generated_at: str, brief_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{generated_at}|{brief_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """Raises ValueError for anything that is not a cursor we issued."""
+    try:
+        generated_at, brief_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    except Exception as exc:
+        raise ValueError("malformed cursor") from exc
+    return generated_at, brief_id
+
+
+# ---------------------------------------------------------------------------
+# Writes
+# ---------------------------------------------------------------------------
+
+def store(
+    conn: sqlite3.Connection, brand: str, markdown: str, stats: dict[str, Any]
+) -> tuple[str, str]:
+    """Insert a brief, apply retention for the brand and return (id, generated_at)."""
+    brief_id = str(uuid.uuid4())
+    markdown_z = _compress(markdown)
+    stats_z = _compress(json.dumps(stats))
+    conn.execute(
+        """
+        INSERT INTO brief_archive (
+            id, brand, generated_at, markdown_z, stats_z, markdown_chars, stored_bytes
+        ) VALUES (?, ?, datetime('now'), ?, ?, ?, ?);
+        """,
+        [brief_id, brand, markdown_z, stats_z, len(markdown), len(markdown_z) + len(stats_z)],
+    )
+    generated_at = conn.execute(
+        "SELECT generated_at FROM brief_archive WHERE id = ?;", [brief_id]
+    ).fetchone()[0]
+    apply_retention(conn, brand)
+    return brief_id, generated_at
+
+
+def apply_retention(conn: sqlite3.Connection, brand: str) -> int:
+    """Keep only the latest brief per week once briefs are older than RETAIN_ALL_DAYS."""
+    return conn.execute(
+        """
+        DELETE FROM brief_archive WHERE id IN (
+            SELECT id FROM (
+                SELECT id,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY strftime('%Y-%W', generated_at)
+                           ORDER BY generated_at DESC, id DESC
+                       ) AS rn
+                FROM brief_archive
+                WHERE brand = ? AND generated_at < datetime('now', ?)
+            )
+            WHERE rn > 1
+        );
+        """,
+        [brand, f"-{RETAIN_ALL_DAYS} days"],
+    ).rowcount
+
+
+def migrate_legacy(conn: sqlite3.Connection) -> int:
+    """
+    Copy rows from the old plain-TEXT weekly_briefs table, then rename it to
+    weekly_briefs_legacy. The old table is kept so the migration can be
+    reverted by renaming it back.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'weekly_briefs';"
+    ).fetchone()
+    if not exists:
+        return 0
+
+    rows = conn.execute(
+        "SELECT id, brand, markdown, stats_json, generated_at FROM weekly_briefs;"
+    ).fetchall()
+    for brief_id, brand, markdown, stats_json, generated_at in rows:
+        markdown_z = _compress(markdown)
+        stats_z = _compress(stats_json) if stats_json else None
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO brief_archive (
+                id, brand, generated_at, markdown_z, stats_z, markdown_chars, stored_bytes
+            ) VALUES (?, ?, ?, ?, ?, ?, ?);
+            """,
+            [
+                brief_id, brand, generated_at, markdown_z, stats_z, len(markdown),
+                len(markdown_z) + len(stats_z or b""),
+            ],
+        )
+    kept = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'weekly_briefs_legacy';"
+    ).fetchone()
+    if kept:
+        # Kept by an earlier migration; add any new rows to that copy
+        conn.execute("INSERT OR IGNORE INTO weekly_briefs_legacy SELECT * FROM weekly_briefs;")
+        conn.execute("DROP TABLE weekly_briefs;")
+    else:
+        conn.execute("ALTER TABLE weekly_briefs RENAME TO weekly_briefs_legacy;")
+    return len(rows)
+
+
+# ---------------------------------------------------------------------------
+# Reads
+# ---------------------------------------------------------------------------
+
+def _full(row: sqlite3.Row | None, include_stats: bool) -> dict[str, Any] | None:
+    if row is None:
+        return None
+    result = {
+        "id": row["id"],
+        "brand": row["brand"],
+        "markdown": _decompress(row["markdown_z"]),
+        "generated_at": row["generated_at"],
+    }
+    if include_stats and row["stats_z"] is not None:
+        result["stats"] = json.loads(_decompress(row["stats_z"]))
+    return result
+
+
+def latest(
+    conn: sqlite3.Connection, brand: str, include_stats: bool = True
+) -> dict[str, Any] | None:
+    stats_col = "stats_z" if include_stats else "NULL AS stats_z"
+    row = conn.execute(
+        f"""
+        SELECT id, brand, generated_at, markdown_z, {stats_col}
+        FROM brief_archive
+        WHERE brand = ?
+        ORDER BY generated_at DESC, id DESC
+        LIMIT 1;
+        """,
+        [brand],
+    ).fetchone()
+    return _full(row, include_stats)
+
+
+def fetch(
+    conn: sqlite3.Connection, brand: str, brief_id: str, include_stats: bool = True
+) -> dict[str, Any] | None:
+    stats_col = "stats_z" if include_stats else "NULL AS stats_z"
+    row = conn.execute(
+        f"""
+        SELECT id, brand, generated_at, markdown_z, {stats_col}
+        FROM brief_archive WHERE id = ? AND brand = ?;
+        """,
+        [brief_id, brand],
+    ).fetchone()
+    return _full(row, include_stats)
+
+
+def list_page(
+    conn: sqlite3.Connection, brand: str, limit: int, cursor: str | None = None
+) -> tuple[list[dict[str, Any]], str | None]:
+    """One page of brief metadata, newest first, plus the cursor for the next page."""
+    if cursor:
+        generated_at, brief_id = decode_cursor(cursor)
+        rows = conn.execute(
+            f"""
+            SELECT {_METADATA_COLUMNS} FROM brief_archive
+            WHERE brand = ? AND (generated_at, id) < (?, ?)
+            ORDER BY generated_at DESC, id DESC
+            LIMIT ?;
+            """,
+            [brand, generated_at, brief_id, limit + 1],
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            f"""
+            SELECT {_METADATA_COLUMNS} FROM brief_archive
+            WHERE brand = ?
+            ORDER BY generated_at DESC, id DESC
+            LIMIT ?;
+            """,
+            [brand, limit + 1],
+        ).fetchall()
+
+    items = [dict(r) for r in rows[:limit]]
+    next_cursor = (
+        encode_cursor(items[-1]["generated_at"], items[-1]["id"]) if len(rows) > limit else None
+    )
+    return items, next_cursor
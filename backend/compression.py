@@ -0,0 +1,168 @@
+"""
+compression.py
+Negotiated response compression.
+
+JSON responses of at least `minimum_size` bytes are compressed with the
+best encoding the client accepts: brotli when the optional `brotli` package
+is installed and the client sends `br`, otherwise gzip. Accept-Encoding
+q-values are honoured (`q=0` refuses an encoding); on a tie brotli wins,
+as it generally beats gzip on JSON at comparable CPU cost.
+
+Only complete single-message bodies are compressed; streamed responses,
+responses that already carry a Content-Encoding and non-text content types
+pass through untouched. A strong ETag is weakened, since the compressed
+bytes differ from the identity representation.
+
+Per-encoding counters (responses, bytes in/out, CPU seconds) are exposed on
+/metrics. Limits and levels are per worker process.
+"""
+
+from __future__ import annotations
+
+import gzip
+import time
+from typing import Any
+
+from admission import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+# Per-process counters by encoding, shared by every middleware instance
+_counters: dict[str, dict[str, float]] = {}
+
+
+def _accepted(header: str) -> dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}."""
+    out: dict[str, float] = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        out[coding.strip().lower()] = q
+    return out
+
+
+def negotiate(header: str) -> str | None:
+    """Pick "br", "gzip" or None (identity) for an Accept-Encoding value."""
+    accepted = _accepted(header)
+    wildcard = accepted.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def stats() -> dict[str, Any]:
+    return {
+        "brotli_available": brotli is not None,
+        "encodings": {
+            coding: {
+                "responses": int(c["responses"]),
+                "bytes_in": int(c["bytes_in"]),
+                "bytes_out": int(c["bytes_out"]),
+                "ratio": round(c["bytes_out"] / c["bytes_in"], 3) if c["bytes_in"] else None,
+                "cpu_ms": round(c["seconds"] * 1000, 1),
+            }
+            for coding, c in _counters.items()
+        },
+    }
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compress(self, coding: str, body: bytes) -> bytes:
+        if coding == "br":
+            return brotli.compress(body, quality=self.brotli_quality, mode=brotli.MODE_TEXT)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = next(
+            (v.decode("latin-1") for k, v in scope["headers"] if k == b"accept-encoding"), ""
+        )
+        coding = negotiate(accept)
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: dict[str, Any] | None = None
+        passthrough = False
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            headers = {k.lower(): v for k, v in start.get("headers", [])}
+            body = message.get("body", b"")
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            if (
+                message.get("more_body", False)
+                or b"content-encoding" in headers
+                or len(body) < self.minimum_size
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            t0 = time.perf_counter()
+            compressed = self.compress(coding, body)
+            c = _counters.setdefault(
+                coding, {"responses": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+            )
+            c["responses"] += 1
+            c["bytes_in"] += len(body)
+            c["bytes_out"] += len(compressed)
+            c["seconds"] += time.perf_counter() - t0
+
+            out_headers = [
+                (k, v) for k, v in start.get("headers", [])
+                if k.lower() not in (b"content-length", b"vary", b"etag")
+            ]
+            out_headers += [
+                (b"content-encoding", coding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b", ".join(filter(None, [headers.get(b"vary"), b"Accept-Encoding"]))),
+            ]
+            etag = headers.get(b"etag")
+            if etag:
+                out_headers.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+            await send({**start, "headers": out_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,522 @@
+"""
+creative_assets.py
+Content-addressed cache of ad creative media: images and video posters.
+
+Scraped ads point at CDN URLs that are slow to hotlink and expire. Each
+creative registered for an ad (`ad_creatives`: ad, card position, kind,
+source URL) is fetched once and stored on disk under the SHA-256 of its
+bytes. The same image used by many ads, or served under different URLs, is
+stored once. It is served from /api/assets/{hash} with an immutable,
+year-long Cache-Control, because the content at a hash never changes.
+
+Fetching is async. A single pooled httpx client keeps connections to each
+CDN host alive. Up to FETCH_CONCURRENCY downloads run at once, and URLs
+repeated within a batch or already fetched for another ad are downloaded
+once. Thumbnails (THUMB_PX on the long side, JPEG) are decoded and resized
+in a process pool, so image work does not hold up the event loop or the
+GIL. Thumbnails need the optional `Pillow` package. Without it,
+originals are still cached, and the thumbnail URL serves the original.
+
+Creative URLs come from API callers, so the server only fetches from
+CDN hosts on an allow-list (CREATIVE_ALLOWED_HOSTS). Before each request,
+including each redirect hop, the host is resolved and every address must
+be public: loopback, private, link-local and reserved addresses are
+refused. The request then connects to the address that was checked, so a
+second DNS answer cannot point it somewhere else. Redirects are followed
+by hand, up to MAX_REDIRECTS, so every hop goes through the same check.
+
+Failed fetches (blocked URLs, HTTP errors, non-image responses, oversized
+bodies) are kept with their error and retried on later runs, up to
+MAX_ATTEMPTS.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import ipaddress
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable
+from urllib.parse import urljoin, urlsplit
+
+try:
+    from PIL import Image  # type: ignore
+except ImportError:  # optional: originals only, no thumbnails
+    Image = None
+
+FETCH_CONCURRENCY = int(os.getenv("CREATIVE_FETCH_CONCURRENCY", "16"))
+FETCH_TIMEOUT_S = 15.0
+MAX_ASSET_BYTES = 20 * 1024 * 1024
+MAX_ATTEMPTS = 3
+MAX_REDIRECTS = 5
+THUMB_PX = 320
+THUMB_QUALITY = 80
+KINDS = ("image", "video_poster")
+
+# Hosts creatives may be fetched from. Each entry matches the host and its
+# subdomains; "*" matches any host. Addresses must be public either way.
+ALLOWED_HOSTS = tuple(
+    h.strip().lower().lstrip(".")
+    for h in os.getenv("CREATIVE_ALLOWED_HOSTS", "fbcdn.net,cdninstagram.com").split(",")
+    if h.strip()
+)
+# For local testing against fake_cdn.py only: skip the public-address check
+ALLOW_PRIVATE_ADDRESSES = (
+    os.getenv("CREATIVE_ALLOW_PRIVATE_ADDRESSES", "").strip().lower() in ("1", "true", "yes")
+)
+
+# The bytes at a hash never change, so clients and CDNs may keep them forever
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+CREATE_ASSETS_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS ad_creatives (
+        ad_id       TEXT NOT NULL,
+        position    INTEGER NOT NULL DEFAULT 0,   -- carousel card index
+        kind        TEXT NOT NULL,                -- image | video_poster
+        source_url  TEXT NOT NULL,
+        asset_hash  TEXT,                         -- set once fetched
+        status      TEXT NOT NULL DEFAULT 'pending',  -- pending | ok | failed
+        attempts    INTEGER NOT NULL DEFAULT 0,
+        error       TEXT,
+        fetched_at  TEXT,
+        PRIMARY KEY (ad_id, position)
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ad_creatives_status ON ad_creatives(status);",
+    "CREATE INDEX IF NOT EXISTS idx_ad_creatives_url ON ad_creatives(source_url);",
+    """
+    CREATE TABLE IF NOT EXISTS creative_assets (
+        hash                TEXT PRIMARY KEY,     -- sha256 of the original bytes
+        content_type        TEXT NOT NULL,
+        size                INTEGER NOT NULL,
+        width               INTEGER,
+        height              INTEGER,
+        thumb_content_type  TEXT,
+        thumb_size          INTEGER,
+        created_at          TEXT DEFAULT (datetime('now'))
+    );
+    """,
+]
+
+
+# ---------------------------------------------------------------------------
+# On-disk store
+# ---------------------------------------------------------------------------
+
+_dir: Path | None = None
+
+
+def configure(db_path: Path) -> Path:
+    """Keep assets next to `db_path` (override with ASSET_DIR)."""
+    global _dir
+    db_path = Path(db_path)
+    _dir = Path(os.getenv("ASSET_DIR") or db_path.parent / f"{db_path.name}.assets")
+    _dir.mkdir(parents=True, exist_ok=True)
+    return _dir
+
+
+def path(digest: str, thumb: bool = False) -> Path:
+    if _dir is None:
+        raise RuntimeError("creative_assets.configure() has not been called")
+    return _dir / digest[:2] / (f"{digest}.thumb" if thumb else digest)
+
+
+def _write(target: Path, data: bytes) -> None:
+    """Write once: an existing file already holds these bytes."""
+    if target.exists():
+        return
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, target)
+
+
+def valid_hash(digest: str) -> bool:
+    return len(digest) == 64 and all(c in "0123456789abcdef" for c in digest)
+
+
+# ---------------------------------------------------------------------------
+# Thumbnails (run in worker processes)
+# ---------------------------------------------------------------------------
+
+def _thumbnail(data: bytes, max_px: int) -> tuple[bytes, int, int] | None:
+    """(JPEG thumbnail, original width, original height), or None if not decodable."""
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            width, height = im.size
+            im.draft("RGB", (max_px, max_px))  # JPEG: decode at reduced scale
+            small = im.convert("RGB")
+            small.thumbnail((max_px, max_px))
+            out = io.BytesIO()
+            small.save(out, "JPEG", quality=THUMB_QUALITY, optimize=True)
+            return out.getvalue(), width, height
+    except Exception:
+        return None
+
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def _thumb_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the server process has threads (and maybe locks held)
+        _pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+# ---------------------------------------------------------------------------
+# URL policy
+# ---------------------------------------------------------------------------
+
+class BlockedURL(ValueError):
+    """A creative URL whose host is not allowed or resolves to a non-public address."""
+
+
+def allowed(url: str) -> bool:
+    """Scheme and host allow-list check, without DNS. Fetching checks the addresses too."""
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        return False
+    return any(e == "*" or host == e or host.endswith(f".{e}") for e in ALLOWED_HOSTS)
+
+
+async def _resolve(url: str) -> str:
+    """The checked address to connect to for `url`; raises BlockedURL if there is none."""
+    parts = urlsplit(url)
+    if not allowed(url):
+        raise BlockedURL(f"host not allowed: {parts.hostname or url}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            parts.hostname, port, type=socket.SOCK_STREAM
+        )
+    except socket.gaierror as exc:
+        raise ValueError(f"cannot resolve {parts.hostname}") from exc
+    addresses = [ipaddress.ip_address(info[4][0]) for info in infos]
+    if not ALLOW_PRIVATE_ADDRESSES:
+        for address in addresses:
+            if not address.is_global or address.is_multicast:
+                raise BlockedURL(f"{parts.hostname} resolves to non-public address {address}")
+    return str(addresses[0])
+
+
+def _pinned(url: str, address: str) -> tuple[str, dict[str, str], dict[str, Any]]:
+    """`url` rewritten to connect to `address`, with the Host header and TLS name it had."""
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    port = f":{parts.port}" if parts.port else ""
+    netloc = f"[{address}]" if ":" in address else address
+    target = parts._replace(netloc=f"{netloc}{port}").geturl()
+    headers = {"Host": f"[{host}]{port}" if ":" in host else f"{host}{port}"}
+    extensions = {"sni_hostname": host} if parts.scheme == "https" else {}
+    return target, headers, extensions
+
+
+# ---------------------------------------------------------------------------
+# Registration
+# ---------------------------------------------------------------------------
+
+def register(conn: sqlite3.Connection, creatives: Iterable[tuple[str, int, str, str]]) -> int:
+    """
+    Upsert (ad_id, position, kind, source_url) rows. A creative whose URL
+    changed goes back to pending; an unchanged one keeps its asset.
+    """
+    before = conn.total_changes
+    conn.executemany(
+        """
+        INSERT INTO ad_creatives (ad_id, position, kind, source_url)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(ad_id, position) DO UPDATE SET
+            kind = excluded.kind,
+            source_url = excluded.source_url,
+            asset_hash = NULL, status = 'pending', attempts = 0, error = NULL, fetched_at = NULL
+        WHERE ad_creatives.source_url IS NOT excluded.source_url
+           OR ad_creatives.kind IS NOT excluded.kind;
+        """,
+        list(creatives),
+    )
+    return conn.total_changes - before
+
+
+def pending_count(conn: sqlite3.Connection) -> int:
+    return conn.execute(
+        "SELECT COUNT(*) FROM ad_creatives WHERE status != 'ok' AND attempts < ?;",
+        [MAX_ATTEMPTS],
+    ).fetchone()[0]
+
+
+# ---------------------------------------------------------------------------
+# Fetching
+# ---------------------------------------------------------------------------
+
+@dataclass
+class FetchStats:
+    creatives: int = 0          # pending creatives picked up
+    resolved: int = 0           # of those, now pointing at a stored asset
+    urls: int = 0               # distinct URLs downloaded
+    reused_urls: int = 0        # URLs already fetched for another ad
+    new_assets: int = 0
+    duplicate_content: int = 0  # downloads whose bytes were already stored
+    failed: int = 0             # URLs that could not be fetched
+    thumbnails: int = 0
+    bytes_downloaded: int = 0
+    bytes_stored: int = 0
+    seconds: float = 0.0
+
+
+async def _download(client: Any, url: str) -> tuple[bytes, str]:
+    for _ in range(MAX_REDIRECTS + 1):
+        target, headers, extensions = _pinned(url, await _resolve(url))
+        async with client.stream(
+            "GET", target, headers=headers, extensions=extensions, follow_redirects=False
+        ) as response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers["location"])
+                continue
+            if response.status_code != 200:
+                raise ValueError(f"HTTP {response.status_code}")
+            content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+            if not content_type.startswith("image/"):
+                raise ValueError(f"not an image ({content_type or 'no content-type'})")
+            declared = int(response.headers.get("content-length") or 0)
+            if declared > MAX_ASSET_BYTES:
+                raise ValueError(f"too large ({declared} bytes)")
+            chunks, size = [], 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > MAX_ASSET_BYTES:
+                    raise ValueError(f"too large (over {MAX_ASSET_BYTES} bytes)")
+                chunks.append(chunk)
+        return b"".join(chunks), content_type
+    raise ValueError(f"too many redirects (over {MAX_REDIRECTS})")
+
+
+@dataclass
+class Pending:
+    """Pending creatives' URLs, and what downloading them produced."""
+
+    stats: FetchStats
+    resolved: dict[str, str]    # URL -> asset hash
+    to_fetch: list[str]
+    assets: dict[str, tuple[Any, ...]] = field(default_factory=dict)  # creative_assets rows
+    errors: dict[str, str] = field(default_factory=dict)              # URL -> error
+    started: float = field(default_factory=time.perf_counter)
+
+
+def load(conn: sqlite3.Connection, limit: int = 1000) -> Pending:
+    """Read up to `limit` pending creatives and resolve URLs another creative already fetched."""
+    stats = FetchStats()
+    rows = conn.execute(
+        """
+        SELECT ad_id, position, source_url FROM ad_creatives
+        WHERE status != 'ok' AND attempts < ?
+        ORDER BY attempts, ad_id, position LIMIT ?;
+        """,
+        [MAX_ATTEMPTS, limit],
+    ).fetchall()
+    stats.creatives = len(rows)
+
+    urls = sorted({r[2] for r in rows})
+    # URLs some other creative already resolved need no download
+    resolved: dict[str, str] = {}
+    for i in range(0, len(urls), 500):
+        chunk = urls[i:i + 500]
+        resolved.update(
+            conn.execute(
+                f"SELECT source_url, asset_hash FROM ad_creatives "
+                f"WHERE status = 'ok' AND source_url IN ({','.join('?' * len(chunk))});",
+                chunk,
+            ).fetchall()
+        )
+    to_fetch = [u for u in urls if u not in resolved]
+    stats.reused_urls = len(urls) - len(to_fetch)
+    stats.urls = len(to_fetch)
+    return Pending(stats, resolved, to_fetch)
+
+
+async def download(pending: Pending, client: Any = None) -> None:
+    """
+    Download, store and thumbnail the URLs in `pending.to_fetch`, concurrently.
+    No database access: the file store is content-addressed, so bytes already
+    on disk were stored by an earlier run. Pass an httpx.AsyncClient to reuse
+    its pool; otherwise one is opened for the run.
+    """
+    import httpx
+
+    stats, assets = pending.stats, pending.assets
+    sem = asyncio.Semaphore(FETCH_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+
+    async def one(http: Any, url: str) -> None:
+        async with sem:
+            try:
+                data, content_type = await _download(http, url)
+            except Exception as exc:
+                pending.errors[url] = str(exc) or type(exc).__name__
+                return
+        stats.bytes_downloaded += len(data)
+        digest = hashlib.sha256(data).hexdigest()
+        pending.resolved[url] = digest
+        if digest in assets:
+            stats.duplicate_content += 1
+            return
+        if path(digest).exists():
+            # The row is normally there already; rebuild it if a run stopped before committing
+            thumb_file = path(digest, thumb=True)
+            thumb_size = thumb_file.stat().st_size if thumb_file.exists() else None
+            assets[digest] = (
+                digest, content_type, len(data), None, None,
+                "image/jpeg" if thumb_size else None, thumb_size,
+            )
+            stats.duplicate_content += 1
+            return
+        assets[digest] = (digest, content_type, len(data), None, None, None, None)
+        await loop.run_in_executor(None, _write, path(digest), data)
+        stats.bytes_stored += len(data)
+
+        thumb = None
+        if Image is not None:
+            thumb = await loop.run_in_executor(_thumb_pool(), _thumbnail, data, THUMB_PX)
+        if thumb is not None:
+            thumb_bytes, width, height = thumb
+            await loop.run_in_executor(None, _write, path(digest, thumb=True), thumb_bytes)
+            assets[digest] = (
+                digest, content_type, len(data), width, height, "image/jpeg", len(thumb_bytes)
+            )
+            stats.thumbnails += 1
+
+    if not pending.to_fetch:
+        return
+    if client is not None:
+        await asyncio.gather(*(one(client, u) for u in pending.to_fetch))
+        return
+    limits = httpx.Limits(
+        max_connections=FETCH_CONCURRENCY, max_keepalive_connections=FETCH_CONCURRENCY
+    )
+    async with httpx.AsyncClient(
+        limits=limits, timeout=FETCH_TIMEOUT_S, follow_redirects=False
+    ) as http:
+        await asyncio.gather(*(one(http, u) for u in pending.to_fetch))
+
+
+def store(conn: sqlite3.Connection, pending: Pending) -> None:
+    """Record new assets and point creatives at them or at their error; caller commits."""
+    stats = pending.stats
+    before = conn.total_changes
+    conn.executemany(
+        """
+        INSERT OR IGNORE INTO creative_assets (
+            hash, content_type, size, width, height, thumb_content_type, thumb_size
+        ) VALUES (?, ?, ?, ?, ?, ?, ?);
+        """,
+        list(pending.assets.values()),
+    )
+    stats.new_assets = conn.total_changes - before
+    before = conn.total_changes
+    conn.executemany(
+        """
+        UPDATE ad_creatives
+        SET asset_hash = ?, status = 'ok', error = NULL, fetched_at = datetime('now'),
+            attempts = attempts + 1
+        WHERE source_url = ? AND status != 'ok';
+        """,
+        list((digest, url) for url, digest in pending.resolved.items()),
+    )
+    stats.resolved = conn.total_changes - before
+    conn.executemany(
+        """
+        UPDATE ad_creatives SET status = 'failed', error = ?, attempts = attempts + 1
+        WHERE source_url = ? AND status != 'ok';
+        """,
+        [(error, url) for url, error in pending.errors.items()],
+    )
+    stats.failed = len(pending.errors)
+    stats.seconds = round(time.perf_counter() - pending.started, 3)
+
+
+async def fetch_pending(
+    conn: sqlite3.Connection, limit: int = 1000, client: Any = None
+) -> FetchStats:
+    """
+    Download and store every pending creative (up to `limit`); caller
+    commits. All writes happen after the downloads finish, so no write lock
+    is held across the network.
+    """
+    pending = load(conn, limit)
+    await download(pending, client)
+    store(conn, pending)
+    return pending.stats
+
+
+# ---------------------------------------------------------------------------
+# Reads
+# ---------------------------------------------------------------------------
+
+def asset_url(digest: str, thumb: bool = False) -> str:
+    return f"/api/assets/{digest}/thumb" if thumb else f"/api/assets/{digest}"
+
+
+def thumbnails(conn: sqlite3.Connection, ad_ids: list[str]) -> dict[str, str]:
+    """Thumbnail URL of each ad's first fetched creative, for ads that have one."""
+    out: dict[str, str] = {}
+    for i in range(0, len(ad_ids), 500):
+        chunk = ad_ids[i:i + 500]
+        for ad_id, digest in conn.execute(
+            f"""
+            SELECT ad_id, asset_hash FROM ad_creatives
+            WHERE ad_id IN ({','.join('?' * len(chunk))}) AND status = 'ok'
+            ORDER BY ad_id, position DESC;
+            """,
+            chunk,
+        ):
+            out[ad_id] = asset_url(digest, thumb=True)  # lowest position wins
+    return out
+
+
+def for_ad(conn: sqlite3.Connection, ad_id: str) -> list[dict[str, Any]]:
+    rows = conn.execute(
+        """
+        SELECT c.position, c.kind, c.status, c.asset_hash, a.width, a.height
+        FROM ad_creatives c LEFT JOIN creative_assets a ON a.hash = c.asset_hash
+        WHERE c.ad_id = ? ORDER BY c.position;
+        """,
+        [ad_id],
+    ).fetchall()
+    return [
+        {
+            "position": position,
+            "kind": kind,
+            "status": status,
+            "url": asset_url(digest) if digest else None,
+            "thumbnail_url": asset_url(digest, thumb=True) if digest else None,
+            "width": width,
+            "height": height,
+        }
+        for position, kind, status, digest, width, height in rows
+    ]
+
+
+def lookup(conn: sqlite3.Connection, digest: str, thumb: bool) -> tuple[Path, str] | None:
+    """File and content type to serve for an asset; the original if there is no thumbnail."""
+    row = conn.execute(
+        "SELECT content_type, thumb_content_type FROM creative_assets WHERE hash = ?;", [digest]
+    ).fetchone()
+    if row is None:
+        return None
+    content_type, thumb_type = row
+    if thumb and thumb_type:
+        return path(digest, thumb=True), thumb_type
+    return path(digest), content_type
@@ -0,0 +1,58 @@
+"""
+data_version.py
+A single monotonically increasing counter for `competitor_ads` contents.
+
+Every ingest path calls `bump()` inside its write transaction, so anything
+derived from the ads table (snapshots, caches) can be keyed on `current()`
+and stays valid until the next committed write. `PRAGMA data_version` is not
+used because it is only meaningful within a single connection.
+
+The same table holds `database_id`, a random number written once when the
+database is created. A recreated database starts again at version 1, so
+anything cached outside the file (shared_cache) is keyed on both.
+"""
+
+from __future__ import annotations
+
+import secrets
+import sqlite3
+
+CREATE_META_SQL = """
+CREATE TABLE IF NOT EXISTS meta (
+    key    TEXT PRIMARY KEY,
+    value  INTEGER NOT NULL
+);
+"""
+
+_KEY = "data_version"
+_ID_KEY = "database_id"
+
+
+def current(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?;", [_KEY]).fetchone()
+    return row[0] if row else 0
+
+
+def bump(conn: sqlite3.Connection) -> int:
+    """Increment the version as part of the caller's transaction."""
+    conn.execute(
+        """
+        INSERT INTO meta (key, value) VALUES (?, 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1;
+        """,
+        [_KEY],
+    )
+    return current(conn)
+
+
+def database_id(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?;", [_ID_KEY]).fetchone()
+    return row[0] if row else 0
+
+
+def create_database_id(conn: sqlite3.Connection) -> None:
+    """Give the database its random identity; a no-op if it already has one."""
+    conn.execute(
+        "INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?);",
+        [_ID_KEY, secrets.randbits(63)],
+    )
@@ -0,0 +1,328 @@
+"""
+enrichment.py
+The single stage through which ads are sent to Claude for tagging.
+
+A run drains `enrichment_queue` (filled by ad_classifier with ads it could
+not label confidently):
+
+1. Each queued ad is keyed by a content hash of its headline + body. Hashes
+   already in `enrichment_cache` are applied without an API call, and
+   duplicate creatives within a run collapse to one request slot, so the
+   same copy is never sent twice.
+2. Remaining hashes are packed BATCH_SIZE to a request. The model must
+   answer through the `record_labels` tool, whose input schema constrains
+   themes and tones to the known label sets.
+3. Requests run with at most MAX_CONCURRENCY in flight, each attempt
+   through llm_client.acall (shared pooled client, the "enrichment" circuit
+   breaker and /metrics counters, REQUEST_DEADLINE_S per attempt). Attempts
+   are retried with exponential backoff (honouring Retry-After) on rate
+   limits, overload, 5xx, connection errors and missed deadlines.
+4. A per-run token budget is reserved before each request from a
+   character-count estimate and settled against the reported usage; once
+   it is spent no new requests start and the rest stay queued.
+
+Only ads in the hot table are labelled. Ads that ended long enough ago to
+be archived (ad_archive) are taken off the queue when they move, and queue
+entries whose ad is gone (archived earlier, or wiped by a clearing seed)
+are dropped at the end of each run: their labels are already folded into
+the archive's rollups, and relabelling them would be wasted work.
+
+Runs use llm_client's shared async client unless one is passed in, so
+they follow ANTHROPIC_BASE_URL and can target a local stub (stub_llm.py).
+
+A run has three phases: `load` reads the queue and the cache, `label` makes
+the API calls, and `store` writes the results. Only `label` touches the
+network, and it does no database work, so an async caller can run the other
+two in a worker thread. `run` does all three on one connection.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sqlite3
+from dataclasses import dataclass
+from typing import Any
+
+import llm_client
+
+MODEL = "claude-haiku-4-5-20251001"
+BATCH_SIZE = 25
+MAX_CONCURRENCY = 4
+MAX_ATTEMPTS = 4
+BACKOFF_BASE_S = 0.5
+REQUEST_DEADLINE_S = 30.0
+MAX_TOKENS_PER_AD = 80
+DEFAULT_TOKEN_BUDGET = 200_000
+
+SOURCE_LLM = "llm"
+
+CREATE_CACHE_SQL = """
+CREATE TABLE IF NOT EXISTS enrichment_cache (
+    content_hash    TEXT PRIMARY KEY,
+    message_theme   TEXT NOT NULL,
+    emotional_tone  TEXT NOT NULL,
+    summary         TEXT,
+    model           TEXT NOT NULL,
+    created_at      TEXT NOT NULL DEFAULT (datetime('now'))
+) WITHOUT ROWID;
+"""
+
+
+def content_hash(headline: str | None, body_text: str | None) -> str:
+    text = re.sub(r"\s+", " ", f"{headline or ''}\n{body_text or ''}").strip().lower()
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Prompt
+# ---------------------------------------------------------------------------
+
+def _label_sets() -> tuple[list[str], list[str]]:
+    from scraper.mock_data import COPY_BANK, EMOTIONAL_TONES
+
+    return sorted(COPY_BANK), list(EMOTIONAL_TONES)
+
+
+def _tool() -> dict[str, Any]:
+    themes, tones = _label_sets()
+    return {
+        "name": "record_labels",
+        "description": "Record the message theme, emotional tone and a one-line summary for each ad.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "labels": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "string"},
+                            "message_theme": {"type": "string", "enum": themes},
+                            "emotional_tone": {"type": "string", "enum": tones},
+                            "summary": {"type": "string"},
+                        },
+                        "required": ["id", "message_theme", "emotional_tone", "summary"],
+                    },
+                },
+            },
+            "required": ["labels"],
+        },
+    }
+
+
+SYSTEM_PROMPT = (
+    "You label health and wellness ads from Meta's Ad Library for a competitive "
+    "intelligence team. For every ad, pick the single best message theme and "
+    "emotional tone from the allowed values and write a summary of at most 15 "
+    "words. Call record_labels exactly once with one entry per ad id."
+)
+
+
+def _user_message(batch: list[tuple[str, str]]) -> str:
+    return json.dumps([{"id": h[:12], "text": text} for h, text in batch], ensure_ascii=False)
+
+
+def _estimate_tokens(batch: list[tuple[str, str]]) -> int:
+    chars = len(SYSTEM_PROMPT) + len(json.dumps(_tool())) + len(_user_message(batch))
+    return chars // 4 + MAX_TOKENS_PER_AD * len(batch)
+
+
+# ---------------------------------------------------------------------------
+# Run
+# ---------------------------------------------------------------------------
+
+@dataclass
+class RunStats:
+    """`queued` counts ads; every other count is of unique creatives."""
+
+    queued: int = 0
+    unique_creatives: int = 0
+    cache_hits: int = 0
+    requests: int = 0
+    retries: int = 0
+    enriched: int = 0
+    failed: int = 0
+    tokens_used: int = 0
+    budget_exhausted: bool = False
+
+
+async def _call(client: Any, batch: list[tuple[str, str]], stats: RunStats) -> Any:
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            stats.requests += 1
+            return await llm_client.acall(
+                "enrichment",
+                REQUEST_DEADLINE_S,
+                api=client,
+                model=MODEL,
+                max_tokens=MAX_TOKENS_PER_AD * len(batch),
+                system=SYSTEM_PROMPT,
+                tools=[_tool()],
+                tool_choice={"type": "tool", "name": "record_labels"},
+                messages=[{"role": "user", "content": _user_message(batch)}],
+            )
+        except llm_client.LLMUnavailable as exc:
+            if not exc.retryable or attempt == MAX_ATTEMPTS - 1:
+                raise
+            stats.retries += 1
+            delay = exc.retry_after_s or BACKOFF_BASE_S * 2**attempt
+            await asyncio.sleep(delay * (1 + random.random() * 0.25))
+    raise AssertionError("unreachable")
+
+
+def _parse(response: Any, batch: list[tuple[str, str]]) -> dict[str, dict[str, str]]:
+    """Validated labels keyed by full content hash; bad entries are dropped."""
+    themes, tones = _label_sets()
+    by_short = {h[:12]: h for h, _ in batch}
+    out: dict[str, dict[str, str]] = {}
+    for block in response.content:
+        if getattr(block, "type", None) != "tool_use" or block.name != "record_labels":
+            continue
+        for label in block.input.get("labels", []):
+            h = by_short.get(str(label.get("id")))
+            if h and label.get("message_theme") in themes and label.get("emotional_tone") in tones:
+                out[h] = {
+                    "message_theme": label["message_theme"],
+                    "emotional_tone": label["emotional_tone"],
+                    "summary": str(label.get("summary", ""))[:200],
+                }
+    return out
+
+
+def _apply(conn: sqlite3.Connection, ad_ids: list[str], labels: dict[str, str]) -> None:
+    for i in range(0, len(ad_ids), 500):
+        chunk = ad_ids[i:i + 500]
+        marks = ",".join("?" * len(chunk))
+        conn.execute(
+            f"""
+            UPDATE competitor_ads
+            SET message_theme = ?, emotional_tone = ?,
+                theme_confidence = 1.0, tone_confidence = 1.0, label_source = ?
+            WHERE ad_id IN ({marks});
+            """,
+            [labels["message_theme"], labels["emotional_tone"], SOURCE_LLM, *chunk],
+        )
+        conn.execute(f"DELETE FROM enrichment_queue WHERE ad_id IN ({marks});", chunk)
+
+
+@dataclass
+class Pending:
+    """Queued ads grouped by creative, and the labels the cache already has."""
+
+    stats: RunStats
+    ads_by_hash: dict[str, list[str]]
+    text_by_hash: dict[str, str]
+    cached: list[tuple[str, dict[str, str]]]
+
+
+def load(conn: sqlite3.Connection, max_ads: int = 1000) -> Pending:
+    """Read up to `max_ads` queued ads and look their creatives up in the cache."""
+    stats = RunStats()
+    rows = conn.execute(
+        """
+        SELECT q.ad_id, a.headline, a.body_text
+        FROM enrichment_queue q JOIN competitor_ads a ON a.ad_id = q.ad_id
+        ORDER BY q.queued_at, q.ad_id
+        LIMIT ?;
+        """,
+        [max_ads],
+    ).fetchall()
+    stats.queued = len(rows)
+
+    ads_by_hash: dict[str, list[str]] = {}
+    text_by_hash: dict[str, str] = {}
+    for ad_id, headline, body in rows:
+        h = content_hash(headline, body)
+        ads_by_hash.setdefault(h, []).append(ad_id)
+        text_by_hash.setdefault(h, f"{headline or ''}\n{body or ''}".strip())
+    stats.unique_creatives = len(ads_by_hash)
+
+    cached: list[tuple[str, dict[str, str]]] = []
+    hashes = list(ads_by_hash)
+    for i in range(0, len(hashes), 500):
+        chunk = hashes[i:i + 500]
+        for h, theme, tone in conn.execute(
+            f"SELECT content_hash, message_theme, emotional_tone FROM enrichment_cache "
+            f"WHERE content_hash IN ({','.join('?' * len(chunk))});",
+            chunk,
+        ):
+            cached.append((h, {"message_theme": theme, "emotional_tone": tone}))
+    stats.cache_hits = len(cached)
+    return Pending(stats, ads_by_hash, text_by_hash, cached)
+
+
+async def label(
+    pending: Pending, client: Any = None, token_budget: int = DEFAULT_TOKEN_BUDGET
+) -> dict[str, dict[str, str]]:
+    """Label the creatives the cache did not have. No database access."""
+    stats = pending.stats
+    cached_hashes = {h for h, _ in pending.cached}
+    todo = [(h, pending.text_by_hash[h]) for h in pending.ads_by_hash if h not in cached_hashes]
+    batches = [todo[i:i + BATCH_SIZE] for i in range(0, len(todo), BATCH_SIZE)]
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    reserved = 0
+    fresh: dict[str, dict[str, str]] = {}
+
+    async def process(batch: list[tuple[str, str]]) -> None:
+        nonlocal reserved
+        async with sem:
+            estimate = _estimate_tokens(batch)
+            if stats.tokens_used + reserved + estimate > token_budget:
+                stats.budget_exhausted = True
+                return
+            reserved += estimate
+            try:
+                response = await _call(client, batch, stats)
+            except Exception:
+                stats.failed += len(batch)
+                return
+            finally:
+                reserved -= estimate
+            usage = response.usage
+            stats.tokens_used += usage.input_tokens + usage.output_tokens
+
+        labels = _parse(response, batch)
+        fresh.update(labels)
+        stats.failed += len(batch) - len(labels)
+
+    await asyncio.gather(*(process(b) for b in batches))
+    stats.enriched = len(fresh)
+    return fresh
+
+
+def store(conn: sqlite3.Connection, pending: Pending, fresh: dict[str, dict[str, str]]) -> None:
+    """Cache the new labels and apply new and cached ones to their ads; caller commits."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO enrichment_cache "
+        "(content_hash, message_theme, emotional_tone, summary, model) VALUES (?, ?, ?, ?, ?);",
+        [(h, l["message_theme"], l["emotional_tone"], l["summary"], MODEL) for h, l in fresh.items()],
+    )
+    for h, labels in [*pending.cached, *fresh.items()]:
+        _apply(conn, pending.ads_by_hash[h], labels)
+    conn.execute(
+        "DELETE FROM enrichment_queue WHERE ad_id NOT IN (SELECT ad_id FROM competitor_ads);"
+    )
+
+
+async def run(
+    conn: sqlite3.Connection,
+    client: Any = None,
+    max_ads: int = 1000,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+) -> RunStats:
+    """
+    Enrich up to `max_ads` queued ads; caller commits. All writes happen
+    after the API calls finish, so no write lock is held across the network.
+    """
+    pending = load(conn, max_ads)
+    fresh = await label(pending, client, token_budget)
+    store(conn, pending, fresh)
+    return pending.stats
+
+
+def queue_depth(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COUNT(*) FROM enrichment_queue;").fetchone()[0]
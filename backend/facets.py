@@ -0,0 +1,136 @@
+"""
+facets.py
+In-memory bitmap indexes for faceted filter counts.
+
+Every ad gets a bit position; each (dimension, value) pair owns a bitmap —
+a Python int used as a bitset — with that value's ads set. A facet count is
+then `(bitmap & selection_mask).bit_count()`, so counting every value of
+every dimension is a few dozen big-int ANDs rather than one COUNT(*) per
+option.
+
+Counts follow the usual faceting rule: a dimension's own selection is not
+applied to its counts (with brand=man_matters selected, the brand facet
+still shows what each other brand would return), while every other
+dimension's selection is.
+
+The index is rebuilt lazily whenever the data version changes.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from typing import Any
+
+import data_version
+
+# Filter parameter name → competitor_ads column (same names as /api/ads)
+DIMENSIONS: dict[str, str] = {
+    "brand": "brand",
+    "competitor": "competitor_name",
+    "theme": "message_theme",
+    "tone": "emotional_tone",
+    "ad_format": "ad_format",
+    "is_active": "is_active",
+}
+
+
+class FacetIndex:
+    def __init__(self, version: int, size: int, bitmaps: dict[str, dict[Any, int]]) -> None:
+        self.version = version
+        self.size = size
+        self.all = (1 << size) - 1
+        self.bitmaps = bitmaps
+
+    @classmethod
+    def build(cls, conn: sqlite3.Connection) -> FacetIndex:
+        version = data_version.current(conn)
+        columns = ", ".join(DIMENSIONS.values())
+        rows = conn.execute(f"SELECT {columns} FROM competitor_ads ORDER BY rowid;").fetchall()
+
+        # Collect positions per value in bytearrays, then convert each to an
+        # int once — setting bits on an int directly would be O(n²).
+        n_bytes = (len(rows) + 7) // 8
+        raw: dict[str, dict[Any, bytearray]] = {dim: {} for dim in DIMENSIONS}
+        for pos, row in enumerate(rows):
+            byte, bit = pos >> 3, 1 << (pos & 7)
+            for dim, value in zip(DIMENSIONS, row):
+                if dim == "is_active":
+                    value = bool(value)
+                buf = raw[dim].get(value)
+                if buf is None:
+                    buf = raw[dim][value] = bytearray(n_bytes)
+                buf[byte] |= bit
+
+        bitmaps = {
+            dim: {value: int.from_bytes(buf, "little") for value, buf in values.items()}
+            for dim, values in raw.items()
+        }
+        return cls(version, len(rows), bitmaps)
+
+    def _mask(self, selection: dict[str, Any], skip: str | None = None) -> int:
+        mask = self.all
+        for dim, value in selection.items():
+            if dim != skip:
+                mask &= self.bitmaps[dim].get(value, 0)
+        return mask
+
+    def total(self, selection: dict[str, Any]) -> int:
+        return self._mask({d: v for d, v in selection.items() if v is not None}).bit_count()
+
+    def counts(self, selection: dict[str, Any]) -> dict[str, Any]:
+        """Counts for every value of every dimension, plus the selection's total."""
+        selection = {d: v for d, v in selection.items() if v is not None}
+        facets: dict[str, list[dict[str, Any]]] = {}
+        for dim, values in self.bitmaps.items():
+            mask = self._mask(selection, skip=dim)
+            facets[dim] = sorted(
+                (
+                    {"value": value, "count": (bitmap & mask).bit_count()}
+                    for value, bitmap in values.items()
+                ),
+                key=lambda f: (-f["count"], str(f["value"])),
+            )
+        return {"total": self._mask(selection).bit_count(), "facets": facets}
+
+
+def add_counts(
+    result: dict[str, Any], extra: dict[str, dict[Any, int]], extra_total: int
+) -> dict[str, Any]:
+    """
+    Fold counts kept outside the index (ad_counts.facet_counts over the
+    archive) into a counts() result.
+    """
+    result["total"] += extra_total
+    for dim, counts in extra.items():
+        merged = {f["value"]: f["count"] for f in result["facets"][dim]}
+        for value, n in counts.items():
+            merged[value] = merged.get(value, 0) + n
+        result["facets"][dim] = sorted(
+            ({"value": value, "count": n} for value, n in merged.items()),
+            key=lambda f: (-f["count"], str(f["value"])),
+        )
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Memoization
+# ---------------------------------------------------------------------------
+
+_index: FacetIndex | None = None
+_lock = threading.Lock()
+
+
+def peek_index() -> FacetIndex | None:
+    """The last built index, whatever its version; never rebuilds."""
+    return _index
+
+
+def get_index(conn: sqlite3.Connection) -> FacetIndex:
+    """Return the current index, rebuilding it once per data version."""
+    global _index
+    version = data_version.current(conn)
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = FacetIndex.build(conn)
+        return _index
@@ -0,0 +1,163 @@
+"""
+fake_cdn.py
+Local stand-in for the ad creative CDN, for exercising creative_assets
+end to end without network access.
+
+    python fake_cdn.py --port 8788 [--latency-s 0.05]
+
+Paths:
+- /img/<seed>.png?w=&h=  a deterministic PNG (same seed and size, same bytes)
+- /alias/<any>/<seed>.png  the same bytes as /img/<seed>.png under another
+  URL, the way one creative is served under many signed CDN links
+- /flaky/<seed>.png  503 on the first request for the path, then the
+  image, like a CDN edge that is briefly overloaded
+- /redirect?to=<url>  302 to <url>, like a link shortener or signed-URL hop
+- /expired/...  403, like an expired signed URL
+- /html/...  200 text/html, like a login or consent page
+
+Every response waits --latency-s first. Connections are kept alive. The
+server records each request path on `server.requests` and each client
+connection on `server.connections`, and tracks the peak of concurrent
+requests in `server.peak_concurrency`, so pooling and concurrency can be
+checked.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+
+def png(seed: int, width: int, height: int) -> bytes:
+    """An RGB PNG with a seed-dependent colour and gradient."""
+    rng = random.Random(seed)
+    r, g, b = rng.randrange(256), rng.randrange(256), rng.randrange(256)
+    stripe = rng.randrange(8, 64)
+    raw = bytearray()
+    for y in range(height):
+        shade = (g + y) & 255
+        band = bytes((r, shade, b)) * stripe + bytes((255 - r, shade, 255 - b)) * stripe
+        raw += b"\x00" + (band * (width * 3 // len(band) + 1))[: width * 3]
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(bytes(raw), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+class FakeCDN(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, latency_s: float = 0.0) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency_s = latency_s
+        self.requests: list[str] = []
+        self.connections: set[tuple[str, int]] = set()
+        self.active = 0
+        self.peak_concurrency = 0
+        self.lock = threading.Lock()
+        self._images: dict[tuple[int, int, int], bytes] = {}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def image(self, seed: int, width: int, height: int) -> bytes:
+        key = (seed, width, height)
+        with self.lock:
+            cached = self._images.get(key)
+        if cached is None:
+            cached = png(seed, width, height)
+            with self.lock:
+                self._images[key] = cached
+        return cached
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeCDN
+    protocol_version = "HTTP/1.1"  # keep-alive, so client pooling is visible
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def _send(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _redirect(self, location: str) -> None:
+        self.send_response(302)
+        self.send_header("location", location)
+        self.send_header("content-length", "0")
+        self.end_headers()
+
+    def do_GET(self) -> None:  # noqa: N802
+        with self.server.lock:
+            self.server.requests.append(self.path)
+            self.server.connections.add(self.client_address)
+            self.server.active += 1
+            self.server.peak_concurrency = max(self.server.peak_concurrency, self.server.active)
+        try:
+            time.sleep(self.server.latency_s)
+            self._route()
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def _route(self) -> None:
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        query = parse_qs(url.query)
+        if parts[0] == "redirect" and "to" in query:
+            self._redirect(query["to"][0])
+        elif parts[0] == "flaky" and self.server.requests.count(self.path) == 1:
+            self._send(503, "text/plain", b"try again")
+        elif parts[0] == "expired":
+            self._send(403, "text/plain", b"URL signature expired")
+        elif parts[0] == "html":
+            self._send(200, "text/html; charset=utf-8", b"<html><body>Log in</body></html>")
+        elif parts[0] in ("img", "alias", "flaky") and parts[-1].endswith(".png"):
+            try:
+                seed = int(parts[-1][: -len(".png")])
+                width = int(query.get("w", ["640"])[0])
+                height = int(query.get("h", ["640"])[0])
+            except ValueError:
+                self._send(400, "text/plain", b"bad image path")
+                return
+            self._send(200, "image/png", self.server.image(seed, width, height))
+        else:
+            self._send(404, "text/plain", b"not found")
+
+
+def serve_in_thread(port: int = 0, latency_s: float = 0.0) -> FakeCDN:
+    """Start a fake CDN on `port` (0 = any free port) in a daemon thread."""
+    server = FakeCDN(port, latency_s)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--latency-s", type=float, default=0.0)
+    args = parser.parse_args()
+    FakeCDN(args.port, args.latency_s).serve_forever()
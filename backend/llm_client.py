@@ -0,0 +1,414 @@
+"""
+llm_client.py
+One shared, bounded-latency client for Anthropic calls.
+
+Every synchronous call goes through the same `anthropic.Anthropic` client. Its httpx
+pool keeps connections to the API alive between requests, so a call does
+not pay for a new TLS handshake. The SDK's own retries are off. Instead,
+each call gets an overall deadline, and this module decides what to do
+inside it:
+
+- A hedged call starts a second, identical attempt if the first has not
+  answered within the recent p95 latency for that call name. The first
+  success wins. Calls that are expensive to duplicate pass `hedge=False`.
+- A retryable failure (connection error, timeout, 429, 5xx) starts another
+  attempt right away, honouring Retry-After, for as long as time remains.
+- Each attempt's HTTP timeout is the time left on the deadline, so losing
+  or abandoned attempts end when the deadline does.
+
+Each call name has its own circuit breaker, so slow summaries on a short
+deadline cannot shut off briefs on a long one. After BREAKER_FAILURES
+consecutive failed calls it opens, and calls of that name fail at once
+for BREAKER_RESET_S. Then a single probe call is let through (half-open).
+A success closes the breaker, and a failure opens it again. Only upstream
+trouble counts as a failure: retryable errors and missed deadlines. A
+non-retryable error such as 400 or 401 means the API answered, so it
+leaves the breaker alone.
+
+`acall` is the async counterpart for code already on an event loop (the
+enrichment pipeline). It makes a single attempt within a deadline, behind
+the same per-name breaker and counters, on a shared `AsyncAnthropic`
+client per event loop; callers that retry do so around it.
+
+Any failure is raised as LLMUnavailable, so callers can fall back
+immediately. Breaker state and per-name latency percentiles are exposed on
+/metrics. State is per worker process.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any
+
+MAX_ATTEMPTS = 3
+MAX_CONNECTIONS = 16
+MAX_CONCURRENCY = 8
+
+# Before there are enough samples for a p95, hedge at this share of the deadline
+MIN_LATENCY_SAMPLES = 20
+DEFAULT_HEDGE_FRACTION = 0.5
+MIN_HEDGE_AFTER_S = 0.2
+LATENCY_WINDOW = 200
+
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_RESET_S = float(os.getenv("LLM_BREAKER_RESET_S", "30"))
+
+# Too little time left to be worth another attempt
+MIN_ATTEMPT_S = 0.05
+
+
+class LLMUnavailable(RuntimeError):
+    """The call failed, missed its deadline or was refused by the open breaker."""
+
+    def __init__(self, reason: str, retry_after_s: float = 0.0, retryable: bool = False) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+        self.retryable = retryable
+
+
+def retryable(exc: BaseException) -> tuple[bool, float | None]:
+    """Whether another attempt may succeed, and the server's Retry-After if it sent one."""
+    import anthropic
+
+    if isinstance(exc, (anthropic.APIConnectionError, anthropic.APITimeoutError)):
+        return True, None
+    if isinstance(exc, anthropic.APIStatusError):
+        if exc.status_code == 429 or exc.status_code >= 500:
+            retry_after = exc.response.headers.get("retry-after")
+            try:
+                return True, float(retry_after) if retry_after else None
+            except ValueError:
+                return True, None
+    return False, None
+
+
+# ---------------------------------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------------------------------
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed → open → half-open (one probe) → closed."""
+
+    def __init__(self, failures: int, reset_s: float) -> None:
+        self.failures = failures
+        self.reset_s = reset_s
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened = 0
+        self.short_circuited = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() >= self._open_until:
+                self.state = "half_open"
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def retry_after_s(self) -> float:
+        return max(self._open_until - time.monotonic(), 0.0)
+
+    def success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probing = False
+
+    def release(self) -> None:
+        """The call ended without telling us anything about upstream health."""
+        with self._lock:
+            self._probing = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failures:
+                if self.state != "open":
+                    self.opened += 1
+                self.state = "open"
+                self._open_until = time.monotonic() + self.reset_s
+            self._probing = False
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+            "short_circuited": self.short_circuited,
+            "open_for_s": round(self.retry_after_s(), 1) if self.state == "open" else 0.0,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Per-name counters
+# ---------------------------------------------------------------------------
+
+class _Counters:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.ok = 0
+        self.failed = 0
+        self.deadline_exceeded = 0
+        self.attempts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.retries = 0
+        self.latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def add(self, field: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def succeeded(self, latency_s: float, hedge_won: bool = False) -> None:
+        with self._lock:
+            self.ok += 1
+            self.hedge_wins += hedge_won
+            self.latencies.append(latency_s)
+
+    def percentile(self, q: float) -> float | None:
+        with self._lock:
+            ordered = sorted(self.latencies)
+        if not ordered:
+            return None
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def stats(self) -> dict[str, Any]:
+        def ms(value: float | None) -> float | None:
+            return round(value * 1000, 1) if value is not None else None
+
+        with self._lock:
+            slowest = max(self.latencies, default=None)
+        return {
+            "calls": self.calls,
+            "ok": self.ok,
+            "failed": self.failed,
+            "deadline_exceeded": self.deadline_exceeded,
+            "attempts": self.attempts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "retries": self.retries,
+            "latency_ms": {
+                "p50": ms(self.percentile(0.5)),
+                "p95": ms(self.percentile(0.95)),
+                "p99": ms(self.percentile(0.99)),
+                "max": ms(slowest),
+            },
+        }
+
+
+_lock = threading.Lock()
+_counters: dict[str, _Counters] = {}
+_breakers: dict[str, CircuitBreaker] = {}
+_clients: dict[tuple[str, str | None], Any] = {}
+# An async client's connection pool belongs to the loop it was opened on
+_async_clients: weakref.WeakKeyDictionary[Any, dict[tuple[str, str | None], Any]] = (
+    weakref.WeakKeyDictionary()
+)
+_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="llm")
+
+
+def _counter(name: str) -> _Counters:
+    with _lock:
+        return _counters.setdefault(name, _Counters())
+
+
+def breaker(name: str) -> CircuitBreaker:
+    with _lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET_S)
+        return _breakers[name]
+
+
+def _client_key() -> tuple[str, str | None]:
+    return os.getenv("ANTHROPIC_API_KEY", "").strip(), os.getenv("ANTHROPIC_BASE_URL") or None
+
+
+def _limits() -> Any:
+    import httpx
+
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONCURRENCY)
+
+
+def client() -> Any:
+    """The shared client for the current API key and base URL (pooled connections)."""
+    import anthropic  # type: ignore
+
+    key = _client_key()
+    with _lock:
+        if key not in _clients:
+            _clients[key] = anthropic.Anthropic(
+                api_key=key[0],
+                base_url=key[1],
+                max_retries=0,
+                http_client=anthropic.DefaultHttpxClient(limits=_limits()),
+            )
+        return _clients[key]
+
+
+def async_client() -> Any:
+    """The shared async client for the running event loop, API key and base URL."""
+    import anthropic  # type: ignore
+
+    key = _client_key()
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        if key not in clients:
+            clients[key] = anthropic.AsyncAnthropic(
+                api_key=key[0],
+                base_url=key[1],
+                max_retries=0,
+                http_client=anthropic.DefaultAsyncHttpxClient(limits=_limits()),
+            )
+        return clients[key]
+
+
+def hedge_after_s(name: str, deadline_s: float) -> float:
+    c = _counter(name)
+    p95 = c.percentile(0.95) if len(c.latencies) >= MIN_LATENCY_SAMPLES else None
+    if p95 is None:
+        p95 = deadline_s * DEFAULT_HEDGE_FRACTION
+    return max(p95, MIN_HEDGE_AFTER_S)
+
+
+# ---------------------------------------------------------------------------
+# Calls
+# ---------------------------------------------------------------------------
+
+def call(name: str, deadline_s: float, hedge: bool = True, **request: Any) -> Any:
+    """
+    messages.create(**request) within `deadline_s` seconds, hedged and
+    retried as described above. Raises LLMUnavailable on any failure.
+    """
+    c = _counter(name)
+    c.add("calls")
+    gate = breaker(name)
+    if not gate.allow():
+        raise LLMUnavailable("circuit open", gate.retry_after_s())
+
+    api = client()
+    t0 = time.monotonic()
+    deadline = t0 + deadline_s
+    pending: dict[Future[Any], str] = {}
+    attempts = 0
+
+    def launch(kind: str) -> None:
+        nonlocal attempts
+        attempts += 1
+        c.add("attempts")
+        future = _pool.submit(api.messages.create, timeout=deadline - time.monotonic(), **request)
+        pending[future] = kind
+
+    launch("first")
+    hedge_at = t0 + hedge_after_s(name, deadline_s) if hedge else None
+    retry_at: float | None = None
+    error: BaseException | None = None
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        if retry_at is not None and now >= retry_at:
+            retry_at = None
+            c.add("retries")
+            launch("retry")
+        if hedge_at is not None and now >= hedge_at:
+            hedge_at = None
+            if pending and attempts < MAX_ATTEMPTS:
+                c.add("hedges")
+                launch("hedge")
+        if not pending and retry_at is None:
+            break
+
+        wake = min(t for t in (deadline, hedge_at, retry_at) if t is not None)
+        timeout = max(wake - time.monotonic(), 0)
+        if not pending:
+            time.sleep(timeout)  # backing off before a retry
+            continue
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            kind = pending.pop(future)
+            error = future.exception()
+            if error is None:
+                c.succeeded(time.monotonic() - t0, hedge_won=kind == "hedge")
+                gate.success()
+                return future.result()
+            retry, after = retryable(error)
+            if not retry:
+                c.add("failed")
+                gate.release()  # the API answered: not an outage
+                raise LLMUnavailable(f"{type(error).__name__}: {error}") from error
+            if not pending and retry_at is None and attempts < MAX_ATTEMPTS:
+                retry_at = time.monotonic() + (after or 0.0)
+                if deadline - retry_at < MIN_ATTEMPT_S:
+                    retry_at = None
+
+    gate.failure()
+    if pending or time.monotonic() >= deadline:
+        c.add("deadline_exceeded")
+        raise LLMUnavailable(f"no answer within {deadline_s:g}s", retryable=True)
+    c.add("failed")
+    raise LLMUnavailable(f"{type(error).__name__}: {error}", retryable=True) from error
+
+
+async def acall(name: str, deadline_s: float, api: Any = None, **request: Any) -> Any:
+    """
+    One async messages.create(**request) attempt within `deadline_s`, behind
+    `name`'s breaker. Uses async_client() unless `api` is given. Raises
+    LLMUnavailable on any failure; its `retryable` and `retry_after_s` tell
+    a retrying caller whether and when to try again.
+    """
+    c = _counter(name)
+    c.add("calls")
+    gate = breaker(name)
+    if not gate.allow():
+        raise LLMUnavailable("circuit open", gate.retry_after_s())
+
+    api = api or async_client()
+    c.add("attempts")
+    t0 = time.monotonic()
+    try:
+        response = await asyncio.wait_for(
+            api.messages.create(timeout=deadline_s, **request), deadline_s
+        )
+    except asyncio.TimeoutError:
+        gate.failure()
+        c.add("deadline_exceeded")
+        raise LLMUnavailable(f"no answer within {deadline_s:g}s", retryable=True) from None
+    except Exception as error:
+        c.add("failed")
+        retry, after = retryable(error)
+        if retry:
+            gate.failure()
+        else:
+            gate.release()  # the API answered: not an outage
+        raise LLMUnavailable(
+            f"{type(error).__name__}: {error}", after or 0.0, retryable=retry
+        ) from error
+    c.succeeded(time.monotonic() - t0)
+    gate.success()
+    return response
+
+
+def stats() -> dict[str, Any]:
+    with _lock:
+        names = dict(_counters)
+        breakers = dict(_breakers)
+    return {
+        "breakers": {name: b.stats() for name, b in breakers.items()},
+        "calls": {name: c.stats() for name, c in names.items()},
+    }
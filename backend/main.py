@@ -1,84 +1,119 @@
 from __future__ import annotations
 
+import hashlib
+import heapq
+import itertools
 import json
 import os
 import sqlite3
-import uuid
+import threading
 from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import date
 from pathlib import Path
-from typing import Any, Generator
+from typing import Any, Generator, Literal
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response
+from pydantic import BaseModel, Field
+
+import ad_archive
+import ad_batch
+import ad_classifier
+import ad_counts
+import ad_sample
+import ad_vectors
+import anomalies
+import brand_snapshot
+import brief_archive
+import compression
+import creative_assets
+import data_version
+import enrichment
+import facets
+import llm_client
+import prompt_cache
+import replica
+import schema
+import shared_cache
+import sketches
+import spend_history
+from admission import AdmissionMiddleware, CostClass
+from compression import CompressionMiddleware
+from replica import ReadSourceMiddleware
+from singleflight import SingleFlight
 
 load_dotenv()
 
 app = FastAPI(title="Ad Intelligence API", version="0.1.0")
 
+# ---------------------------------------------------------------------------
+# Admission control — expensive endpoints get a concurrency limit and a
+# bounded queue; anything unclassified (health, /api/ads, ...) is never held.
+# ---------------------------------------------------------------------------
+
+ADMISSION_CLASSES = [
+    CostClass("llm", limit=2, queue=4, wait_timeout_s=20.0, retry_after_s=30),
+    CostClass("ingest", limit=1, queue=2, wait_timeout_s=30.0, retry_after_s=10),
+    CostClass("aggregate", limit=4, queue=16, wait_timeout_s=5.0, retry_after_s=2),
+]
+
+
+def _cost_class(method: str, path: str, query: str) -> str | None:
+    if path.startswith("/api/brief/generate/") or path in ("/api/brief", "/api/enrichment/run"):
+        return "llm"  # all may call the Anthropic API
+    if method == "POST" and path in ("/api/seed-mock-data", "/api/creatives", "/api/creatives/fetch"):
+        return "ingest"
+    if path in ("/api/trends", "/api/competitors", "/api/dashboard"):
+        return "aggregate"
+    return None
+
+
+# Added before CORS so rejections still carry CORS headers
+app.add_middleware(AdmissionMiddleware, classes=ADMISSION_CLASSES, classify=_cost_class)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Read-Source", "X-Staleness-Bound"],
+)
+
+# Reports which copy of the database a GET was served from (see get_read_db)
+app.add_middleware(ReadSourceMiddleware)
+
+# Outermost, so every response (including CORS and admission replies) is
+# eligible. Only bodies of at least COMPRESSION_MIN_BYTES are compressed.
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_BYTES", "1024")),
+    gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+    brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4")),
 )
 
 # ---------------------------------------------------------------------------
 # SQLite setup
 # ---------------------------------------------------------------------------
 
-DB_PATH = Path(__file__).parent / "ads.db"
-
-CREATE_TABLE_SQL = """
-CREATE TABLE IF NOT EXISTS competitor_ads (
-    id                  TEXT PRIMARY KEY,
-    ad_id               TEXT UNIQUE NOT NULL,
-    competitor_name     TEXT,
-    competitor_page_id  TEXT,
-    brand               TEXT,
-    vertical            TEXT,
-    ad_format           TEXT,
-    message_theme       TEXT,
-    emotional_tone      TEXT,
-    headline            TEXT,
-    body_text           TEXT,
-    cta                 TEXT,
-    platform            TEXT,
-    estimated_spend_min INTEGER,
-    estimated_spend_max INTEGER,
-    start_date          TEXT,
-    end_date            TEXT,
-    is_active           INTEGER DEFAULT 1,
-    days_running        INTEGER DEFAULT 0,
-    num_cards           INTEGER,
-    country             TEXT,
-    source              TEXT DEFAULT 'mock',
-    created_at          TEXT DEFAULT (datetime('now'))
-);
-"""
-
-CREATE_INDEXES_SQL = [
-    "CREATE INDEX IF NOT EXISTS idx_brand           ON competitor_ads(brand);",
-    "CREATE INDEX IF NOT EXISTS idx_competitor_name ON competitor_ads(competitor_name);",
-    "CREATE INDEX IF NOT EXISTS idx_message_theme   ON competitor_ads(message_theme);",
-    "CREATE INDEX IF NOT EXISTS idx_is_active       ON competitor_ads(is_active);",
-    "CREATE INDEX IF NOT EXISTS idx_start_date      ON competitor_ads(start_date);",
-]
+DB_PATH = Path(os.getenv("ADS_DB_PATH", Path(__file__).parent / "ads.db"))
 
-CREATE_BRIEFS_TABLE_SQL = """
-CREATE TABLE IF NOT EXISTS weekly_briefs (
-    id            TEXT PRIMARY KEY,
-    brand         TEXT NOT NULL,
-    markdown      TEXT NOT NULL,
-    stats_json    TEXT,
-    generated_at  TEXT DEFAULT (datetime('now'))
-);
-"""
-
-CREATE_BRIEFS_INDEX_SQL = (
-    "CREATE INDEX IF NOT EXISTS idx_briefs_brand ON weekly_briefs(brand);"
-)
+# How long a worker waits for another worker's initial seed to finish
+SEED_LOCK_TIMEOUT_S = 120.0
+
+# Upstream LLM deadlines: /api/brief falls back to the rule-based summary
+# after SUMMARY_DEADLINE_S; brief generation answers 503 after BRIEF_DEADLINE_S
+SUMMARY_DEADLINE_S = float(os.getenv("LLM_SUMMARY_DEADLINE_S", "4"))
+BRIEF_DEADLINE_S = float(os.getenv("LLM_BRIEF_DEADLINE_S", "60"))
+
+shared_cache.configure(DB_PATH)
+ad_vectors.configure(DB_PATH)
+creative_assets.configure(DB_PATH)
+replica.configure(DB_PATH)
 
 # ---------------------------------------------------------------------------
 # Brand / theme constants
@@ -101,8 +136,8 @@ BRAND_THEMES: dict[str, list[str]] = {
 
 
 @contextmanager
-def get_db() -> Generator[sqlite3.Connection, None, None]:
-    conn = sqlite3.connect(DB_PATH)
+def get_db(timeout: float = 5.0) -> Generator[sqlite3.Connection, None, None]:
+    conn = sqlite3.connect(DB_PATH, timeout=timeout)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL;")
     try:
@@ -111,60 +146,157 @@ def get_db() -> Generator[sqlite3.Connection, None, None]:
         conn.close()
 
 
-def _row_to_dict(row: sqlite3.Row) -> dict:
-    d = dict(row)
-    # SQLite stores booleans as 0/1 — convert back for JSON consumers
-    d["is_active"] = bool(d["is_active"])
-    return d
+@contextmanager
+def get_read_db() -> Generator[sqlite3.Connection, None, None]:
+    """
+    Connection for GET handlers: the read replica when READ_REPLICA is on
+    and fresh enough, otherwise the primary. The choice and the staleness
+    bound are reported in the X-Read-Source / X-Staleness-Bound headers.
+    """
+    info = replica.read_info.get()
+    opened = replica.connect()
+    if opened is None:
+        if info is not None:
+            info["source"] = "primary"
+        with get_db() as conn:
+            yield conn
+        return
+
+    conn, staleness = opened
+    if info is not None:
+        info.update(source="replica", staleness_s=staleness)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _snapshot(brand: str | None) -> brand_snapshot.BrandSnapshot:
+    """Memoized one-pass aggregates for a brand (all brands when None)."""
+    with get_read_db() as conn:
+        return brand_snapshot.get(conn, brand, BRAND_THEMES.get(brand or "", []))
+
+
+def _current_data_version() -> int:
+    with get_read_db() as conn:
+        return data_version.current(conn)
+
+
+# Identical concurrent aggregate requests share one computation
+flights = SingleFlight()
+
+
+def _fetch_ads(conn: sqlite3.Connection, sql: str, params: list[Any]) -> list[dict]:
+    """
+    Run a competitor_ads SELECT and build each response dict straight from
+    the plain row tuple (no intermediate sqlite3.Row).
+    """
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute(sql, params)
+    names = [c[0] for c in cur.description]
+    today = date.today()
+    out = []
+    for row in cur:
+        d = dict(zip(names, row))
+        # SQLite stores booleans as 0/1 — convert back for JSON consumers
+        d["is_active"] = bool(d["is_active"])
+        d["days_running"] = ad_batch.current_days_running(d, today)
+        out.append(d)
+    return out
+
+
+_INSERT_AD_SQL = (
+    f"INSERT INTO competitor_ads ({', '.join(ad_batch.COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(ad_batch.COLUMNS))})"
+)
+# Labels enrichment wrote stay while the copy they were given for is unchanged
+_KEEP_LLM_LABELS = (
+    f"competitor_ads.label_source = '{enrichment.SOURCE_LLM}' "
+    "AND competitor_ads.headline IS excluded.headline "
+    "AND competitor_ads.body_text IS excluded.body_text"
+)
+# Only rewrites an existing ad when its content hash changed
+_UPSERT_AD_SQL = (
+    f"{_INSERT_AD_SQL} ON CONFLICT(ad_id) DO UPDATE SET "
+    + ", ".join(
+        f"{f} = CASE WHEN {_KEEP_LLM_LABELS} THEN competitor_ads.{f} ELSE excluded.{f} END"
+        if f in ad_batch.LABEL_FIELDS else f"{f} = excluded.{f}"
+        for f in (*ad_batch.UPDATE_FIELDS, "content_hash")
+    )
+    + " WHERE competitor_ads.content_hash IS NOT excluded.content_hash;"
+)
+
+
+# Set once the database has data to serve and its backfills are done; /ready reports it.
+_ready = threading.Event()
 
 
 @app.on_event("startup")
 def init_db() -> None:
+    """
+    Bring the schema up to date (a no-op pragma read when current). Backfills
+    queued by migrations and, for an empty database, the seed run in the
+    background so the server starts taking traffic immediately. In replica
+    mode, start the snapshot refresher.
+    """
     with get_db() as conn:
-        conn.execute(CREATE_TABLE_SQL)
-        for sql in CREATE_INDEXES_SQL:
-            conn.execute(sql)
-        conn.execute(CREATE_BRIEFS_TABLE_SQL)
-        conn.execute(CREATE_BRIEFS_INDEX_SQL)
-        conn.commit()
+        schema.ensure_schema(conn)
+        has_rows = conn.execute("SELECT 1 FROM all_ads LIMIT 1;").fetchone()
+        backfills = schema.pending_backfills(conn)
 
-        row_count = conn.execute(
-            "SELECT COUNT(*) FROM competitor_ads;"
-        ).fetchone()[0]
+    if has_rows and not backfills:
+        _ready.set()
+    else:
+        threading.Thread(target=_seed_in_background, name="seed-db", daemon=True).start()
+    if has_rows:
+        with get_db() as conn:
+            ad_vectors.refresh(conn)  # builds or catches up the index in the background
 
-    if row_count == 0:
+    if replica.enabled():
+        replica.start_refresher()
+
+
+def _seed_in_background() -> None:
+    try:
+        with get_db(timeout=SEED_LOCK_TIMEOUT_S) as conn:
+            schema.run_backfills(conn)
         _seed_database()
+    finally:
+        _ready.set()
 
 
 def _seed_database() -> None:
-    """Insert all mock records. Called on startup when the table is empty."""
+    """
+    Insert all mock records. Called on startup when the table is empty.
+    Every worker races here on a fresh database; the write lock plus the
+    re-check ensures exactly one of them seeds and the rest just wait.
+    """
     from scraper.mock_data import generate_mock_ads
 
-    records = generate_mock_ads()
-    with get_db() as conn:
-        for rec in records:
-            conn.execute(
-                """
-                INSERT INTO competitor_ads (
-                    id, ad_id, competitor_name, competitor_page_id,
-                    brand, vertical, ad_format, message_theme, emotional_tone,
-                    headline, body_text, cta, platform,
-                    estimated_spend_min, estimated_spend_max,
-                    start_date, end_date, is_active, days_running,
-                    num_cards, country, source
-                ) VALUES (
-                    :id, :ad_id, :competitor_name, :competitor_page_id,
-                    :brand, :vertical, :ad_format, :message_theme, :emotional_tone,
-                    :headline, :body_text, :cta, :platform,
-                    :estimated_spend_min, :estimated_spend_max,
-                    :start_date, :end_date, :is_active, :days_running,
-                    :num_cards, :country, :source
-                )
-                ON CONFLICT(ad_id) DO NOTHING;
-                """,
-                rec,
-            )
+    with get_db(timeout=SEED_LOCK_TIMEOUT_S) as conn:
+        conn.execute("BEGIN IMMEDIATE;")
+        if conn.execute("SELECT 1 FROM all_ads LIMIT 1;").fetchone():
+            conn.rollback()
+            return
+
+        records = generate_mock_ads()
+        low_confidence = ad_classifier.label_records(records, conn)
+        records.hash_content()
+        conn.executemany(
+            f"{_INSERT_AD_SQL} ON CONFLICT(ad_id) DO NOTHING;", records.rows(ad_batch.COLUMNS)
+        )
+        # Fresh database: reconstruct daily history from each ad's run window
+        spend_history.backfill_from_ads(conn)
+        ad_classifier.enqueue(conn, low_confidence, "low_confidence")
+        sketches.observe(conn, records)
+        ad_sample.observe(conn, records)
+        anomalies.replay(conn)
+        ad_archive.archive_ended(conn)
+        data_version.bump(conn)
         conn.commit()
+        ad_vectors.refresh(conn)
 
 
 # ---------------------------------------------------------------------------
@@ -176,6 +308,35 @@ def health_check() -> dict[str, str]:
     return {"status": "ok"}
 
 
+# ---------------------------------------------------------------------------
+# GET /ready
+# ---------------------------------------------------------------------------
+
+@app.get("/ready")
+def readiness_check() -> JSONResponse:
+    """503 while the initial background seed or schema backfills are still running."""
+    if not _ready.is_set():
+        return JSONResponse({"status": "seeding"}, status_code=503)
+    return JSONResponse({"status": "ready"})
+
+
+# ---------------------------------------------------------------------------
+# GET /metrics
+# ---------------------------------------------------------------------------
+
+@app.get("/metrics")
+def get_metrics() -> dict[str, Any]:
+    """Per-process operational counters (queue depth, rejections, ...)."""
+    return {
+        "admission": {c.name: c.stats() for c in ADMISSION_CLASSES},
+        "coalescing": flights.stats(),
+        "compression": compression.stats(),
+        "llm": llm_client.stats(),
+        "prompt_cache": prompt_cache.stats(),
+        "replica": replica.stats(),
+    }
+
+
 # ---------------------------------------------------------------------------
 # POST /api/seed-mock-data
 # ---------------------------------------------------------------------------
@@ -191,72 +352,132 @@ def seed_mock_data(clear_existing: bool = False) -> dict[str, Any]:
     from scraper.mock_data import generate_mock_ads
 
     records = generate_mock_ads()
+    ids = records.column("ad_id")
 
     with get_db() as conn:
+        # Fill in any missing theme/tone locally; unsure ads go to enrichment
+        low_confidence = ad_classifier.label_records(records, conn)
+        hashes = records.hash_content()
+        # Held from the hash comparison through the write, so the counts are exact
+        conn.execute("BEGIN IMMEDIATE;")
         if clear_existing:
             conn.execute("DELETE FROM competitor_ads WHERE source = 'mock';")
-
-        inserted = 0
-        for rec in records:
-            # UPSERT: if ad_id already exists, overwrite all fields
-            conn.execute(
-                """
-                INSERT INTO competitor_ads (
-                    id, ad_id, competitor_name, competitor_page_id,
-                    brand, vertical, ad_format, message_theme, emotional_tone,
-                    headline, body_text, cta, platform,
-                    estimated_spend_min, estimated_spend_max,
-                    start_date, end_date, is_active, days_running,
-                    num_cards, country, source
-                ) VALUES (
-                    :id, :ad_id, :competitor_name, :competitor_page_id,
-                    :brand, :vertical, :ad_format, :message_theme, :emotional_tone,
-                    :headline, :body_text, :cta, :platform,
-                    :estimated_spend_min, :estimated_spend_max,
-                    :start_date, :end_date, :is_active, :days_running,
-                    :num_cards, :country, :source
+            ad_archive.clear(conn, "mock")
+            stored: dict[str, str | None] = {}
+        else:
+            stored = {
+                ad_id: content_hash
+                for i in range(0, len(ids), 500)
+                for ad_id, content_hash in conn.execute(
+                    f"SELECT ad_id, content_hash FROM competitor_ads "
+                    f"WHERE ad_id IN ({','.join('?' * len(ids[i:i + 500]))});",
+                    ids[i:i + 500],
                 )
-                ON CONFLICT(ad_id) DO UPDATE SET
-                    competitor_name     = excluded.competitor_name,
-                    brand               = excluded.brand,
-                    ad_format           = excluded.ad_format,
-                    message_theme       = excluded.message_theme,
-                    emotional_tone      = excluded.emotional_tone,
-                    headline            = excluded.headline,
-                    body_text           = excluded.body_text,
-                    estimated_spend_min = excluded.estimated_spend_min,
-                    estimated_spend_max = excluded.estimated_spend_max,
-                    start_date          = excluded.start_date,
-                    end_date            = excluded.end_date,
-                    is_active           = excluded.is_active,
-                    days_running        = excluded.days_running;
-                """,
-                rec,
+            }
+            # An archived ad that comes back changed moves back to the hot table
+            archived = ad_archive.stored_hashes(conn, ids)
+            index = {ad_id: i for i, ad_id in enumerate(ids)}
+            ad_archive.restore(
+                conn, [ad_id for ad_id, h in archived.items() if h != hashes[index[ad_id]]]
             )
-            inserted += 1
-
-        conn.commit()
-
-    # Summary breakdowns computed from the generated records (no extra DB query)
-    brand_counts: dict[str, int] = {}
-    competitor_counts: dict[str, int] = {}
-    for rec in records:
-        brand_counts[rec["brand"]] = brand_counts.get(rec["brand"], 0) + 1
-        competitor_counts[rec["competitor_name"]] = (
-            competitor_counts.get(rec["competitor_name"], 0) + 1
+            stored.update(archived)
+
+        new_rows = [i for i, ad_id in enumerate(ids) if ad_id not in stored]
+        changed_rows = [
+            i for i, ad_id in enumerate(ids) if ad_id in stored and stored[ad_id] != hashes[i]
+        ]
+        # Unchanged ads are not written at all: no WAL, index or trigger churn
+        written = records.take(sorted(new_rows + changed_rows))
+        conn.executemany(_UPSERT_AD_SQL, written.rows(ad_batch.COLUMNS))
+
+        changed = clear_existing or bool(written)
+        today = spend_history.day_number(date.today())
+        history_rows = 0
+        if changed or spend_history.last_snapshot_day(conn) != today:
+            history_rows = spend_history.record_snapshot(conn)
+        written_ids = set(written.column("ad_id"))
+        ad_classifier.enqueue(
+            conn, [ad_id for ad_id in low_confidence if ad_id in written_ids], "low_confidence"
         )
+        # Sketches and the sample count each ad once: only new ad_ids feed them
+        new_records = records.take(new_rows)
+        if clear_existing:
+            sketches.rebuild(conn)
+            ad_sample.rebuild(conn)
+            # The wiped ads' launches are gone too; observing the re-inserted
+            # ones on top of the old state would read as a surge
+            anomalies.replay(conn)
+        else:
+            sketches.observe(conn, new_records)
+            ad_sample.observe(conn, new_records)
+            if history_rows or new_rows:
+                anomalies.observe_ingest(conn, new_records)
+        archived_count = ad_archive.archive_ended(conn)
+        changed = changed or bool(archived_count)
+        if changed:
+            # Caches, snapshots and the facet index key on this version
+            data_version.bump(conn)
+        conn.commit()
+        ad_vectors.refresh(conn)
 
+    # Summary breakdowns counted on the batch's interned codes (no extra DB query)
     return {
         "status": "success",
         "total_records": len(records),
-        "upserted_count": inserted,
-        "active_ads": sum(1 for r in records if r["is_active"]),
-        "ads_60_plus_days": sum(1 for r in records if r["days_running"] >= 60),
-        "by_brand": brand_counts,
-        "by_competitor": competitor_counts,
+        "upserted_count": len(written),
+        "inserted": len(new_rows),
+        "updated": len(changed_rows),
+        "unchanged": len(records) - len(new_rows) - len(changed_rows),
+        "archived": archived_count,
+        "active_ads": sum(records.columns["is_active"]),
+        "ads_60_plus_days": sum(1 for d in records.columns["days_running"] if d >= 60),
+        "history_rows": history_rows,
+        "routed_for_enrichment": len(low_confidence),
+        "by_brand": records.value_counts("brand"),
+        "by_competitor": records.value_counts("competitor_name"),
     }
 
 
+# ---------------------------------------------------------------------------
+# POST /api/enrichment/run
+# ---------------------------------------------------------------------------
+
+@app.post("/api/enrichment/run")
+async def run_enrichment(
+    max_ads: int = Query(default=500, ge=1, le=5000),
+    token_budget: int = Query(default=enrichment.DEFAULT_TOKEN_BUDGET, ge=1000),
+) -> dict[str, Any]:
+    """
+    Send queued low-confidence ads to Claude for theme/tone labels, batched,
+    deduplicated by content hash and capped at `token_budget` tokens.
+    """
+    api_key = os.getenv("ANTHROPIC_API_KEY", "").strip()
+    if not api_key:
+        raise HTTPException(
+            status_code=503,
+            detail="ANTHROPIC_API_KEY is not configured. Add it to backend/.env and restart.",
+        )
+
+    # SQLite work runs in the threadpool; only the API calls are awaited here
+    def load() -> enrichment.Pending:
+        with get_db() as conn:
+            return enrichment.load(conn, max_ads)
+
+    def store(fresh: dict[str, dict[str, str]]) -> int:
+        with get_db() as conn:
+            enrichment.store(conn, pending, fresh)
+            if pending.stats.enriched or pending.stats.cache_hits:
+                data_version.bump(conn)
+            conn.commit()
+            return enrichment.queue_depth(conn)
+
+    pending = await run_in_threadpool(load)
+    fresh = await enrichment.label(pending, token_budget=token_budget)
+    remaining = await run_in_threadpool(store, fresh)
+
+    return {**asdict(pending.stats), "remaining_in_queue": remaining}
+
+
 # ---------------------------------------------------------------------------
 # GET /api/ads
 # ---------------------------------------------------------------------------
@@ -269,12 +490,54 @@ def list_ads(
     tone: str | None = None,
     ad_format: str | None = None,
     is_active: bool | None = None,
+    since: date | None = None,
     limit: int = Query(default=50, le=200),
     offset: int = 0,
+    text_limit: int | None = Query(default=None, ge=16, le=2000),
+    count: str = Query(default="exact", pattern="^(exact|estimate|none)$"),
 ) -> dict[str, Any]:
     """
     Paginated, filtered ad listing. All filters are AND-combined.
+
+    ?since=YYYY-MM-DD — only ads still running on or after that date. Ads
+                        archived by ad_archive are merged in only when the
+                        range reaches back past the archive's horizon (or
+                        there is no `since`), so recent-only views never
+                        touch the archive.
+
+    Without `since`, `total` comes from the trigger-maintained count tables
+    rather than a COUNT(*) over the matching rows.
+    ?count=estimate — use the in-memory facet bitmaps even if a write has
+                      made them stale (`total_exact` says which you got)
+    ?count=none     — skip the total entirely (`total` is null)
+
+    ?text_limit=N  — cut body_text to at most N characters (on a word
+                     boundary, ending in "…") and flag the row with
+                     `body_truncated`; GET /api/ads/{ad_id} has the full text.
     """
+    with get_read_db() as conn:
+        return _ads_page(
+            conn, brand=brand, competitor=competitor, theme=theme, tone=tone,
+            ad_format=ad_format, is_active=is_active, since=since, limit=limit,
+            offset=offset, text_limit=text_limit, count=count,
+        )
+
+
+def _ads_page(
+    conn: sqlite3.Connection,
+    brand: str | None = None,
+    competitor: str | None = None,
+    theme: str | None = None,
+    tone: str | None = None,
+    ad_format: str | None = None,
+    is_active: bool | None = None,
+    since: date | None = None,
+    limit: int = 50,
+    offset: int = 0,
+    text_limit: int | None = None,
+    count: str = "exact",
+) -> dict[str, Any]:
+    """The /api/ads response on an open connection (shared with /api/dashboard)."""
     conditions: list[str] = []
     params: list[Any] = []
 
@@ -296,85 +559,378 @@ def list_ads(
     if is_active is not None:
         conditions.append("is_active = ?")
         params.append(1 if is_active else 0)
+    if since is not None:
+        conditions.append("(end_date IS NULL OR end_date >= ?)")
+        params.append(since.isoformat())
 
     where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
 
-    with get_db() as conn:
-        total = conn.execute(
-            f"SELECT COUNT(*) FROM competitor_ads {where};", params
-        ).fetchone()[0]
+    selection = {
+        "brand": brand or None,
+        "competitor": competitor or None,
+        "theme": theme or None,
+        "tone": tone or None,
+        "ad_format": ad_format or None,
+        "is_active": is_active,
+    }
 
-        rows = conn.execute(
+    # Archived ads are all inactive and ended on or before the horizon
+    cold = is_active is not True and ad_archive.needed(conn, since)
+
+    total: int | None = None
+    total_exact = count == "exact"
+    if count != "none" and since is not None:
+        # The hot side is small by construction; the archive side uses
+        # its end_date index and is skipped when out of range
+        tables = ["competitor_ads", "archived_ads"] if cold else ["competitor_ads"]
+        total = sum(
+            conn.execute(f"SELECT COUNT(*) FROM {table} {where};", params).fetchone()[0]
+            for table in tables
+        )
+        total_exact = True
+    elif count == "estimate":
+        index = facets.peek_index()
+        if index is not None:
+            total = index.total(selection) + (
+                ad_counts.total(conn, selection, archived=True) if cold else 0
+            )
+            total_exact = index.version == data_version.current(conn)
+    if count != "none" and total is None:
+        total = ad_counts.total(conn, selection) + (
+            ad_counts.total(conn, selection, archived=True) if cold else 0
+        )
+        total_exact = True
+
+    if cold:
+        # Merge the two newest-first pages; each side supplies offset + limit
+        hot = _fetch_ads(
+            conn,
+            f"SELECT * FROM competitor_ads {where} ORDER BY start_date DESC LIMIT ?;",
+            [*params, offset + limit],
+        )
+        archived = ad_archive.fetch(conn, where, params, offset + limit)
+        merged = heapq.merge(
+            hot, archived, key=lambda d: d["start_date"] or "", reverse=True
+        )
+        rows = list(itertools.islice(merged, offset, offset + limit))
+    else:
+        rows = _fetch_ads(
+            conn,
             f"SELECT * FROM competitor_ads {where} "
             f"ORDER BY start_date DESC LIMIT ? OFFSET ?;",
             [*params, limit, offset],
-        ).fetchall()
+        )
+
+    if text_limit is not None:
+        for d in rows:
+            d["body_text"], d["body_truncated"] = _truncate(d["body_text"], text_limit)
+
+    thumbnails = creative_assets.thumbnails(conn, [d["ad_id"] for d in rows])
+    for d in rows:
+        d["thumbnail_url"] = thumbnails.get(d["ad_id"])
 
     return {
-        "data": [_row_to_dict(r) for r in rows],
+        "data": rows,
         "total": total,
+        "total_exact": total_exact,
         "count": len(rows),
         "limit": limit,
         "offset": offset,
     }
 
 
+def _truncate(text: str | None, limit: int) -> tuple[str | None, bool]:
+    if text is None or len(text) <= limit:
+        return text, False
+    cut = text[:limit - 1]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,.;:-") + "…", True
+
+
+# ---------------------------------------------------------------------------
+# GET /api/ads/{ad_id}
+# ---------------------------------------------------------------------------
+
+@app.get("/api/ads/{ad_id}")
+def get_ad(ad_id: str) -> dict[str, Any]:
+    """One ad with its full text and creatives — the detail fetch behind ?text_limit."""
+    with get_read_db() as conn:
+        rows = _fetch_ads(conn, "SELECT * FROM competitor_ads WHERE ad_id = ?;", [ad_id])
+        ad = rows[0] if rows else ad_archive.get(conn, ad_id)
+        if ad is not None:
+            ad["creatives"] = creative_assets.for_ad(conn, ad_id)
+    if ad is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ad '{ad_id}'.")
+    return ad
+
+
+# ---------------------------------------------------------------------------
+# POST /api/creatives, GET /api/assets/{hash}
+# ---------------------------------------------------------------------------
+
+class CreativeIn(BaseModel):
+    ad_id: str
+    url: str = Field(pattern="^https?://")
+    kind: Literal["image", "video_poster"] = "image"
+    position: int = Field(default=0, ge=0)
+
+
+@app.post("/api/creatives")
+async def register_creatives(
+    creatives: list[CreativeIn],
+    fetch: bool = True,
+    limit: int = Query(default=1000, ge=1, le=10_000),
+) -> dict[str, Any]:
+    """
+    Register creative image / video poster URLs for ads (one per card
+    position), then download everything pending into the content-addressed
+    asset store unless ?fetch=false. URLs must be on a CDN host allowed by
+    CREATIVE_ALLOWED_HOSTS.
+    """
+    blocked = sorted({c.url for c in creatives if not creative_assets.allowed(c.url)})
+    if blocked:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Creative host not allowed: {', '.join(blocked[:10])}"
+            + (f" (+{len(blocked) - 10} more)" if len(blocked) > 10 else ""),
+        )
+    ad_ids = sorted({c.ad_id for c in creatives})
+
+    def register() -> int:
+        with get_db() as conn:
+            known: set[str] = set()
+            for i in range(0, len(ad_ids), 500):
+                chunk = ad_ids[i:i + 500]
+                known.update(
+                    r[0] for r in conn.execute(
+                        f"SELECT ad_id FROM all_ads WHERE ad_id IN ({','.join('?' * len(chunk))});",
+                        chunk,
+                    )
+                )
+            unknown = [a for a in ad_ids if a not in known]
+            if unknown:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Unknown ads: {', '.join(unknown[:10])}"
+                    + (f" (+{len(unknown) - 10} more)" if len(unknown) > 10 else ""),
+                )
+            registered = creative_assets.register(
+                conn, [(c.ad_id, c.position, c.kind, c.url) for c in creatives]
+            )
+            conn.commit()
+            return registered
+
+    result: dict[str, Any] = {"registered": await run_in_threadpool(register)}
+    if fetch:
+        result.update(await fetch_creatives(limit=limit))
+    return result
+
+
+@app.post("/api/creatives/fetch")
+async def fetch_creatives(limit: int = Query(default=1000, ge=1, le=10_000)) -> dict[str, Any]:
+    """Download pending (or previously failed) creatives; see creative_assets.py."""
+
+    # SQLite work runs in the threadpool; only the downloads are awaited here
+    def load() -> creative_assets.Pending:
+        with get_db() as conn:
+            return creative_assets.load(conn, limit)
+
+    def store() -> int:
+        with get_db() as conn:
+            creative_assets.store(conn, pending)
+            if pending.stats.resolved:
+                data_version.bump(conn)  # ads gained thumbnails
+            conn.commit()
+            return creative_assets.pending_count(conn)
+
+    pending = await run_in_threadpool(load)
+    await creative_assets.download(pending)
+    remaining = await run_in_threadpool(store)
+    return {**asdict(pending.stats), "remaining": remaining}
+
+
+def _serve_asset(digest: str, thumb: bool, if_none_match: str | None) -> Response:
+    if not creative_assets.valid_hash(digest):
+        raise HTTPException(status_code=404, detail="Unknown asset.")
+    with get_read_db() as conn:
+        found = creative_assets.lookup(conn, digest, thumb)
+    if found is None or not found[0].exists():
+        raise HTTPException(status_code=404, detail="Unknown asset.")
+    file_path, content_type = found
+    etag = f'"{digest}{"-thumb" if thumb else ""}"'
+    headers = {"Cache-Control": creative_assets.CACHE_CONTROL, "ETag": etag}
+    if etag in _parse_if_none_match(if_none_match):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(file_path, media_type=content_type, headers=headers)
+
+
+@app.get("/api/assets/{digest}")
+def get_asset(digest: str, if_none_match: str | None = Header(default=None)) -> Response:
+    """A stored creative by content hash. Immutable, so cached for a year."""
+    return _serve_asset(digest, False, if_none_match)
+
+
+@app.get("/api/assets/{digest}/thumb")
+def get_asset_thumbnail(digest: str, if_none_match: str | None = Header(default=None)) -> Response:
+    """Its thumbnail (the original if Pillow was not available when it was fetched)."""
+    return _serve_asset(digest, True, if_none_match)
+
+
+# ---------------------------------------------------------------------------
+# GET /api/anomalies
+# ---------------------------------------------------------------------------
+
+@app.get("/api/anomalies")
+def list_anomalies(
+    kind: str | None = Query(
+        default=None, pattern=f"^({anomalies.KIND_SPEND}|{anomalies.KIND_LAUNCHES})$"
+    ),
+    since: date | None = None,
+    limit: int = Query(default=100, ge=1, le=500),
+) -> dict[str, Any]:
+    """
+    Competitor spend spikes and theme launch surges, newest first. Entries
+    with `live: true` are for today's still-open bucket.
+    """
+    with get_read_db() as conn:
+        data = anomalies.recent(conn, kind=kind, since=since, limit=limit)
+    return {
+        "data": data,
+        "count": len(data),
+        "z_threshold": anomalies.Z_THRESHOLD,
+        "ewma_span_days": anomalies.EWMA_SPAN_DAYS,
+    }
+
+
+# ---------------------------------------------------------------------------
+# GET /api/ads/{ad_id}/neighbors
+# ---------------------------------------------------------------------------
+
+@app.get("/api/ads/{ad_id}/neighbors")
+def ad_neighbors(ad_id: str, limit: int = Query(default=10, ge=1, le=50)) -> dict[str, Any]:
+    """
+    Ads whose headline + body copy is most similar to `ad_id`'s, across all
+    competitors, ranked by cosine similarity of local LSA embeddings. The
+    index is kept up to date in the background (see ad_vectors.py), so
+    answers may lag an ingest briefly; 503 until it has first been built.
+    """
+    with get_read_db() as conn:
+        row = conn.execute(
+            "SELECT rowid, headline, body_text FROM competitor_ads WHERE ad_id = ?;", [ad_id]
+        ).fetchone()
+        ad = dict(row) if row else ad_archive.get(conn, ad_id)
+        if ad is None:
+            raise HTTPException(status_code=404, detail=f"Unknown ad '{ad_id}'.")
+
+        index = ad_vectors.get_index(conn)
+        if index is None:
+            raise HTTPException(status_code=503, detail="The similarity index is still being built.")
+        if row is not None and row[0] in index:
+            hits = index.neighbors(row[0], limit)
+        else:
+            # Archived, or ingested since the last sync: embed its copy now
+            text = f"{ad['headline'] or ''} {ad['body_text'] or ''}"
+            hits = index.search(index.embed(text), limit)
+        similarity = dict(hits)
+        data = _fetch_ads(
+            conn,
+            f"SELECT rowid AS _rowid, * FROM competitor_ads "
+            f"WHERE rowid IN ({','.join('?' * len(hits))});",
+            list(similarity),
+        ) if hits else []
+
+    data.sort(key=lambda d: similarity[d["_rowid"]], reverse=True)
+    for d in data:
+        d["similarity"] = round(similarity[d.pop("_rowid")], 4)
+    return {"ad_id": ad_id, "data": data, "count": len(data)}
+
+
+# ---------------------------------------------------------------------------
+# GET /api/facets
+# ---------------------------------------------------------------------------
+
+@app.get("/api/facets")
+def get_facets(
+    brand: str | None = None,
+    competitor: str | None = None,
+    theme: str | None = None,
+    tone: str | None = None,
+    ad_format: str | None = None,
+    is_active: bool | None = None,
+) -> dict[str, Any]:
+    """
+    Ad counts for every value of every /api/ads filter under the current
+    selection. A dimension's own filter is ignored for its own counts.
+    Archived ads are included, from their count table.
+    """
+    selection = {
+        "brand": brand,
+        "competitor": competitor,
+        "theme": theme,
+        "tone": tone,
+        "ad_format": ad_format,
+        "is_active": is_active,
+    }
+    with get_read_db() as conn:
+        index = facets.get_index(conn)
+        cold = ad_archive.needed(conn, None)
+        if cold:
+            archived = ad_counts.facet_counts(conn, selection, archived=True)
+            archived_total = ad_counts.total(conn, selection, archived=True)
+
+    result = index.counts(selection)
+    return facets.add_counts(result, archived, archived_total) if cold else result
+
+
+# ---------------------------------------------------------------------------
+# GET /api/approx/summary
+# ---------------------------------------------------------------------------
+
+@app.get("/api/approx/summary")
+def approx_summary(
+    brand: str | None = None,
+    since: date | None = None,
+    top: int = Query(default=5, ge=1, le=20),
+) -> dict[str, Any]:
+    """
+    Distinct competitors and top themes/tones answered from the ingest-time
+    sketches instead of a table scan. `distinct_competitors` carries its
+    relative standard error (~1.6%); each top-K count may overstate the true
+    count by at most its `max_overcount`. `since` limits to ads whose start
+    week is on or after that date's week.
+    """
+    if brand and brand not in VALID_BRANDS:
+        raise HTTPException(status_code=400, detail=f"Unknown brand: {brand}")
+    with get_read_db() as conn:
+        return sketches.summary(conn, brand, since, top)
+
+
 # ---------------------------------------------------------------------------
 # GET /api/competitors
 # ---------------------------------------------------------------------------
 
 @app.get("/api/competitors")
-def list_competitors(brand: str | None = None) -> dict[str, Any]:
+@flights.coalesce("competitors", version=_current_data_version)
+def list_competitors(brand: str | None = None, approx: bool = False) -> dict[str, Any]:
     """
     Returns each competitor with aggregated stats:
     total ads, active ads, average daily spend, top message theme.
-    """
-    where = "WHERE brand = ?" if brand else ""
-    params = [brand] if brand else []
-
-    sql = f"""
-        SELECT
-            competitor_name,
-            brand,
-            vertical,
-            COUNT(*)                                        AS total_ads,
-            SUM(is_active)                                  AS active_ads,
-            ROUND(AVG((estimated_spend_min + estimated_spend_max) / 2.0), 0)
-                                                            AS avg_spend,
-            MAX(days_running)                               AS max_days_running
-        FROM competitor_ads
-        {where}
-        GROUP BY competitor_name, brand, vertical
-        ORDER BY total_ads DESC;
-    """
-
-    top_theme_sql = f"""
-        SELECT competitor_name, message_theme
-        FROM (
-            SELECT competitor_name, message_theme,
-                   COUNT(*) AS cnt,
-                   ROW_NUMBER() OVER (
-                       PARTITION BY competitor_name ORDER BY COUNT(*) DESC
-                   ) AS rn
-            FROM competitor_ads
-            {where}
-            GROUP BY competitor_name, message_theme
-        )
-        WHERE rn = 1;
-    """
 
-    with get_db() as conn:
-        rows = conn.execute(sql, params).fetchall()
-        theme_rows = conn.execute(top_theme_sql, params).fetchall()
+    ?approx=true answers from the stratified sample: total_ads stays exact,
+    active_ads and avg_spend become {estimate, ci95}.
+    """
+    if approx:
+        with get_read_db() as conn:
+            data = ad_sample.competitors(conn, brand)
+        return {"data": data, "count": len(data), "approx": True}
 
-    top_theme_map = {r["competitor_name"]: r["message_theme"] for r in theme_rows}
+    return _competitors_section(_snapshot(brand))
 
-    data = []
-    for r in rows:
-        d = dict(r)
-        d["top_theme"] = top_theme_map.get(d["competitor_name"])
-        data.append(d)
 
+def _competitors_section(snap: brand_snapshot.BrandSnapshot) -> dict[str, Any]:
+    data = [dict(d) for d in snap.competitor_stats]
     return {"data": data, "count": len(data)}
 
 
@@ -383,377 +939,295 @@ def list_competitors(brand: str | None = None) -> dict[str, Any]:
 # ---------------------------------------------------------------------------
 
 @app.get("/api/trends")
-def get_trends(brand: str | None = None) -> dict[str, Any]:
+@flights.coalesce("trends", version=_current_data_version)
+def get_trends(brand: str | None = None, approx: bool = False) -> dict[str, Any]:
     """
     Returns chart-ready trend data:
-    - weekly_spend: estimated spend aggregated by ISO week
+    - weekly_spend: estimated spend per week, spread over each ad's active days
     - theme_distribution: ad count per message theme
     - format_distribution: ad count per format
     - tone_distribution: ad count per emotional tone
     - longevity_buckets: ads grouped by days_running ranges
+
+    ?approx=true answers from the stratified sample; counts and spends
+    become {estimate, ci95} (weekly_spend is a point estimate).
     """
-    where = "WHERE brand = ?" if brand else ""
-    params = [brand] if brand else []
+    if approx:
+        with get_read_db() as conn:
+            return {**ad_sample.trends(conn, brand), "approx": True}
+
+    return _trends_section(_snapshot(brand))
 
-    with get_db() as conn:
-        # Weekly spend (use start_date truncated to Monday of that week)
-        weekly = conn.execute(
-            f"""
-            SELECT
-                strftime('%Y-W%W', start_date)              AS week,
-                ROUND(SUM((estimated_spend_min + estimated_spend_max) / 2.0), 0)
-                                                            AS total_spend,
-                COUNT(*)                                    AS ad_count
-            FROM competitor_ads
-            {where}
-            GROUP BY week
-            ORDER BY week ASC;
-            """,
-            params,
-        ).fetchall()
-
-        theme_dist = conn.execute(
-            f"""
-            SELECT message_theme AS name, COUNT(*) AS value
-            FROM competitor_ads {where}
-            GROUP BY message_theme ORDER BY value DESC;
-            """,
-            params,
-        ).fetchall()
-
-        format_dist = conn.execute(
-            f"""
-            SELECT ad_format AS name, COUNT(*) AS value
-            FROM competitor_ads {where}
-            GROUP BY ad_format ORDER BY value DESC;
-            """,
-            params,
-        ).fetchall()
-
-        tone_dist = conn.execute(
-            f"""
-            SELECT emotional_tone AS name, COUNT(*) AS value
-            FROM competitor_ads {where}
-            GROUP BY emotional_tone ORDER BY value DESC;
-            """,
-            params,
-        ).fetchall()
-
-        longevity = conn.execute(
-            f"""
-            SELECT
-                CASE
-                    WHEN days_running < 7   THEN '0-6 days'
-                    WHEN days_running < 14  THEN '7-13 days'
-                    WHEN days_running < 30  THEN '14-29 days'
-                    WHEN days_running < 60  THEN '30-59 days'
-                    ELSE '60+ days'
-                END AS bucket,
-                COUNT(*) AS count
-            FROM competitor_ads {where}
-            GROUP BY bucket
-            ORDER BY MIN(days_running) ASC;
-            """,
-            params,
-        ).fetchall()
-
-        # Top spenders by competitor
-        top_spenders = conn.execute(
-            f"""
-            SELECT
-                competitor_name,
-                brand,
-                ROUND(SUM((estimated_spend_min + estimated_spend_max) / 2.0), 0)
-                    AS total_spend
-            FROM competitor_ads {where}
-            GROUP BY competitor_name, brand
-            ORDER BY total_spend DESC
-            LIMIT 10;
-            """,
-            params,
-        ).fetchall()
+
+def _trends_section(snap: brand_snapshot.BrandSnapshot) -> dict[str, Any]:
+    def chart(dist: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        return [{"name": d["name"], "value": d["count"]} for d in dist]
 
     return {
-        "weekly_spend": [dict(r) for r in weekly],
-        "theme_distribution": [dict(r) for r in theme_dist],
-        "format_distribution": [dict(r) for r in format_dist],
-        "tone_distribution": [dict(r) for r in tone_dist],
-        "longevity_buckets": [dict(r) for r in longevity],
-        "top_spenders": [dict(r) for r in top_spenders],
+        "weekly_spend": snap.weekly_spend,
+        "theme_distribution": chart(snap.theme_distribution),
+        "format_distribution": chart(snap.format_distribution),
+        "tone_distribution": chart(snap.tone_distribution),
+        "longevity_buckets": snap.longevity_buckets,
+        "top_spenders": snap.top_spenders,
     }
 
 
 # ---------------------------------------------------------------------------
-# GET /api/brief
+# GET /api/dashboard
 # ---------------------------------------------------------------------------
 
-@app.get("/api/brief")
-def get_brief(brand: str | None = None) -> dict[str, Any]:
-    """
-    Returns a structured competitive intelligence brief.
-    If ANTHROPIC_API_KEY is set, the summary field is AI-generated.
-    Otherwise, a rule-based summary is returned so the endpoint always works.
-    """
-    where = "WHERE brand = ?" if brand else ""
-    params = [brand] if brand else []
+DASHBOARD_SECTIONS = ("ads", "competitors", "trends")
 
-    with get_db() as conn:
-        totals = conn.execute(
-            f"""
-            SELECT
-                COUNT(*)                     AS total_ads,
-                SUM(is_active)               AS active_ads,
-                COUNT(DISTINCT competitor_name) AS competitor_count,
-                ROUND(AVG(days_running), 1)  AS avg_days_running,
-                ROUND(SUM((estimated_spend_min + estimated_spend_max) / 2.0), 0)
-                                             AS total_est_spend
-            FROM competitor_ads {where};
-            """,
-            params,
-        ).fetchone()
 
-        top_theme = conn.execute(
-            f"""
-            SELECT message_theme, COUNT(*) AS cnt
-            FROM competitor_ads {where}
-            GROUP BY message_theme ORDER BY cnt DESC LIMIT 1;
-            """,
-            params,
-        ).fetchone()
+def _section_etag(name: str, body: Any) -> str:
+    digest = hashlib.blake2b(
+        json.dumps(body, separators=(",", ":"), default=str).encode(), digest_size=8
+    )
+    return f'"{name}-{digest.hexdigest()}"'
 
-        top_tone = conn.execute(
-            f"""
-            SELECT emotional_tone, COUNT(*) AS cnt
-            FROM competitor_ads {where}
-            GROUP BY emotional_tone ORDER BY cnt DESC LIMIT 1;
-            """,
-            params,
-        ).fetchone()
 
-        longest_running = conn.execute(
-            f"""
-            SELECT competitor_name, headline, days_running, message_theme
-            FROM competitor_ads {where}
-            ORDER BY days_running DESC LIMIT 3;
-            """,
-            params,
-        ).fetchall()
-
-        high_spend = conn.execute(
-            f"""
-            SELECT competitor_name, headline, estimated_spend_max, ad_format
-            FROM competitor_ads {where}
-            ORDER BY estimated_spend_max DESC LIMIT 3;
-            """,
-            params,
-        ).fetchall()
-
-    totals_d = dict(totals)
-    brand_label = brand.replace("_", " ").title() if brand else "all brands"
+def _parse_if_none_match(header: str | None) -> set[str]:
+    """Entity tags from If-None-Match, with any W/ prefix (added by compression) dropped."""
+    tags = set()
+    for tag in (header or "").split(","):
+        tag = tag.strip()
+        tags.add(tag[2:] if tag.startswith("W/") else tag)
+    tags.discard("")
+    return tags
 
-    # Rule-based summary (always available)
-    rule_summary = (
-        f"Across {brand_label}, {totals_d['competitor_count']} competitors are running "
-        f"{totals_d['total_ads']} tracked ads ({totals_d['active_ads']} currently active). "
-        f"The dominant message theme is '{top_theme['message_theme'] if top_theme else 'N/A'}' "
-        f"and the most-used emotional tone is '{top_tone['emotional_tone'] if top_tone else 'N/A'}'. "
-        f"Ads run for an average of {totals_d['avg_days_running']} days, "
-        f"with estimated cumulative spend of ₹{totals_d['total_est_spend']:,.0f}."
+
+@app.get("/api/dashboard")
+def get_dashboard(
+    brand: str | None = None,
+    ad_format: str | None = None,
+    since: date | None = None,
+    limit: int = Query(default=50, le=200),
+    text_limit: int | None = Query(default=None, ge=16, le=2000),
+    if_none_match: str | None = Header(default=None),
+) -> Response:
+    """
+    Everything the dashboard needs on load in one response: the first /api/ads
+    page (`ads`), /api/competitors (`competitors`) and /api/trends (`trends`)
+    for one brand, read on one connection. Competitors and trends come from
+    the same memoized brand snapshot (one pass over the brand's rows).
+
+    `etags` holds a content ETag per section. Send back the ones you hold in
+    If-None-Match (comma-separated); matching sections come back as null and
+    are listed in `not_modified`. If every section matches, the reply is 304.
+    """
+    with get_read_db() as conn:
+        version = data_version.current(conn)
+
+        def build() -> dict[str, Any]:
+            snap = brand_snapshot.get(conn, brand, BRAND_THEMES.get(brand or "", []))
+            sections = {
+                "ads": _ads_page(
+                    conn, brand=brand, ad_format=ad_format, since=since,
+                    limit=limit, text_limit=text_limit,
+                ),
+                "competitors": _competitors_section(snap),
+                "trends": _trends_section(snap),
+            }
+            return {
+                "sections": sections,
+                "etags": {name: _section_etag(name, body) for name, body in sections.items()},
+            }
+
+        # Concurrent loads of the same dashboard share one computation
+        key = (brand or None, ad_format or None, since, limit, text_limit, version, date.today())
+        built = flights.do("dashboard", key, build)
+
+    etags = built["etags"]
+    etag = _section_etag("dashboard", etags)
+    held = _parse_if_none_match(if_none_match)
+    if etag in held or all(etags[name] in held for name in DASHBOARD_SECTIONS):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    not_modified = [name for name in DASHBOARD_SECTIONS if etags[name] in held]
+    return JSONResponse(
+        {
+            **{
+                name: None if name in not_modified else built["sections"][name]
+                for name in DASHBOARD_SECTIONS
+            },
+            "etags": etags,
+            "not_modified": not_modified,
+            "data_version": version,
+        },
+        headers={"ETag": etag},
     )
 
-    ai_summary: str | None = None
-    anthropic_key = os.getenv("ANTHROPIC_API_KEY", "").strip()
-    if anthropic_key:
-        try:
-            import anthropic  # type: ignore
-
-            client = anthropic.Anthropic(api_key=anthropic_key)
-            prompt = (
-                f"You are a competitive intelligence analyst. "
-                f"Write a 3-bullet strategic brief for {brand_label} based on this data:\n\n"
-                f"- Competitors tracked: {totals_d['competitor_count']}\n"
-                f"- Total ads: {totals_d['total_ads']} ({totals_d['active_ads']} active)\n"
-                f"- Top message theme: {top_theme['message_theme'] if top_theme else 'N/A'}\n"
-                f"- Top emotional tone: {top_tone['emotional_tone'] if top_tone else 'N/A'}\n"
-                f"- Avg ad lifespan: {totals_d['avg_days_running']} days\n"
-                f"- Longest-running ads: {[dict(r) for r in longest_running]}\n"
-                f"- Highest-spend ads: {[dict(r) for r in high_spend]}\n\n"
-                f"Be concise and actionable."
-            )
-            msg = client.messages.create(
-                model="claude-haiku-4-5-20251001",
-                max_tokens=400,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            ai_summary = msg.content[0].text
-        except Exception:
-            pass  # Fall through to rule-based summary
+
+# ---------------------------------------------------------------------------
+# GET /api/spend-history
+# ---------------------------------------------------------------------------
+
+@app.get("/api/spend-history")
+def get_spend_history(
+    brand: str | None = None,
+    competitor: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    granularity: str = Query(default="day", pattern="^(day|week)$"),
+) -> dict[str, Any]:
+    """
+    Estimated spend over time per competitor from the daily snapshot history.
+    Data older than the daily retention window is reported weekly.
+    """
+    with get_read_db() as conn:
+        series = spend_history.spend_series(
+            conn, brand=brand, competitor=competitor,
+            start=start, end=end, granularity=granularity,
+        )
 
     return {
-        "brand": brand,
-        "summary": ai_summary or rule_summary,
-        "ai_generated": ai_summary is not None,
-        "stats": totals_d,
-        "top_theme": dict(top_theme) if top_theme else None,
-        "top_tone": dict(top_tone) if top_tone else None,
-        "longest_running_ads": [dict(r) for r in longest_running],
-        "highest_spend_ads": [dict(r) for r in high_spend],
+        "data": series,
+        "count": len(series),
+        "granularity": granularity,
+        "daily_retention_days": spend_history.DAILY_RETENTION_DAYS,
     }
 
 
 # ---------------------------------------------------------------------------
-# POST /api/brief/generate/{brand}
+# Brief prompt builders
 # ---------------------------------------------------------------------------
 
-@app.post("/api/brief/generate/{brand}")
-def generate_brief(brand: str) -> dict[str, Any]:
+def _rule_summary(snap: brand_snapshot.BrandSnapshot, brand_label: str) -> str:
+    top_theme, top_tone = snap.top_theme, snap.top_tone
+    return (
+        f"Across {brand_label}, {snap.competitor_count} competitors are running "
+        f"{snap.total_ads} tracked ads ({snap.active_ads} currently active). "
+        f"The dominant message theme is '{top_theme['message_theme'] if top_theme else 'N/A'}' "
+        f"and the most-used emotional tone is '{top_tone['emotional_tone'] if top_tone else 'N/A'}'. "
+        f"Ads run for an average of {snap.avg_days_running} days, "
+        f"with estimated cumulative spend of ₹{snap.total_est_spend:,.0f}."
+    )
+
+
+def _summary_prompt(snap: brand_snapshot.BrandSnapshot, brand_label: str) -> str:
+    top_theme, top_tone = snap.top_theme, snap.top_tone
+    longest = [
+        {k: r[k] for k in ("competitor_name", "headline", "days_running", "message_theme")}
+        for r in snap.longest_running[:3]
+    ]
+    return (
+        f"You are a competitive intelligence analyst. "
+        f"Write a 3-bullet strategic brief for {brand_label} based on this data:\n\n"
+        f"- Competitors tracked: {snap.competitor_count}\n"
+        f"- Total ads: {snap.total_ads} ({snap.active_ads} active)\n"
+        f"- Top message theme: {top_theme['message_theme'] if top_theme else 'N/A'}\n"
+        f"- Top emotional tone: {top_tone['emotional_tone'] if top_tone else 'N/A'}\n"
+        f"- Avg ad lifespan: {snap.avg_days_running} days\n"
+        f"- Longest-running ads: {longest}\n"
+        f"- Highest-spend ads: {snap.highest_spend[:3]}\n\n"
+        f"Be concise and actionable."
+    )
+
+
+def _brief_prefix() -> str:
     """
-    Queries the DB for all ads of that brand, builds a rich data payload,
-    calls claude-sonnet-4-6 to write a 400-word markdown brief, then
-    stores the result in weekly_briefs and returns it.
+    The static part of the brief prompt: role, output skeleton and formatting
+    rules, plus the brand catalogue. Nothing in it depends on the brand being
+    briefed or on the data, so it is built once and sent byte-identical on
+    every call, which lets the API serve it from the prompt cache.
     """
-    if brand not in VALID_BRANDS:
-        raise HTTPException(status_code=404, detail=f"Unknown brand '{brand}'.")
+    catalogue = "\n".join(
+        f"- **{label}** — core themes: "
+        + ", ".join(t.replace("_", " ") for t in BRAND_THEMES[brand])
+        for brand, label in BRAND_LABELS.items()
+    )
+    return f"""You are a senior competitive intelligence analyst. \
+You write strategic briefs in markdown for the marketing team of one of the brands below, \
+based on the ad library data for that brand in the user message.
 
-    api_key = os.getenv("ANTHROPIC_API_KEY", "").strip()
-    if not api_key:
-        raise HTTPException(
-            status_code=503,
-            detail="ANTHROPIC_API_KEY is not configured. Add it to backend/.env and restart.",
-        )
+## Brands
 
-    brand_label = BRAND_LABELS[brand]
+{catalogue}
 
-    with get_db() as conn:
-        # -- aggregate totals ------------------------------------------------
-        totals = conn.execute(
-            """
-            SELECT COUNT(*) AS total_ads,
-                   SUM(is_active) AS active_ads,
-                   COUNT(DISTINCT competitor_name) AS competitor_count,
-                   ROUND(AVG(days_running), 1) AS avg_days_running
-            FROM competitor_ads WHERE brand = ?;
-            """,
-            [brand],
-        ).fetchone()
+A theme with low competitive saturation among a brand's core themes is a creative gap.
 
-        if not totals or totals["total_ads"] == 0:
-            raise HTTPException(
-                status_code=404,
-                detail=f"No ad data found for '{brand}'. Seed the database first.",
-            )
+## Input Data
 
-        # -- format distribution with percentages ----------------------------
-        format_dist = conn.execute(
-            """
-            SELECT ad_format,
-                   COUNT(*) AS count,
-                   ROUND(COUNT(*) * 100.0 /
-                         (SELECT COUNT(*) FROM competitor_ads WHERE brand = ?), 1) AS pct
-            FROM competitor_ads WHERE brand = ?
-            GROUP BY ad_format ORDER BY count DESC;
-            """,
-            [brand, brand],
-        ).fetchall()
-
-        # -- top 5 longest-running ads ---------------------------------------
-        longest = conn.execute(
-            """
-            SELECT competitor_name, headline, days_running,
-                   message_theme, emotional_tone, ad_format
-            FROM competitor_ads WHERE brand = ?
-            ORDER BY days_running DESC LIMIT 5;
-            """,
-            [brand],
-        ).fetchall()
-
-        # -- theme distribution with percentages -----------------------------
-        theme_dist = conn.execute(
-            """
-            SELECT message_theme,
-                   COUNT(*) AS count,
-                   ROUND(COUNT(*) * 100.0 /
-                         (SELECT COUNT(*) FROM competitor_ads WHERE brand = ?), 1) AS pct
-            FROM competitor_ads WHERE brand = ?
-            GROUP BY message_theme ORDER BY count DESC;
-            """,
-            [brand, brand],
-        ).fetchall()
-
-        # -- tone distribution with percentages ------------------------------
-        tone_dist = conn.execute(
-            """
-            SELECT emotional_tone,
-                   COUNT(*) AS count,
-                   ROUND(COUNT(*) * 100.0 /
-                         (SELECT COUNT(*) FROM competitor_ads WHERE brand = ?), 1) AS pct
-            FROM competitor_ads WHERE brand = ?
-            GROUP BY emotional_tone ORDER BY count DESC;
-            """,
-            [brand, brand],
-        ).fetchall()
-
-        # -- distinct competitor names ----------------------------------------
-        competitors = conn.execute(
-            "SELECT DISTINCT competitor_name FROM competitor_ads WHERE brand = ?;",
-            [brand],
-        ).fetchall()
-
-    # -- compute creative gaps -----------------------------------------------
-    # A gap = a theme in the brand's competitive space with < 15 % share
-    theme_pcts = {r["message_theme"]: r["pct"] for r in theme_dist}
-    gaps = [
-        (t, theme_pcts.get(t, 0.0))
-        for t in BRAND_THEMES.get(brand, [])
-        if theme_pcts.get(t, 0.0) < 15.0
-    ]
+The user message gives, for the brand under analysis: the competitors monitored, ad counts \
+and average ad lifespan, the ad format distribution, the five longest-running ads \
+(battle-tested creatives that survived the algorithm longest), the message theme and \
+emotional tone distributions, the creative gaps, and the dominant theme.
 
-    # -- build prompt data strings -------------------------------------------
-    competitor_names = [r["competitor_name"] for r in competitors]
+## Output
 
+Write a 400-word competitive intelligence brief using EXACTLY this markdown structure. \
+Use real percentages, specific competitor names, and actual headline quotes from the data. \
+Be analytical, specific, and actionable — not generic.
+
+## 🎯 Executive Summary
+(2–3 sentences. Include specific numbers: total ads, active ads, competitor count, avg lifespan.)
+
+## 📊 Format Landscape
+(What formats dominate, exact percentages, and what this signals for the brand's creative mix.)
+
+## 🏆 Battle-Tested Creatives
+(Name at least 3 specific competitors and quote their longest-running headlines. \
+Identify what message pattern makes these creatives survive 60+ days.)
+
+## ⚡ Theme & Tone Dominance
+(Which themes are oversaturated with exact percentages? Which emotional tones rule? \
+What does the dominance of the dominant theme signal?)
+
+## 🚀 Strategic Recommendations for <brand>
+- (Specific recommendation tied to a gap or data point above)
+- (Specific recommendation tied to format or tone insight above)
+- (Specific recommendation tied to a battle-tested creative pattern above)
+
+Replace <brand> with the name of the brand under analysis."""
+
+
+# Built once: the cacheable prefix must not change between calls
+BRIEF_PREFIX = _brief_prefix()
+
+
+def _brief_data(snap: brand_snapshot.BrandSnapshot, brand_label: str) -> str:
+    """The per-brand suffix that follows BRIEF_PREFIX."""
     format_lines = "\n".join(
-        f"- {r['ad_format'].title()}: {r['pct']}% ({r['count']} ads)"
-        for r in format_dist
+        f"- {d['name'].title()}: {d['pct']}% ({d['count']} ads)"
+        for d in snap.format_distribution
     )
     longest_lines = "\n".join(
         f"{i + 1}. **{r['competitor_name']}** — \"{r['headline']}\" "
         f"— **{r['days_running']} days** — Theme: {r['message_theme'].replace('_', ' ')}"
         f", Tone: {r['emotional_tone']}"
-        for i, r in enumerate(longest)
+        for i, r in enumerate(snap.longest_running)
     )
     theme_lines = "\n".join(
-        f"- {r['message_theme'].replace('_', ' ').title()}: {r['pct']}% ({r['count']} ads)"
-        for r in theme_dist
+        f"- {d['name'].replace('_', ' ').title()}: {d['pct']}% ({d['count']} ads)"
+        for d in snap.theme_distribution
     )
     tone_lines = "\n".join(
-        f"- {r['emotional_tone'].title()}: {r['pct']}% ({r['count']} ads)"
-        for r in tone_dist
+        f"- {d['name'].title()}: {d['pct']}% ({d['count']} ads)"
+        for d in snap.tone_distribution
     )
     gap_lines = (
         "\n".join(
-            f"- {t.replace('_', ' ').title()}: {pct}% coverage (underexploited)"
-            for t, pct in gaps
+            f"- {g['theme'].replace('_', ' ').title()}: {g['pct']}% coverage (underexploited)"
+            for g in snap.gaps
         )
-        if gaps
+        if snap.gaps
         else "- No significant gaps — all core themes are actively contested."
     )
+    dominant_theme = (
+        snap.theme_distribution[0]["name"] if snap.theme_distribution else "aspiration"
+    )
 
-    prompt = f"""You are a senior competitive intelligence analyst. \
-Analyze the following ad library data and write a strategic brief in markdown for {brand_label}'s marketing team.
-
----
-
-## Input Data
-
-**Brand under analysis:** {brand_label}
-**Competitors monitored:** {', '.join(competitor_names)}
-**Total ads tracked:** {totals['total_ads']} ({totals['active_ads']} currently active)
-**Average ad lifespan:** {totals['avg_days_running']} days
+    return f"""**Brand under analysis:** {brand_label}
+**Competitors monitored:** {', '.join(snap.competitors)}
+**Total ads tracked:** {snap.total_ads} ({snap.active_ads} currently active)
+**Average ad lifespan:** {snap.avg_days_running} days
+**Dominant theme:** {dominant_theme}
 
 ## Ad Format Distribution
 {format_lines}
 
-## Top 5 Longest-Running Ads (battle-tested creatives — survived the algorithm longest)
+## Top 5 Longest-Running Ads
 {longest_lines}
 
 ## Message Theme Distribution
@@ -763,66 +1237,141 @@ Analyze the following ad library data and write a strategic brief in markdown fo
 {tone_lines}
 
 ## Creative Gaps (themes with low competitive saturation for {brand_label})
-{gap_lines}
+{gap_lines}"""
 
----
 
-Write a 400-word competitive intelligence brief using EXACTLY this markdown structure. \
-Use real percentages, specific competitor names, and actual headline quotes from the data above. \
-Be analytical, specific, and actionable — not generic.
+# ---------------------------------------------------------------------------
+# GET /api/brief
+# ---------------------------------------------------------------------------
 
-## 🎯 Executive Summary
-(2–3 sentences. Include specific numbers: total ads, active ads, competitor count, avg lifespan.)
+@app.get("/api/brief")
+@flights.coalesce("brief", version=_current_data_version)
+def get_brief(brand: str | None = None) -> dict[str, Any]:
+    """
+    Returns a structured competitive intelligence brief.
+    If ANTHROPIC_API_KEY is set, the summary field is AI-generated.
+    Otherwise, a rule-based summary is returned so the endpoint always works.
+    """
+    snap = _snapshot(brand)
+    brand_label = brand.replace("_", " ").title() if brand else "all brands"
 
-## 📊 Format Landscape
-(What formats dominate, exact percentages, and what this signals for {brand_label}'s creative mix.)
+    # Rule-based summary (always available)
+    rule_summary = _rule_summary(snap, brand_label)
 
-## 🏆 Battle-Tested Creatives
-(Name at least 3 specific competitors and quote their longest-running headlines. \
-Identify what message pattern makes these creatives survive 60+ days.)
+    ai_summary: str | None = None
+    anthropic_key = os.getenv("ANTHROPIC_API_KEY", "").strip()
+    if anthropic_key:
+        try:
+            msg = llm_client.call(
+                "summary",
+                SUMMARY_DEADLINE_S,
+                model="claude-haiku-4-5-20251001",
+                max_tokens=400,
+                messages=[{"role": "user", "content": _summary_prompt(snap, brand_label)}],
+            )
+            ai_summary = msg.content[0].text
+        except Exception:
+            # Slow, failing, breaker open or an unexpected reply: the
+            # rule-based summary goes out now
+            ai_summary = None
 
-## ⚡ Theme & Tone Dominance
-(Which themes are oversaturated with exact percentages? Which emotional tones rule? \
-What does the dominance of '{(theme_dist[0]["message_theme"] if theme_dist else "aspiration")}' signal?)
+    return {
+        "brand": brand,
+        "summary": ai_summary or rule_summary,
+        "ai_generated": ai_summary is not None,
+        "stats": {
+            "total_ads": snap.total_ads,
+            "active_ads": snap.active_ads,
+            "competitor_count": snap.competitor_count,
+            "avg_days_running": snap.avg_days_running,
+            "total_est_spend": snap.total_est_spend,
+        },
+        "top_theme": snap.top_theme,
+        "top_tone": snap.top_tone,
+        "longest_running_ads": [
+            {k: r[k] for k in ("competitor_name", "headline", "days_running", "message_theme")}
+            for r in snap.longest_running[:3]
+        ],
+        "highest_spend_ads": snap.highest_spend[:3],
+    }
 
-## 🚀 Strategic Recommendations for {brand_label}
-- (Specific recommendation tied to a gap or data point above)
-- (Specific recommendation tied to format or tone insight above)
-- (Specific recommendation tied to a battle-tested creative pattern above)"""
 
-    # -- call Anthropic ------------------------------------------------------
-    import anthropic as _anthropic  # type: ignore
+# ---------------------------------------------------------------------------
+# POST /api/brief/generate/{brand}
+# ---------------------------------------------------------------------------
 
-    client = _anthropic.Anthropic(api_key=api_key)
-    message = client.messages.create(
-        model="claude-sonnet-4-6",
-        max_tokens=1200,
-        messages=[{"role": "user", "content": prompt}],
-    )
+@app.post("/api/brief/generate/{brand}")
+def generate_brief(brand: str) -> dict[str, Any]:
+    """
+    Takes the brand's snapshot, builds a rich data payload,
+    calls claude-sonnet-4-6 to write a 400-word markdown brief, then
+    stores the result with brief_archive.store and returns it.
+    """
+    if brand not in VALID_BRANDS:
+        raise HTTPException(status_code=404, detail=f"Unknown brand '{brand}'.")
+
+    api_key = os.getenv("ANTHROPIC_API_KEY", "").strip()
+    if not api_key:
+        raise HTTPException(
+            status_code=503,
+            detail="ANTHROPIC_API_KEY is not configured. Add it to backend/.env and restart.",
+        )
+
+    brand_label = BRAND_LABELS[brand]
+    snap = _snapshot(brand)
+
+    if snap.total_ads == 0:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No ad data found for '{brand}'. Seed the database first.",
+        )
+
+    # -- call Anthropic ------------------------------------------------------
+    # Not hedged: a duplicate 1200-token Sonnet call costs more than it saves
+    try:
+        message = llm_client.call(
+            "brief",
+            BRIEF_DEADLINE_S,
+            hedge=False,
+            model="claude-sonnet-4-6",
+            max_tokens=1200,
+            system=prompt_cache.system_blocks("brief", BRIEF_PREFIX),
+            messages=[{"role": "user", "content": _brief_data(snap, brand_label)}],
+        )
+    except llm_client.LLMUnavailable as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Brief generation is unavailable ({exc.reason}). Try again shortly.",
+            headers={"Retry-After": str(max(1, round(exc.retry_after_s)))},
+        )
     markdown_content: str = message.content[0].text
+    usage = prompt_cache.record("brief", BRIEF_PREFIX, message.usage)
 
     # -- store in DB ---------------------------------------------------------
     stats_payload = {
-        "totals": dict(totals),
-        "format_distribution": [dict(r) for r in format_dist],
-        "theme_distribution": [dict(r) for r in theme_dist],
-        "tone_distribution": [dict(r) for r in tone_dist],
-        "longest_running": [dict(r) for r in longest],
-        "gaps": [{"theme": t, "pct": p} for t, p in gaps],
+        "totals": {
+            "total_ads": snap.total_ads,
+            "active_ads": snap.active_ads,
+            "competitor_count": snap.competitor_count,
+            "avg_days_running": snap.avg_days_running,
+        },
+        "format_distribution": [
+            {"ad_format": d["name"], "count": d["count"], "pct": d["pct"]}
+            for d in snap.format_distribution
+        ],
+        "theme_distribution": [
+            {"message_theme": d["name"], "count": d["count"], "pct": d["pct"]}
+            for d in snap.theme_distribution
+        ],
+        "tone_distribution": [
+            {"emotional_tone": d["name"], "count": d["count"], "pct": d["pct"]}
+            for d in snap.tone_distribution
+        ],
+        "longest_running": snap.longest_running,
+        "gaps": snap.gaps,
     }
-    brief_id = str(uuid.uuid4())
-
     with get_db() as conn:
-        conn.execute(
-            """
-            INSERT INTO weekly_briefs (id, brand, markdown, stats_json, generated_at)
-            VALUES (?, ?, ?, ?, datetime('now'));
-            """,
-            [brief_id, brand, markdown_content, json.dumps(stats_payload)],
-        )
-        generated_at = conn.execute(
-            "SELECT generated_at FROM weekly_briefs WHERE id = ?;", [brief_id]
-        ).fetchone()["generated_at"]
+        brief_id, generated_at = brief_archive.store(conn, brand, markdown_content, stats_payload)
         conn.commit()
 
     return {
@@ -831,6 +1380,7 @@ What does the dominance of '{(theme_dist[0]["message_theme"] if theme_dist else
         "markdown": markdown_content,
         "generated_at": generated_at,
         "stats": stats_payload,
+        "usage": usage,
     }
 
 
@@ -839,7 +1389,7 @@ What does the dominance of '{(theme_dist[0]["message_theme"] if theme_dist else
 # ---------------------------------------------------------------------------
 
 @app.get("/api/brief/{brand}")
-def get_stored_brief(brand: str) -> dict[str, Any]:
+def get_stored_brief(brand: str, include_stats: bool = True) -> dict[str, Any]:
     """
     Returns the most recently generated brief for the given brand.
     Raises 404 if none has been generated yet.
@@ -847,26 +1397,54 @@ def get_stored_brief(brand: str) -> dict[str, Any]:
     if brand not in VALID_BRANDS:
         raise HTTPException(status_code=404, detail=f"Unknown brand '{brand}'.")
 
-    with get_db() as conn:
-        row = conn.execute(
-            """
-            SELECT id, brand, markdown, stats_json, generated_at
-            FROM weekly_briefs
-            WHERE brand = ?
-            ORDER BY generated_at DESC
-            LIMIT 1;
-            """,
-            [brand],
-        ).fetchone()
+    with get_read_db() as conn:
+        result = brief_archive.latest(conn, brand, include_stats)
 
-    if not row:
+    if not result:
         raise HTTPException(
             status_code=404,
             detail=f"No brief found for '{brand}'. Use POST /api/brief/generate/{brand} to create one.",
         )
 
-    result = dict(row)
-    if result.get("stats_json"):
-        result["stats"] = json.loads(result.pop("stats_json"))
+    return result
+
+
+# ---------------------------------------------------------------------------
+# GET /api/brief/{brand}/history
+# ---------------------------------------------------------------------------
+
+@app.get("/api/brief/{brand}/history")
+def list_brief_history(
+    brand: str,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: str | None = None,
+) -> dict[str, Any]:
+    """
+    Brief metadata for a brand, newest first. Pass `next_cursor` from the
+    previous page as `cursor` to continue; markdown is not included.
+    """
+    if brand not in VALID_BRANDS:
+        raise HTTPException(status_code=404, detail=f"Unknown brand '{brand}'.")
+
+    with get_read_db() as conn:
+        try:
+            items, next_cursor = brief_archive.list_page(conn, brand, limit, cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    return {"data": items, "count": len(items), "next_cursor": next_cursor}
+
+
+@app.get("/api/brief/{brand}/history/{brief_id}")
+def get_archived_brief(brand: str, brief_id: str, include_stats: bool = True) -> dict[str, Any]:
+    """Returns one archived brief in full."""
+    if brand not in VALID_BRANDS:
+        raise HTTPException(status_code=404, detail=f"Unknown brand '{brand}'.")
+
+    with get_read_db() as conn:
+        result = brief_archive.fetch(conn, brand, brief_id, include_stats)
+
+    if not result:
+        raise HTTPException(status_code=404, detail=f"No brief '{brief_id}' for '{brand}'.")
 
     return result
@@ -0,0 +1,108 @@
+"""
+prompt_cache.py
+Anthropic prompt caching for LLM calls that share a long static prefix.
+
+A prompt is sent as a static prefix in the `system` field, marked with
+`cache_control`, followed by a per-call suffix in the user message. When
+the prefix bytes match a recent call, the API reads it from its cache
+instead of processing it again. That lowers time to first token, and
+cached input is billed at a fraction of the normal rate. Any change to the
+prefix, down to one byte, is a cache miss. So the prefix must be built once
+and must not contain anything that varies between calls.
+
+Caching is not free: a cache write is billed at 1.25x normal input, and
+the entry lives for CACHE_TTL_S after its last use. So `system_blocks`
+marks the prefix only when a hit is likely. The prefix must be at least
+MIN_CACHE_TOKENS (the API's minimum for Sonnet; shorter prefixes are never
+cached anyway), and the previous call of the same name must be within
+CACHE_TTL_S. A call that arrives on its own (a brand's weekly brief) is
+sent as a plain system prompt and pays nothing extra. A burst of calls
+(briefs for every brand in a row) writes the cache once and reads it after
+that.
+
+`record` collects the usage each call reports, per prompt name: plain
+input, cache writes (`cache_creation_input_tokens`), cache reads
+(`cache_read_input_tokens`) and output. It also counts distinct prefix
+digests. More than one digest for the same name means the prefix is not
+stable and will keep missing. Counters are per process and exposed on
+/metrics.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from typing import Any
+
+CACHE_CONTROL = {"type": "ephemeral"}
+MIN_CACHE_TOKENS = 1024
+CACHE_TTL_S = 300.0
+
+USAGE_FIELDS = (
+    "input_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+    "output_tokens",
+)
+
+_lock = threading.Lock()
+_counters: dict[str, dict[str, Any]] = {}
+_last_call: dict[str, float] = {}
+
+
+def digest(prefix: str) -> str:
+    return hashlib.blake2b(prefix.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def system_blocks(name: str, prefix: str) -> str | list[dict[str, Any]]:
+    """
+    The `system` argument for messages.create: the prefix marked cacheable
+    when it is long enough and `name` was called within the cache TTL,
+    otherwise the plain prefix.
+    """
+    now = time.monotonic()
+    with _lock:
+        last = _last_call.get(name)
+        _last_call[name] = now
+    recent = last is not None and now - last < CACHE_TTL_S
+    if recent and estimate_tokens(prefix) >= MIN_CACHE_TOKENS:
+        return [{"type": "text", "text": prefix, "cache_control": CACHE_CONTROL}]
+    return prefix
+
+
+def record(name: str, prefix: str, usage: Any) -> dict[str, int]:
+    """Add one response's usage to the counters for `name` and return it as a dict."""
+    # SDK versions without caching support leave the cache fields off (or None)
+    tokens = {field: int(getattr(usage, field, 0) or 0) for field in USAGE_FIELDS}
+    with _lock:
+        c = _counters.setdefault(
+            name, {"calls": 0, **dict.fromkeys(USAGE_FIELDS, 0), "prefixes": set()}
+        )
+        c["calls"] += 1
+        for field, n in tokens.items():
+            c[field] += n
+        c["prefixes"].add(digest(prefix))
+    return tokens
+
+
+def stats() -> dict[str, Any]:
+    with _lock:
+        out = {}
+        for name, c in _counters.items():
+            prompt_tokens = (
+                c["input_tokens"] + c["cache_creation_input_tokens"] + c["cache_read_input_tokens"]
+            )
+            out[name] = {
+                "calls": c["calls"],
+                **{field: c[field] for field in USAGE_FIELDS},
+                "cache_read_ratio": (
+                    round(c["cache_read_input_tokens"] / prompt_tokens, 3) if prompt_tokens else None
+                ),
+                "prefix_variants": len(c["prefixes"]),
+            }
+        return out
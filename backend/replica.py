@@ -0,0 +1,235 @@
+"""
+replica.py
+Optional read-only snapshot of the database for GET endpoints.
+
+With READ_REPLICA=1, a background thread copies the primary database into
+`<db>.replica` with SQLite's online backup API whenever the primary (or its
+WAL) has changed. Each copy is built in a temp file and then swapped in
+with os.replace, so readers never see a half-written snapshot. Connections
+opened earlier keep reading the file they opened. Readers open the snapshot
+read-only with `immutable=1`, which means no locks and no WAL lookups, and
+memory-map it. Long ingest transactions, `clear_existing` deletes and WAL
+checkpoints on the primary therefore never touch a dashboard read.
+
+One worker refreshes at a time: the others skip the cycle while another
+holds the lock file. Each cycle writes a sidecar `<db>.replica.json` with
+`verified_at`, the last time the primary was seen unchanged since the
+snapshot was taken. `now - verified_at` is therefore an upper bound on how
+stale the snapshot can be. If that bound exceeds READ_REPLICA_MAX_STALENESS_S
+(for example because the refresher died), readers fall back to the primary.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+
+import data_version
+from admission import ASGIApp, Receive, Scope, Send
+
+REFRESH_INTERVAL_S = float(os.getenv("READ_REPLICA_REFRESH_S", "2"))
+MAX_STALENESS_S = float(os.getenv("READ_REPLICA_MAX_STALENESS_S", "60"))
+MMAP_BYTES = 256 * 1024 * 1024
+
+_primary: Path | None = None
+_path: Path | None = None
+_stats: dict[str, Any] = {
+    "refreshes": 0, "skipped_unchanged": 0, "last_refresh_ms": None, "last_error": None,
+}
+_meta_cache: tuple[int, dict[str, Any]] | None = None
+
+
+def configure(db_path: Path) -> bool:
+    """Enable replica mode when READ_REPLICA is set; returns whether it is on."""
+    global _primary, _path
+    if os.getenv("READ_REPLICA", "").strip().lower() not in ("1", "true", "yes"):
+        _primary = _path = None
+        return False
+    _primary = Path(db_path)
+    _path = Path(os.getenv("READ_REPLICA_PATH") or f"{_primary}.replica")
+    return True
+
+
+def enabled() -> bool:
+    return _path is not None
+
+
+# ---------------------------------------------------------------------------
+# Refresh (writer side)
+# ---------------------------------------------------------------------------
+
+def _fingerprint(primary: Path) -> list[list[int]]:
+    """(mtime_ns, size) of the database and its WAL; any commit changes one."""
+    out = []
+    for p in (primary, Path(f"{primary}-wal")):
+        try:
+            st = p.stat()
+            out.append([st.st_mtime_ns, st.st_size])
+        except FileNotFoundError:
+            out.append([0, 0])
+    return out
+
+
+def _meta_path() -> Path:
+    return Path(f"{_path}.json")
+
+
+def _write_meta(meta: dict[str, Any]) -> None:
+    tmp = Path(f"{_path}.json.tmp")
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, _meta_path())
+
+
+def _read_meta() -> dict[str, Any] | None:
+    """Sidecar metadata, re-parsed only when the file changes."""
+    global _meta_cache
+    try:
+        mtime = _meta_path().stat().st_mtime_ns
+        if _meta_cache is None or _meta_cache[0] != mtime:
+            _meta_cache = (mtime, json.loads(_meta_path().read_text()))
+    except (OSError, ValueError):
+        return None
+    return _meta_cache[1]
+
+
+def refresh() -> bool:
+    """
+    Re-snapshot the primary if it changed since the last snapshot. Returns
+    True if a new snapshot was published, False if unchanged or another
+    worker is refreshing.
+    """
+    assert _primary is not None and _path is not None
+    with open(f"{_path}.lock", "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+
+        checked_at = time.time()
+        fingerprint = _fingerprint(_primary)
+        meta = _read_meta()
+        if meta and meta["fingerprint"] == fingerprint and _path.exists():
+            _write_meta({**meta, "verified_at": checked_at})
+            _stats["skipped_unchanged"] += 1
+            return False
+
+        # Everything committed before checked_at is in the copy: the
+        # backup's read transaction starts after the fingerprint was taken.
+        t0 = time.perf_counter()
+        tmp = Path(f"{_path}.tmp")
+        tmp.unlink(missing_ok=True)
+        src = sqlite3.connect(_primary, timeout=30.0)
+        dst = sqlite3.connect(tmp)
+        try:
+            src.backup(dst)
+            dst.execute("PRAGMA journal_mode=DELETE;")
+            version = data_version.current(dst)
+        finally:
+            src.close()
+            dst.close()
+        os.replace(tmp, _path)
+        _write_meta({
+            "data_version": version,
+            "snapshot_at": checked_at,
+            "verified_at": checked_at,
+            "fingerprint": fingerprint,
+        })
+        _stats["refreshes"] += 1
+        _stats["last_refresh_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        return True
+
+
+def start_refresher() -> threading.Thread:
+    """Refresh every REFRESH_INTERVAL_S in a daemon thread (one per worker)."""
+
+    def loop() -> None:
+        while True:
+            try:
+                refresh()
+                _stats["last_error"] = None
+            except Exception as exc:  # keep refreshing; readers fall back if stale
+                _stats["last_error"] = f"{type(exc).__name__}: {exc}"
+            time.sleep(REFRESH_INTERVAL_S)
+
+    thread = threading.Thread(target=loop, name="read-replica", daemon=True)
+    thread.start()
+    return thread
+
+
+# ---------------------------------------------------------------------------
+# Read side
+# ---------------------------------------------------------------------------
+
+def staleness_bound() -> float | None:
+    """Seconds of writes the snapshot may be missing; None when unusable."""
+    if _path is None:
+        return None
+    meta = _read_meta()
+    if meta is None:
+        return None
+    bound = max(0.0, time.time() - meta["verified_at"])
+    return bound if bound <= MAX_STALENESS_S else None
+
+
+def connect() -> tuple[sqlite3.Connection, float] | None:
+    """A read-only connection to the snapshot and its staleness bound, or None."""
+    bound = staleness_bound()
+    if bound is None or not _path.exists():
+        return None
+    conn = sqlite3.connect(f"file:{_path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA mmap_size = {MMAP_BYTES};")
+    return conn, bound
+
+
+def stats() -> dict[str, Any]:
+    meta = _read_meta() if _path is not None else None
+    return {
+        "enabled": enabled(),
+        "data_version": meta["data_version"] if meta else None,
+        "staleness_bound_s": round(time.time() - meta["verified_at"], 3) if meta else None,
+        **_stats,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Response headers
+# ---------------------------------------------------------------------------
+
+# Per-request slot the read path fills in. The dict is shared with the
+# threadpool copy of the context, so writes from the handler are visible here.
+read_info: ContextVar[dict[str, Any] | None] = ContextVar("read_info", default=None)
+
+
+class ReadSourceMiddleware:
+    """Adds X-Read-Source (and X-Staleness-Bound when from the replica)."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        info: dict[str, Any] = {}
+        token = read_info.set(info)
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            if message["type"] == "http.response.start" and info:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-read-source", info["source"].encode()))
+                if info.get("staleness_s") is not None:
+                    headers.append((b"x-staleness-bound", f"{info['staleness_s']:.3f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            read_info.reset(token)
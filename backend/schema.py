@@ -0,0 +1,303 @@
+"""
+schema.py
+Versioned schema bootstrap for ads.db.
+
+The applied version is kept in `PRAGMA user_version`. On startup
+`ensure_schema()` compares it with SCHEMA_VERSION and runs only the
+migration steps that are missing, so a current database costs a single
+pragma read instead of re-running every CREATE statement.
+
+To change the schema, append a step to MIGRATIONS; its 1-based position is
+the version it brings the database to. The version is written only after
+every pending step has succeeded.
+
+Migration steps are DDL only, so startup never blocks on the size of the
+database. A step whose new table or column has to be filled from existing
+ads queues a named backfill in `meta` instead. `run_backfills()` works
+through the queue after startup, in a background thread, while /ready
+reports 503. Each backfill commits together with the removal of its queue
+entry, so an interrupted run resumes where it stopped.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from typing import Callable
+
+import ad_archive
+import ad_batch
+import ad_classifier
+import ad_counts
+import ad_sample
+import anomalies
+import brief_archive
+import creative_assets
+import data_version
+import enrichment
+import sketches
+import spend_history
+import weekly_spend
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS competitor_ads (
+    id                  TEXT PRIMARY KEY,
+    ad_id               TEXT UNIQUE NOT NULL,
+    competitor_name     TEXT,
+    competitor_page_id  TEXT,
+    brand               TEXT,
+    vertical            TEXT,
+    ad_format           TEXT,
+    message_theme       TEXT,
+    emotional_tone      TEXT,
+    headline            TEXT,
+    body_text           TEXT,
+    cta                 TEXT,
+    platform            TEXT,
+    estimated_spend_min INTEGER,
+    estimated_spend_max INTEGER,
+    start_date          TEXT,
+    end_date            TEXT,
+    is_active           INTEGER DEFAULT 1,
+    days_running        INTEGER DEFAULT 0,
+    num_cards           INTEGER,
+    country             TEXT,
+    source              TEXT DEFAULT 'mock',
+    created_at          TEXT DEFAULT (datetime('now'))
+);
+"""
+
+CREATE_INDEXES_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_brand           ON competitor_ads(brand);",
+    "CREATE INDEX IF NOT EXISTS idx_competitor_name ON competitor_ads(competitor_name);",
+    "CREATE INDEX IF NOT EXISTS idx_message_theme   ON competitor_ads(message_theme);",
+    "CREATE INDEX IF NOT EXISTS idx_is_active       ON competitor_ads(is_active);",
+    "CREATE INDEX IF NOT EXISTS idx_start_date      ON competitor_ads(start_date);",
+]
+
+
+_BACKFILL_KEY = "backfill:{}"
+
+
+def _queue_backfill(conn: sqlite3.Connection, name: str) -> None:
+    conn.execute(
+        "INSERT OR IGNORE INTO meta (key, value) VALUES (?, 0);", [_BACKFILL_KEY.format(name)]
+    )
+
+
+# ---------------------------------------------------------------------------
+# Migration steps
+# ---------------------------------------------------------------------------
+
+def _v1_baseline(conn: sqlite3.Connection) -> None:
+    """Everything up to the brief archive; idempotent for pre-versioning DBs."""
+    conn.execute(CREATE_TABLE_SQL)
+    for sql in CREATE_INDEXES_SQL:
+        conn.execute(sql)
+    for sql in brief_archive.CREATE_ARCHIVE_SQL:
+        conn.execute(sql)
+    brief_archive.migrate_legacy(conn)
+    conn.execute(data_version.CREATE_META_SQL)
+    for sql in spend_history.CREATE_HISTORY_SQL:
+        conn.execute(sql)
+    conn.execute(weekly_spend.CREATE_CALENDAR_SQL)
+    weekly_spend.populate_calendar(conn)
+
+
+def _v2_sketches(conn: sqlite3.Connection) -> None:
+    """Per-(brand, week) HyperLogLog / SpaceSaving sketches, backfilled from existing ads."""
+    conn.execute(sketches.CREATE_SKETCHES_SQL)
+    _queue_backfill(conn, "sketches")
+
+
+def _v3_ad_sample(conn: sqlite3.Connection) -> None:
+    """Stratified (brand, competitor) sample backing ?approx=true."""
+    for sql in ad_sample.CREATE_SAMPLE_SQL:
+        conn.execute(sql)
+    _queue_backfill(conn, "ad_sample")
+
+
+def _v4_label_confidence(conn: sqlite3.Connection) -> None:
+    """Per-label confidence and provenance, plus the LLM enrichment queue."""
+    conn.execute("ALTER TABLE competitor_ads ADD COLUMN theme_confidence REAL DEFAULT 1.0;")
+    conn.execute("ALTER TABLE competitor_ads ADD COLUMN tone_confidence REAL DEFAULT 1.0;")
+    conn.execute(
+        f"ALTER TABLE competitor_ads ADD COLUMN label_source TEXT "
+        f"DEFAULT '{ad_classifier.SOURCE_LABELED}';"
+    )
+    conn.execute(ad_classifier.CREATE_QUEUE_SQL)
+
+
+def _v5_enrichment_cache(conn: sqlite3.Connection) -> None:
+    """LLM labels keyed by creative content hash."""
+    conn.execute(enrichment.CREATE_CACHE_SQL)
+
+
+def _v6_anomalies(conn: sqlite3.Connection) -> None:
+    """EWMA state per spend/launch series, backfilled by scoring existing history."""
+    for sql in anomalies.CREATE_ANOMALY_SQL:
+        conn.execute(sql)
+    _queue_backfill(conn, "anomalies")
+
+
+def _v7_filter_counts(conn: sqlite3.Connection) -> None:
+    """Trigger-maintained counts per filter combination, for /api/ads totals."""
+    for sql in ad_counts.CREATE_COUNTS_SQL:
+        conn.execute(sql)
+    _queue_backfill(conn, "filter_counts")
+
+
+def _v8_content_hash(conn: sqlite3.Connection) -> None:
+    """Per-ad content hash so re-ingesting an unchanged ad is a no-op."""
+    conn.execute("ALTER TABLE competitor_ads ADD COLUMN content_hash TEXT;")
+    _queue_backfill(conn, "content_hash")
+
+
+def _v9_ad_archive(conn: sqlite3.Connection) -> None:
+    """Cold table for long-ended ads, its counts and rollups, and the all_ads view."""
+    for sql in ad_archive.CREATE_ARCHIVE_SQL:
+        conn.execute(sql)
+    for sql in ad_counts.CREATE_ARCHIVED_COUNTS_SQL:
+        conn.execute(sql)
+
+
+def _v10_creative_assets(conn: sqlite3.Connection) -> None:
+    """Creative URLs per ad and the content-addressed asset index."""
+    for sql in creative_assets.CREATE_ASSETS_SQL:
+        conn.execute(sql)
+
+
+def _v11_database_id(conn: sqlite3.Connection) -> None:
+    """Random per-database identity, so caches outside the file can tell databases apart."""
+    data_version.create_database_id(conn)
+
+
+def _v12_source_content_hash(conn: sqlite3.Connection) -> None:
+    """Re-hash over source content only: days_running and label provenance left out."""
+    _queue_backfill(conn, "content_hash")
+
+
+def _v13_spend_history_backfill(conn: sqlite3.Connection) -> None:
+    """Daily spend history for databases seeded before it was recorded, then rescored."""
+    _queue_backfill(conn, "spend_history")
+    _queue_backfill(conn, "anomalies")
+
+
+MIGRATIONS: list[Callable[[sqlite3.Connection], None]] = [
+    _v1_baseline,
+    _v2_sketches,
+    _v3_ad_sample,
+    _v4_label_confidence,
+    _v5_enrichment_cache,
+    _v6_anomalies,
+    _v7_filter_counts,
+    _v8_content_hash,
+    _v9_ad_archive,
+    _v10_creative_assets,
+    _v11_database_id,
+    _v12_source_content_hash,
+    _v13_spend_history_backfill,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+# ---------------------------------------------------------------------------
+# Backfills
+# ---------------------------------------------------------------------------
+
+def _backfill_content_hash(conn: sqlite3.Connection) -> None:
+    fields = ("ad_id", *ad_batch.CONTENT_FIELDS)
+    hot = ad_batch.AdRecordBatch.from_records(
+        dict(zip(fields, row))
+        for row in conn.execute(f"SELECT {', '.join(fields)} FROM competitor_ads;")
+    )
+    conn.executemany(
+        "UPDATE competitor_ads SET content_hash = ? WHERE ad_id = ?;",
+        zip(hot.hash_content(), hot.column("ad_id")),
+    )
+    archived = ad_batch.AdRecordBatch.from_records(ad_archive.fetch(conn, "", [], -1))
+    conn.executemany(
+        "UPDATE archived_ads SET content_hash = ? WHERE ad_id = ?;",
+        zip(archived.hash_content(), archived.column("ad_id")),
+    )
+
+
+def _backfill_filter_counts(conn: sqlite3.Connection) -> None:
+    ad_counts.rebuild(conn)
+    ad_counts.rebuild(conn, archived=True)
+
+
+def _backfill_spend_history(conn: sqlite3.Connection) -> None:
+    # Only an empty history is reconstructed; recorded snapshots are never overwritten
+    if conn.execute("SELECT 1 FROM ad_spend_history LIMIT 1;").fetchone() is None:
+        factory, conn.row_factory = conn.row_factory, sqlite3.Row
+        try:
+            spend_history.backfill_from_ads(conn)
+        finally:
+            conn.row_factory = factory
+
+
+# Run in this order: the hashes and counts first, then the derived state
+BACKFILLS: dict[str, Callable[[sqlite3.Connection], object]] = {
+    "content_hash": _backfill_content_hash,
+    "filter_counts": _backfill_filter_counts,
+    "sketches": sketches.rebuild,
+    "ad_sample": ad_sample.rebuild,
+    "spend_history": _backfill_spend_history,
+    "anomalies": anomalies.replay,
+}
+
+
+def pending_backfills(conn: sqlite3.Connection) -> list[str]:
+    queued = {
+        key for (key,) in conn.execute(
+            "SELECT key FROM meta WHERE key LIKE ?;", [_BACKFILL_KEY.format("%")]
+        )
+    }
+    return [name for name in BACKFILLS if _BACKFILL_KEY.format(name) in queued]
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def ensure_schema(conn: sqlite3.Connection) -> bool:
+    """Bring the database up to SCHEMA_VERSION. Returns True if any step ran."""
+    version = conn.execute("PRAGMA user_version;").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return False
+
+    # Several workers may boot at once: take the write lock, then re-check.
+    conn.execute("BEGIN IMMEDIATE;")
+    version = conn.execute("PRAGMA user_version;").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        conn.rollback()
+        return False
+
+    for step in MIGRATIONS[version:]:
+        step(conn)
+    # PRAGMA does not accept bound parameters; SCHEMA_VERSION is an int.
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+    conn.commit()
+    return True
+
+
+def run_backfills(conn: sqlite3.Connection) -> list[str]:
+    """
+    Run every queued backfill, each in its own write transaction. Safe to
+    call from several workers at once: whoever takes the lock first does a
+    backfill and the rest find it gone. Returns the backfills this call ran.
+    """
+    done = []
+    for name in pending_backfills(conn):
+        key = _BACKFILL_KEY.format(name)
+        conn.execute("BEGIN IMMEDIATE;")
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?;", [key]).fetchone() is None:
+            conn.rollback()
+            continue
+        BACKFILLS[name](conn)
+        conn.execute("DELETE FROM meta WHERE key = ?;", [key])
+        data_version.bump(conn)
+        conn.commit()
+        done.append(name)
+    return done
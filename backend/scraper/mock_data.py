@@ -13,6 +13,8 @@ import random
 import uuid
 from datetime import date, timedelta
 
+from ad_batch import AdRecordBatch
+
 # ---------------------------------------------------------------------------
 # Constants
 # ---------------------------------------------------------------------------
@@ -363,13 +365,13 @@ def _pick_copy(theme: str, tone: str) -> tuple[str, str]:
 # Core generator
 # ---------------------------------------------------------------------------
 
-def generate_mock_ads() -> list[dict]:
+def generate_mock_ads() -> AdRecordBatch:
     """
-    Returns a list of dicts, each representing one row in `competitor_ads`.
+    Returns an AdRecordBatch; each row is one record for `competitor_ads`.
     Generates roughly 8–14 ads per competitor = 120–210 total records.
     Spread across last 90 days; some start 60+ days ago to test longevity.
     """
-    records: list[dict] = []
+    records = AdRecordBatch()
 
     for brand_key, brand_info in BRAND_META.items():
         for competitor in COMPETITORS[brand_key]:
@@ -406,34 +408,35 @@ def generate_mock_ads() -> list[dict]:
                 # Carousel gets multiple card count
                 num_cards = random.randint(3, 6) if fmt == "carousel" else None
 
-                records.append({
-                    "id": str(uuid.uuid4()),
-                    "ad_id": ad_id,
-                    "competitor_name": competitor["name"],
-                    "competitor_page_id": competitor["page_id"],
-                    "brand": brand_key,
-                    "vertical": brand_info["vertical"],
-                    "ad_format": fmt,
-                    "message_theme": theme,
-                    "emotional_tone": tone,
-                    "headline": headline,
-                    "body_text": body_text,
-                    "cta": cta,
-                    "platform": platform,
-                    "estimated_spend_min": spend_min,
-                    "estimated_spend_max": spend_max,
-                    "start_date": start.isoformat(),
-                    "end_date": end.isoformat() if end else None,
-                    "is_active": is_active,
-                    "days_running": days_running,
-                    "num_cards": num_cards,
-                    "country": competitor["country"],
-                    "source": "mock",
-                })
+                records.append(
+                    id=str(uuid.uuid4()),
+                    ad_id=ad_id,
+                    competitor_name=competitor["name"],
+                    competitor_page_id=competitor["page_id"],
+                    brand=brand_key,
+                    vertical=brand_info["vertical"],
+                    ad_format=fmt,
+                    message_theme=theme,
+                    emotional_tone=tone,
+                    headline=headline,
+                    body_text=body_text,
+                    cta=cta,
+                    platform=platform,
+                    estimated_spend_min=spend_min,
+                    estimated_spend_max=spend_max,
+                    start_date=start.isoformat(),
+                    end_date=end.isoformat() if end else None,
+                    is_active=is_active,
+                    days_running=days_running,
+                    num_cards=num_cards,
+                    country=competitor["country"],
+                    source="mock",
+                )
 
     # Deterministic shuffle so repeated calls differ in order but cover all brands
-    random.shuffle(records)
-    return records
+    order = list(range(len(records)))
+    random.shuffle(order)
+    return records.take(order)
 
 
 # ---------------------------------------------------------------------------
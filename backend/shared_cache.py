@@ -0,0 +1,107 @@
+"""
+shared_cache.py
+Cross-process cache for aggregate results when serving with several
+uvicorn workers.
+
+Entries are small files in a private directory on /dev/shm (tmpfs, i.e.
+shared memory) when available, otherwise the system temp dir. Each file is
+a 16-byte header (database id, data version) followed by a JSON payload,
+written to a temp name and atomically renamed so readers never observe a
+partial entry.
+
+Coherence: every entry carries the `data_version` it was computed at, and a
+read only hits when that matches the caller's current version. Any worker's
+ingest bumps the version row, so all workers miss on their next read and
+recompute — no explicit invalidation messages are needed. The database id
+(data_version.database_id) is checked too, because a recreated database at
+the same path starts counting from 1 again.
+
+Each put removes entries written at an older version or for another
+database, so the directory holds roughly one entry per key in use.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from pathlib import Path
+from typing import Any, BinaryIO
+
+_HEADER = struct.Struct("<qq")
+
+_dir: Path | None = None
+
+
+def configure(db_path: Path) -> Path:
+    """Choose the cache directory for `db_path`; separate DBs never share entries."""
+    global _dir
+    root = os.getenv("SHARED_CACHE_DIR") or (
+        "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    )
+    tag = hashlib.sha1(str(Path(db_path).resolve()).encode()).hexdigest()[:12]
+    _dir = Path(root) / f"ad-war-room-{tag}"
+    _dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    return _dir
+
+
+def _path(key: str) -> Path | None:
+    if _dir is None:
+        return None
+    return _dir / hashlib.sha1(key.encode()).hexdigest()
+
+
+def _stamp(f: BinaryIO) -> tuple[int, int] | None:
+    header = f.read(_HEADER.size)
+    return _HEADER.unpack(header) if len(header) == _HEADER.size else None
+
+
+def get(key: str, database_id: int, version: int) -> Any | None:
+    """Return the cached value for `key` if it was stored for this database at `version`."""
+    path = _path(key)
+    if path is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            if _stamp(f) != (database_id, version):
+                return None
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _prune(database_id: int, version: int) -> None:
+    """Remove entries from an older version or another database."""
+    assert _dir is not None
+    for entry in os.scandir(_dir):
+        if entry.name.startswith("tmp"):
+            continue
+        try:
+            with open(entry.path, "rb") as f:
+                stamp = _stamp(f)
+            if stamp is None or stamp[0] != database_id or stamp[1] < version:
+                os.unlink(entry.path)
+        except OSError:
+            pass  # removed or replaced by another worker meanwhile
+
+
+def put(key: str, database_id: int, version: int, value: Any) -> None:
+    path = _path(key)
+    if path is None:
+        return
+    _prune(database_id, version)
+    payload = (
+        _HEADER.pack(database_id, version) + json.dumps(value, separators=(",", ":")).encode()
+    )
+    fd, tmp = tempfile.mkstemp(dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
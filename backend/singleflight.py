@@ -0,0 +1,174 @@
+"""
+singleflight.py
+Request coalescing: concurrent identical calls share one in-flight
+computation.
+
+Calls are identified by (name, normalized arguments, data version). The
+first caller for a key runs the function; callers arriving while it is still
+running wait for and receive the same result (or exception). Nothing is
+cached after the call completes — that is brand_snapshot's job — so a
+result can never outlive the data version it was computed at.
+
+Works for both sync handlers (threads wait on an Event) and async handlers
+(tasks await a shared Future).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import threading
+from typing import Any, Callable, Hashable
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class _Counters:
+    __slots__ = ("calls", "executions")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.executions = 0
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._inflight: dict[Hashable, _Call] = {}
+        self._inflight_async: dict[Hashable, asyncio.Future] = {}
+        self._counters: dict[str, _Counters] = {}
+
+    def _count(self, name: str, executed: bool) -> None:
+        # Caller holds self._lock
+        c = self._counters.setdefault(name, _Counters())
+        c.calls += 1
+        c.executions += executed
+
+    # -- sync ---------------------------------------------------------------
+
+    def do(self, name: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+        full_key = (name, key)
+        with self._lock:
+            call = self._inflight.get(full_key)
+            leader = call is None
+            if leader:
+                call = self._inflight[full_key] = _Call()
+            self._count(name, leader)
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[full_key]
+            call.event.set()
+        return call.result
+
+    # -- async --------------------------------------------------------------
+
+    async def do_async(self, name: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+        full_key = (name, key)
+        with self._lock:
+            fut = self._inflight_async.get(full_key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight_async[full_key] = asyncio.get_running_loop().create_future()
+            self._count(name, leader)
+
+        if not leader:
+            return await asyncio.shield(fut)
+
+        try:
+            result = await fn()
+        except BaseException as exc:
+            fut.set_exception(exc)
+            fut.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight_async[full_key]
+
+    # -- decorator ----------------------------------------------------------
+
+    def coalesce(self, name: str, version: Callable[[], Hashable]) -> Callable:
+        """
+        Decorate a handler so identical concurrent calls are coalesced. The
+        handler's string arguments are normalized (stripped, "" → None)
+        before it runs. The key is those arguments plus `version()`, so
+        requests straddling a write never share.
+        """
+
+        def decorator(fn: Callable) -> Callable:
+            sig = inspect.signature(fn)
+
+            def bind(args: tuple, kwargs: dict) -> inspect.BoundArguments:
+                bound = sig.bind(*args, **kwargs)
+                bound.apply_defaults()
+                # The leader runs with the same normalized arguments the key
+                # is built from, so every caller sharing a key gets its answer
+                for k, v in bound.arguments.items():
+                    bound.arguments[k] = _normalize(v)
+                return bound
+
+            def key_for(bound: inspect.BoundArguments) -> Hashable:
+                return tuple(sorted(bound.arguments.items())), version()
+
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                    bound = bind(args, kwargs)
+                    return await self.do_async(
+                        name, key_for(bound), lambda: fn(*bound.args, **bound.kwargs)
+                    )
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                bound = bind(args, kwargs)
+                return self.do(name, key_for(bound), lambda: fn(*bound.args, **bound.kwargs))
+            return wrapper
+
+        return decorator
+
+    # -- metrics ------------------------------------------------------------
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {
+                    "calls": c.calls,
+                    "executions": c.executions,
+                    "coalesced": c.calls - c.executions,
+                    "coalescing_ratio": round((c.calls - c.executions) / c.calls, 3)
+                    if c.calls else 0.0,
+                    "in_flight": sum(1 for k in (*self._inflight, *self._inflight_async)
+                                     if k[0] == name),
+                }
+                for name, c in self._counters.items()
+            }
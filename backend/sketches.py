@@ -0,0 +1,250 @@
+"""
+sketches.py
+Mergeable probabilistic sketches maintained at ingest, per brand per week.
+
+- HyperLogLog (p=12, 4096 one-byte registers) estimates distinct competitor
+  counts with a relative standard error of 1.04/sqrt(4096) ≈ 1.6%.
+- SpaceSaving (k=64 counters) tracks the top message themes and emotional
+  tones. Each reported count overestimates the true count by at most its
+  `max_overcount`, and every value whose true count exceeds n/k is
+  guaranteed to be present.
+
+Both merge losslessly with respect to those bounds, so a brand-wide or
+multi-week answer is the merge of the per-(brand, week) sketches and never
+touches `competitor_ads`. Sketches live in `ad_sketches`, keyed by brand,
+Monday-aligned start week (day number) and kind; each ad is counted once,
+when it is first ingested.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import sqlite3
+from datetime import date
+from typing import Any, Iterable
+
+from spend_history import day_number, week_start
+
+CREATE_SKETCHES_SQL = """
+CREATE TABLE IF NOT EXISTS ad_sketches (
+    brand       TEXT NOT NULL,
+    week_start  INTEGER NOT NULL,
+    kind        TEXT NOT NULL,
+    blob        BLOB NOT NULL,
+    PRIMARY KEY (brand, week_start, kind)
+) WITHOUT ROWID;
+"""
+
+HLL_PRECISION = 12
+SPACE_SAVING_K = 64
+
+
+# ---------------------------------------------------------------------------
+# HyperLogLog
+# ---------------------------------------------------------------------------
+
+class HyperLogLog:
+    def __init__(self, registers: bytes | None = None, p: int = HLL_PRECISION) -> None:
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers else bytearray(self.m)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+    def add(self, value: str) -> None:
+        h = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: HyperLogLog) -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> float:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)  # linear counting for small cardinalities
+        return raw
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+
+# ---------------------------------------------------------------------------
+# SpaceSaving
+# ---------------------------------------------------------------------------
+
+class SpaceSaving:
+    def __init__(self, k: int = SPACE_SAVING_K) -> None:
+        self.k = k
+        self.n = 0
+        self.counts: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+
+    def _floor(self) -> int:
+        """Count any unmonitored item may have had (0 until the summary is full)."""
+        return min(self.counts.values()) if len(self.counts) >= self.k else 0
+
+    def add(self, item: str, weight: int = 1) -> None:
+        self.n += weight
+        if item in self.counts:
+            self.counts[item] += weight
+        elif len(self.counts) < self.k:
+            self.counts[item] = weight
+            self.errors[item] = 0
+        else:
+            victim = min(self.counts, key=self.counts.__getitem__)
+            floor = self.counts.pop(victim)
+            del self.errors[victim]
+            self.counts[item] = floor + weight
+            self.errors[item] = floor
+
+    def merge(self, other: SpaceSaving) -> None:
+        floor_a, floor_b = self._floor(), other._floor()
+        merged: dict[str, tuple[int, int]] = {}
+        for item in self.counts.keys() | other.counts.keys():
+            ca = self.counts.get(item)
+            cb = other.counts.get(item)
+            count = (ca if ca is not None else floor_a) + (cb if cb is not None else floor_b)
+            error = (self.errors[item] if ca is not None else floor_a) + (
+                other.errors[item] if cb is not None else floor_b
+            )
+            merged[item] = (count, error)
+        top = sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)[: self.k]
+        self.n += other.n
+        self.counts = {item: c for item, (c, _) in top}
+        self.errors = {item: e for item, (_, e) in top}
+
+    def top(self, n: int) -> list[dict[str, Any]]:
+        ranked = sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)[:n]
+        return [
+            {"value": item, "count": c, "max_overcount": self.errors[item]}
+            for item, c in ranked
+        ]
+
+    def to_bytes(self) -> bytes:
+        return json.dumps(
+            {"k": self.k, "n": self.n, "c": {i: [c, self.errors[i]] for i, c in self.counts.items()}}
+        ).encode()
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> SpaceSaving:
+        data = json.loads(blob)
+        ss = cls(data["k"])
+        ss.n = data["n"]
+        ss.counts = {i: ce[0] for i, ce in data["c"].items()}
+        ss.errors = {i: ce[1] for i, ce in data["c"].items()}
+        return ss
+
+
+# ---------------------------------------------------------------------------
+# Persistence
+# ---------------------------------------------------------------------------
+
+# kind → (record field, sketch type)
+KINDS: dict[str, tuple[str, type]] = {
+    "competitors_hll": ("competitor_name", HyperLogLog),
+    "themes_ss": ("message_theme", SpaceSaving),
+    "tones_ss": ("emotional_tone", SpaceSaving),
+}
+
+
+def _load(blob: bytes, cls: type) -> Any:
+    return cls(blob) if cls is HyperLogLog else cls.from_bytes(blob)
+
+
+def observe(conn: sqlite3.Connection, records: Iterable[Any]) -> int:
+    """
+    Fold newly ingested ads into their (brand, start week) sketches.
+    Only pass ads that were not in the table before; caller commits.
+    """
+    groups: dict[tuple[str, int], list[Any]] = {}
+    for rec in records:
+        if rec["start_date"]:
+            ws = week_start(day_number(date.fromisoformat(rec["start_date"])))
+            groups.setdefault((rec["brand"], ws), []).append(rec)
+
+    for (brand, ws), recs in groups.items():
+        for kind, (field, cls) in KINDS.items():
+            row = conn.execute(
+                "SELECT blob FROM ad_sketches WHERE brand = ? AND week_start = ? AND kind = ?;",
+                [brand, ws, kind],
+            ).fetchone()
+            sketch = _load(row[0], cls) if row else cls()
+            for rec in recs:
+                if rec[field] is not None:
+                    sketch.add(rec[field])
+            conn.execute(
+                "INSERT OR REPLACE INTO ad_sketches (brand, week_start, kind, blob) "
+                "VALUES (?, ?, ?, ?);",
+                [brand, ws, kind, sketch.to_bytes()],
+            )
+    return sum(len(r) for r in groups.values())
+
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """
+    Recreate all sketches from hot and archived ads (schema backfill,
+    clear_existing).
+    """
+    conn.execute("DELETE FROM ad_sketches;")
+    rows = conn.execute(
+        "SELECT brand, start_date, competitor_name, message_theme, emotional_tone "
+        "FROM all_ads;"
+    ).fetchall()
+    cols = ("brand", "start_date", "competitor_name", "message_theme", "emotional_tone")
+    return observe(conn, [dict(zip(cols, r)) for r in rows])
+
+
+# ---------------------------------------------------------------------------
+# Approximate queries
+# ---------------------------------------------------------------------------
+
+def summary(
+    conn: sqlite3.Connection,
+    brand: str | None = None,
+    since: date | None = None,
+    top_n: int = 5,
+) -> dict[str, Any]:
+    """Merge the matching weekly sketches and report estimates with error bounds."""
+    conditions, params = [], []
+    if brand:
+        conditions.append("brand = ?")
+        params.append(brand)
+    if since:
+        conditions.append("week_start >= ?")
+        params.append(week_start(day_number(since)))
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    merged: dict[str, Any] = {kind: cls() for kind, (_, cls) in KINDS.items()}
+    weeks = set()
+    for b, ws, kind, blob in conn.execute(
+        f"SELECT brand, week_start, kind, blob FROM ad_sketches {where};", params
+    ):
+        merged[kind].merge(_load(blob, KINDS[kind][1]))
+        weeks.add(ws)
+
+    hll: HyperLogLog = merged["competitors_hll"]
+    themes: SpaceSaving = merged["themes_ss"]
+    tones: SpaceSaving = merged["tones_ss"]
+    return {
+        "brand": brand,
+        "weeks": len(weeks),
+        "total_ads": themes.n,
+        "distinct_competitors": {
+            "estimate": round(hll.estimate()),
+            "relative_std_error": round(hll.relative_error, 4),
+        },
+        "top_themes": themes.top(top_n),
+        "top_tones": tones.top(top_n),
+        "top_k_guarantee": f"any value with more than total_ads/{SPACE_SAVING_K} ads is listed",
+    }
@@ -0,0 +1,286 @@
+"""
+spend_history.py
+Append-only daily spend snapshots for every tracked ad.
+
+`competitor_ads` only keeps the latest spend estimate per ad, so each refresh
+also writes one compact row per active ad into `ad_spend_history`. Rows are
+integer-encoded: competitor and ad identifiers are interned into
+`history_keys`, and dates are stored as day numbers (days since 1970-01-01).
+
+Retention: rows younger than DAILY_RETENTION_DAYS stay at daily resolution;
+older rows are folded into one row per (competitor, ad, Monday-aligned week)
+whose spend is the average daily spend and `span_days` the number of days it
+covers. Spend totals are therefore always `SUM(spend * span_days)`.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from datetime import date
+from typing import Any, Iterable
+
+# ---------------------------------------------------------------------------
+# Schema
+# ---------------------------------------------------------------------------
+
+DAILY_RETENTION_DAYS = 90
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# meta row (data_version's key/value table) holding the last snapshot day
+_SNAPSHOT_DAY_KEY = "spend_snapshot_day"
+
+CREATE_HISTORY_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS history_keys (
+        id     INTEGER PRIMARY KEY,
+        kind   TEXT NOT NULL,
+        value  TEXT NOT NULL,
+        UNIQUE (kind, value)
+    );
+    """,
+    # Clustered on (competitor, day) so per-competitor range scans are a
+    # single B-tree walk; WITHOUT ROWID keeps each row to a handful of ints.
+    """
+    CREATE TABLE IF NOT EXISTS ad_spend_history (
+        competitor_key INTEGER NOT NULL,
+        day            INTEGER NOT NULL,
+        ad_key         INTEGER NOT NULL,
+        spend_min      INTEGER NOT NULL,
+        spend_max      INTEGER NOT NULL,
+        span_days      INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY (competitor_key, day, ad_key)
+    ) WITHOUT ROWID;
+    """,
+]
+
+
+# ---------------------------------------------------------------------------
+# Day-number helpers
+# ---------------------------------------------------------------------------
+
+def day_number(d: date) -> int:
+    return d.toordinal() - EPOCH_ORDINAL
+
+
+def day_to_date(day: int) -> date:
+    return date.fromordinal(day + EPOCH_ORDINAL)
+
+
+def week_start(day: int) -> int:
+    """Day number of the Monday on or before `day` (1970-01-01 was a Thursday)."""
+    return day - ((day + 3) % 7)
+
+
+def _parse_day(value: str | None) -> int | None:
+    return day_number(date.fromisoformat(value)) if value else None
+
+
+# ---------------------------------------------------------------------------
+# Key interning
+# ---------------------------------------------------------------------------
+
+def intern_keys(conn: sqlite3.Connection, kind: str, values: Iterable[str]) -> dict[str, int]:
+    """Return {value: integer key}, creating keys for values not seen before."""
+    unique = sorted(set(values))
+    conn.executemany(
+        "INSERT OR IGNORE INTO history_keys (kind, value) VALUES (?, ?);",
+        [(kind, v) for v in unique],
+    )
+    rows = conn.execute(
+        "SELECT value, id FROM history_keys WHERE kind = ?;", [kind]
+    ).fetchall()
+    wanted = set(unique)
+    return {r[0]: r[1] for r in rows if r[0] in wanted}
+
+
+# ---------------------------------------------------------------------------
+# Writers
+# ---------------------------------------------------------------------------
+
+def _write_rows(conn: sqlite3.Connection, ads: list[Any], days_for: Any) -> int:
+    comp_keys = intern_keys(conn, "competitor", (a["competitor_name"] for a in ads))
+    ad_keys = intern_keys(conn, "ad", (a["ad_id"] for a in ads))
+
+    rows = [
+        (
+            comp_keys[a["competitor_name"]], day, ad_keys[a["ad_id"]],
+            a["estimated_spend_min"], a["estimated_spend_max"],
+        )
+        for a in ads
+        for day in days_for(a)
+    ]
+    # Re-snapshotting the same day replaces that day's row, so refreshes are
+    # idempotent; older days are never touched.
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO ad_spend_history (
+            competitor_key, day, ad_key, spend_min, spend_max, span_days
+        ) VALUES (?, ?, ?, ?, ?, 1);
+        """,
+        rows,
+    )
+    return len(rows)
+
+
+def _active_ads(conn: sqlite3.Connection) -> list[sqlite3.Row]:
+    return conn.execute(
+        """
+        SELECT ad_id, competitor_name, estimated_spend_min,
+               estimated_spend_max, start_date, end_date
+        FROM competitor_ads WHERE is_active = 1;
+        """
+    ).fetchall()
+
+
+def record_snapshot(conn: sqlite3.Connection, today: date | None = None) -> int:
+    """
+    Append today's spend estimate for every active ad, then apply retention.
+    Expects a get_db() connection (sqlite3.Row factory); caller commits.
+    """
+    day = day_number(today or date.today())
+    written = _write_rows(conn, _active_ads(conn), lambda _a: (day,))
+    downsample(conn, day)
+    conn.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?);", [_SNAPSHOT_DAY_KEY, day]
+    )
+    return written
+
+
+def last_snapshot_day(conn: sqlite3.Connection) -> int | None:
+    """Day number of the most recent record_snapshot(), if any."""
+    row = conn.execute("SELECT value FROM meta WHERE key = ?;", [_SNAPSHOT_DAY_KEY]).fetchone()
+    return row[0] if row else None
+
+
+def backfill_from_ads(conn: sqlite3.Connection, today: date | None = None) -> int:
+    """
+    Seed history for a fresh database, or one that predates history (a
+    schema backfill), by assuming each ad's current estimate held for every
+    day between its start_date and end_date (or today). Expects a sqlite3.Row
+    row factory; caller commits.
+    """
+    today_day = day_number(today or date.today())
+    ads = conn.execute(
+        """
+        SELECT ad_id, competitor_name, estimated_spend_min,
+               estimated_spend_max, start_date, end_date
+        FROM competitor_ads WHERE start_date IS NOT NULL;
+        """
+    ).fetchall()
+
+    def days_for(a: sqlite3.Row) -> range:
+        start = _parse_day(a["start_date"])
+        end = _parse_day(a["end_date"])
+        return range(start, min(end if end is not None else today_day, today_day) + 1)
+
+    written = _write_rows(conn, ads, days_for)
+    downsample(conn, today_day)
+    return written
+
+
+def downsample(
+    conn: sqlite3.Connection,
+    today_day: int,
+    daily_retention_days: int = DAILY_RETENTION_DAYS,
+) -> int:
+    """
+    Fold daily rows older than the retention window into weekly rows.
+    The cutoff is Monday-aligned so a week is never split across resolutions.
+    Returns the number of daily rows that were folded.
+    """
+    cutoff = week_start(today_day - daily_retention_days)
+
+    conn.execute("DROP TABLE IF EXISTS temp._history_rollup;")
+    conn.execute(
+        """
+        CREATE TEMP TABLE _history_rollup AS
+        SELECT competitor_key,
+               day - ((day + 3) % 7)                                  AS week_day,
+               ad_key,
+               CAST(ROUND(SUM(spend_min * span_days) * 1.0 / SUM(span_days)) AS INTEGER)
+                                                                      AS spend_min,
+               CAST(ROUND(SUM(spend_max * span_days) * 1.0 / SUM(span_days)) AS INTEGER)
+                                                                      AS spend_max,
+               SUM(span_days)                                         AS span_days
+        FROM ad_spend_history
+        WHERE span_days = 1 AND day < ?
+        GROUP BY competitor_key, week_day, ad_key;
+        """,
+        [cutoff],
+    )
+    folded = conn.execute(
+        "DELETE FROM ad_spend_history WHERE span_days = 1 AND day < ?;", [cutoff]
+    ).rowcount
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO ad_spend_history (
+            competitor_key, day, ad_key, spend_min, spend_max, span_days
+        )
+        SELECT competitor_key, week_day, ad_key, spend_min, spend_max, span_days
+        FROM _history_rollup;
+        """
+    )
+    conn.execute("DROP TABLE temp._history_rollup;")
+    return folded
+
+
+# ---------------------------------------------------------------------------
+# Range queries
+# ---------------------------------------------------------------------------
+
+def spend_series(
+    conn: sqlite3.Connection,
+    brand: str | None = None,
+    competitor: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    granularity: str = "day",
+) -> list[dict[str, Any]]:
+    """
+    Spend over time per competitor. Filters resolve to competitor keys first
+    so every scan is a range over the (competitor_key, day) primary key.
+    Rows already folded to weekly resolution report at their week's Monday.
+    The brand filter reads all_ads so competitors whose ads have all been
+    archived keep their history.
+    """
+    conditions = ["k.kind = 'competitor'"]
+    params: list[Any] = []
+    if competitor:
+        conditions.append("k.value = ?")
+        params.append(competitor)
+    if brand:
+        conditions.append(
+            "k.value IN (SELECT competitor_name FROM all_ads WHERE brand = ?)"
+        )
+        params.append(brand)
+
+    start_day = day_number(start) if start else -(2**31)
+    end_day = day_number(end) if end else 2**31
+    bucket = "h.day - ((h.day + 3) % 7)" if granularity == "week" else "h.day"
+
+    rows = conn.execute(
+        f"""
+        SELECT k.value                                              AS competitor_name,
+               {bucket}                                             AS bucket,
+               SUM((h.spend_min + h.spend_max) / 2.0 * h.span_days) AS total_spend,
+               COUNT(DISTINCT h.ad_key)                             AS ad_count
+        FROM history_keys k
+        JOIN ad_spend_history h
+          ON h.competitor_key = k.id AND h.day BETWEEN ? AND ?
+        WHERE {" AND ".join(conditions)}
+        GROUP BY k.value, bucket
+        ORDER BY k.value, bucket;
+        """,
+        [start_day, end_day, *params],
+    ).fetchall()
+
+    return [
+        {
+            "competitor_name": r["competitor_name"],
+            "date": day_to_date(r["bucket"]).isoformat(),
+            "total_spend": round(r["total_spend"]),
+            "ad_count": r["ad_count"],
+        }
+        for r in rows
+    ]
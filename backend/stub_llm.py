@@ -0,0 +1,195 @@
+"""
+stub_llm.py
+Local stand-in for the Anthropic Messages API, for exercising the LLM code
+paths end to end without network access or spend.
+
+    python stub_llm.py --port 8787 [--fail-every 5]
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8787 ANTHROPIC_API_KEY=stub uvicorn main:app
+
+POST /v1/messages answers in the real response shape:
+- requests that force the `record_labels` tool get a tool_use block
+  labelling every ad with the local ad_classifier;
+- anything else gets a short canned text reply.
+
+Usage is reported as ~4 characters per token. With --fail-every N, every
+Nth request gets a 529 overloaded error (Retry-After: 0) to exercise
+retries. With --slow-every N, every Nth request waits --slow-s seconds
+before answering, to exercise deadlines and hedging. Raw request bodies are kept on `server.requests` for inspection.
+
+Prompt caching is emulated: the prompt up to the last block marked with
+`cache_control` (system blocks first, then message content) is the cached
+prefix. Its exact bytes are kept on `server.prefixes`. The first request
+with a given prefix reports it as `cache_creation_input_tokens`, and later
+ones report it as `cache_read_input_tokens`. Prefixes shorter than
+--min-cache-tokens are not cached, as with the real API's per-model minimum.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int,
+        fail_every: int = 0,
+        min_cache_tokens: int = 0,
+        slow_every: int = 0,
+        slow_s: float = 0.0,
+    ) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.fail_every = fail_every
+        self.min_cache_tokens = min_cache_tokens
+        self.slow_every = slow_every
+        self.slow_s = slow_s
+        self.requests: list[bytes] = []
+        self.prefixes: list[bytes] = []
+        self.lock = threading.Lock()
+
+    def cache_usage(self, request: dict[str, Any]) -> dict[str, int]:
+        """Record the request's cacheable prefix and split its input tokens accordingly."""
+        total = len(json.dumps(request)) // 4
+        prefix = _cached_prefix(request)
+        if prefix is None:
+            return {"input_tokens": total}
+        tokens = len(prefix) // 4
+        with self.lock:
+            self.prefixes.append(prefix)
+            seen = self.prefixes.count(prefix) > 1
+        if tokens < self.min_cache_tokens:
+            return {"input_tokens": total, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        return {
+            "input_tokens": max(total - tokens, 0),
+            "cache_creation_input_tokens": 0 if seen else tokens,
+            "cache_read_input_tokens": tokens if seen else 0,
+        }
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+def _labels(ads: list[dict[str, str]]) -> list[dict[str, str]]:
+    import ad_classifier
+
+    out = ad_classifier.get_model().classify([ad["text"] for ad in ads])
+    return [
+        {
+            "id": ad["id"],
+            "message_theme": out["message_theme"][i],
+            "emotional_tone": out["emotional_tone"][i],
+            "summary": ad["text"].split("\n")[0][:80],
+        }
+        for i, ad in enumerate(ads)
+    ]
+
+
+def _cached_prefix(request: dict[str, Any]) -> bytes | None:
+    """Bytes of every prompt block up to the last one marked cache_control, or None."""
+    system = request.get("system") or []
+    blocks = [{"type": "text", "text": system}] if isinstance(system, str) else list(system)
+    for message in request.get("messages", []):
+        content = message["content"]
+        blocks += [{"type": "text", "text": content}] if isinstance(content, str) else content
+    marked = [i for i, block in enumerate(blocks) if block.get("cache_control")]
+    if not marked:
+        return None
+    return json.dumps(blocks[: marked[-1] + 1], sort_keys=True, ensure_ascii=False).encode()
+
+
+def _reply(request: dict[str, Any], n: int, usage: dict[str, int]) -> dict[str, Any]:
+    tool = (request.get("tool_choice") or {}).get("name")
+    if tool == "record_labels":
+        ads = json.loads(request["messages"][-1]["content"])
+        content: list[dict[str, Any]] = [{
+            "type": "tool_use", "id": f"toolu_stub_{n}", "name": tool,
+            "input": {"labels": _labels(ads)},
+        }]
+        stop_reason = "tool_use"
+    else:
+        content = [{"type": "text", "text": "- Stub insight one.\n- Stub insight two.\n- Stub insight three."}]
+        stop_reason = "end_turn"
+    return {
+        "id": f"msg_stub_{n}",
+        "type": "message",
+        "role": "assistant",
+        "model": request.get("model", "stub"),
+        "content": content,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": {**usage, "output_tokens": len(json.dumps(content)) // 4},
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StubServer
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def _send(self, status: int, body: dict[str, Any], headers: dict[str, str] | None = None) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (deadline passed, or a hedged twin won)
+
+    def do_POST(self) -> None:  # noqa: N802
+        raw = self.rfile.read(int(self.headers.get("content-length", 0)))
+        with self.server.lock:
+            self.server.requests.append(raw)
+            n = len(self.server.requests)
+        if self.path.rstrip("/") != "/v1/messages":
+            self._send(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+            return
+        if self.server.slow_every and n % self.server.slow_every == 0:
+            time.sleep(self.server.slow_s)
+        if self.server.fail_every and n % self.server.fail_every == 0:
+            self._send(
+                529,
+                {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}},
+                {"retry-after": "0"},
+            )
+            return
+        request = json.loads(raw)
+        self._send(200, _reply(request, n, self.server.cache_usage(request)))
+
+
+def serve_in_thread(
+    port: int = 0,
+    fail_every: int = 0,
+    min_cache_tokens: int = 0,
+    slow_every: int = 0,
+    slow_s: float = 0.0,
+) -> StubServer:
+    """Start a stub on `port` (0 = any free port) in a daemon thread."""
+    server = StubServer(port, fail_every, min_cache_tokens, slow_every, slow_s)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--fail-every", type=int, default=0)
+    parser.add_argument("--min-cache-tokens", type=int, default=0)
+    parser.add_argument("--slow-every", type=int, default=0)
+    parser.add_argument("--slow-s", type=float, default=0.0)
+    args = parser.parse_args()
+    StubServer(
+        args.port, args.fail_every, args.min_cache_tokens, args.slow_every, args.slow_s
+    ).serve_forever()
@@ -0,0 +1,185 @@
+"""
+weekly_spend.py
+Interval-based weekly spend: every ad's estimated daily spend is spread over
+each week it was actually running, instead of crediting its whole spend to
+the week it started.
+
+An ad runs over the half-open day range [start_date, end_date) — or up to
+today while still active — which matches how `days_running` is computed, so
+an ad's weekly amounts always add up to daily_spend × days_running.
+
+Week labels come from the `calendar_weeks` dimension table (one row per
+Monday-aligned week) rather than a per-row strftime.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from datetime import date
+from typing import TYPE_CHECKING, Any
+
+from spend_history import day_number, day_to_date, week_start
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# ---------------------------------------------------------------------------
+# Calendar dimension
+# ---------------------------------------------------------------------------
+
+CREATE_CALENDAR_SQL = """
+CREATE TABLE IF NOT EXISTS calendar_weeks (
+    week_start  INTEGER PRIMARY KEY,   -- day number of the Monday
+    label       TEXT NOT NULL,         -- '%Y-W%W', as previously returned by /api/trends
+    start_date  TEXT NOT NULL,
+    end_date    TEXT NOT NULL
+);
+"""
+
+
+# Weeks pre-populated at startup; anything outside falls back to computing
+# the label on the fly.
+CALENDAR_FIRST_YEAR = 2015
+CALENDAR_LAST_YEAR = 2040
+
+
+def _week_row(ws: int) -> tuple[int, str, str, str]:
+    monday = day_to_date(ws)
+    return ws, monday.strftime("%Y-W%W"), monday.isoformat(), day_to_date(ws + 6).isoformat()
+
+
+def populate_calendar(conn: sqlite3.Connection) -> None:
+    """Insert any missing calendar rows between CALENDAR_FIRST/LAST_YEAR."""
+    first = week_start(day_number(date(CALENDAR_FIRST_YEAR, 1, 1)))
+    last = week_start(day_number(date(CALENDAR_LAST_YEAR, 12, 31)))
+    conn.executemany(
+        "INSERT OR IGNORE INTO calendar_weeks (week_start, label, start_date, end_date) "
+        "VALUES (?, ?, ?, ?);",
+        [_week_row(ws) for ws in range(first, last + 1, 7)],
+    )
+
+
+def week_labels(conn: sqlite3.Connection, first_week: int, last_week: int) -> dict[int, str]:
+    labels = {
+        r[0]: r[1]
+        for r in conn.execute(
+            "SELECT week_start, label FROM calendar_weeks WHERE week_start BETWEEN ? AND ?;",
+            [first_week, last_week],
+        )
+    }
+    for ws in range(first_week, last_week + 1, 7):
+        if ws not in labels:
+            labels[ws] = _week_row(ws)[1]
+    return labels
+
+
+# ---------------------------------------------------------------------------
+# Interval engine
+# ---------------------------------------------------------------------------
+
+def spread_intervals(
+    starts: np.ndarray, ends: np.ndarray, daily: np.ndarray
+) -> tuple[int, np.ndarray, np.ndarray]:
+    """
+    Spread per-ad daily spend over [start, end) day ranges, bucketed by week.
+
+    Uses difference arrays: +daily at each start, -daily at each end, then a
+    cumulative sum gives spend per day. Cost is O(ads + days) with no per-ad
+    Python work. Returns (first week's day number, spend per week, number of
+    ads active in each week).
+    """
+    import numpy as np  # heavy; deferred so startup doesn't pay for it
+
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.maximum(np.asarray(ends, dtype=np.int64), starts)
+    daily = np.asarray(daily, dtype=np.float64)
+    if starts.size == 0:
+        return 0, np.zeros(0), np.zeros(0, dtype=np.int64)
+
+    origin = week_start(int(starts.min()))
+    n_weeks = (int(ends.max()) - origin) // 7 + 1
+    n_days = n_weeks * 7
+    s = starts - origin
+    e = ends - origin
+
+    delta = np.bincount(s, weights=daily, minlength=n_days + 1)
+    delta -= np.bincount(e, weights=daily, minlength=n_days + 1)
+    spend = np.cumsum(delta[:n_days]).reshape(n_weeks, 7).sum(axis=1)
+
+    # An ad counts towards every week its [start, end) range touches
+    running = e > s
+    first_wk = s[running] // 7
+    after_last_wk = (e[running] - 1) // 7 + 1
+    active = np.bincount(first_wk, minlength=n_weeks + 1)
+    active -= np.bincount(after_last_wk, minlength=n_weeks + 1)
+    counts = np.cumsum(active[:n_weeks])
+
+    return origin, spend, counts
+
+
+# ---------------------------------------------------------------------------
+# Query entrypoint
+# ---------------------------------------------------------------------------
+
+def weekly_spend(
+    conn: sqlite3.Connection, brand: str | None = None, today: date | None = None
+) -> list[dict[str, Any]]:
+    """Chart-ready weekly spend rows for /api/trends."""
+    import numpy as np
+
+    where = "AND brand = ?" if brand else ""
+    params: list[Any] = [day_number(today or date.today())]
+    if brand:
+        params.append(brand)
+
+    rows = conn.execute(
+        f"""
+        SELECT CAST(julianday(start_date) - 2440587.5 AS INTEGER),
+               COALESCE(CAST(julianday(end_date) - 2440587.5 AS INTEGER), ?),
+               (estimated_spend_min + estimated_spend_max) / 2.0
+        FROM competitor_ads
+        WHERE start_date IS NOT NULL {where};
+        """,
+        params,
+    ).fetchall()
+    if not rows:
+        return []
+
+    starts, ends, daily = (np.fromiter(col, dtype=np.float64, count=len(rows)) for col in zip(*rows))
+    return weekly_from_arrays(conn, starts.astype(np.int64), ends.astype(np.int64), daily)
+
+
+def weekly_from_arrays(
+    conn: sqlite3.Connection,
+    starts: np.ndarray,
+    ends: np.ndarray,
+    daily: np.ndarray,
+    carried: dict[int, tuple[float, int]] | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Labelled weekly rows for already-extracted start/end day numbers, plus
+    any `carried` per-week (spend, ad_count) already spread elsewhere — the
+    archived ads' rollup.
+    """
+    weeks: dict[int, list[float]] = {}
+    if len(starts):
+        origin, spend, counts = spread_intervals(starts, ends, daily)
+        weeks = {origin + i * 7: [float(spend[i]), int(counts[i])] for i in range(len(spend))}
+    for ws, (extra_spend, extra_count) in (carried or {}).items():
+        week = weeks.setdefault(ws, [0.0, 0])
+        week[0] += extra_spend
+        week[1] += extra_count
+    if not weeks:
+        return []
+
+    first, last = min(weeks), max(weeks)
+    labels = week_labels(conn, first, last)
+    return [
+        {
+            "week": labels[ws],
+            "week_start": day_to_date(ws).isoformat(),
+            "total_spend": round(weeks.get(ws, (0.0, 0))[0]),
+            "ad_count": int(weeks.get(ws, (0.0, 0))[1]),
+        }
+        for ws in range(first, last + 1, 7)
+    ]
@@ -1,13 +1,24 @@
-import type { AdsResponse, CompetitorsResponse } from './types'
+import type {
+  Ad,
+  AdsResponse,
+  CompetitorsResponse,
+  DashboardResponse,
+  DashboardSection,
+  FacetsResponse,
+} from './types'
 
 export const API_BASE = (import.meta.env.VITE_API_URL as string | undefined) ?? 'http://localhost:8000'
 
+export const AD_TEXT_LIMIT = 140
+
 export async function fetchAds(params: {
   brand?: string
   ad_format?: string
 }): Promise<AdsResponse> {
   const url = new URL(`${API_BASE}/api/ads`)
   url.searchParams.set('limit', '200')
+  // Cards clamp the body to three lines; the full text is fetched on demand
+  url.searchParams.set('text_limit', String(AD_TEXT_LIMIT))
   if (params.brand) url.searchParams.set('brand', params.brand)
   if (params.ad_format) url.searchParams.set('ad_format', params.ad_format)
 
@@ -16,6 +27,12 @@ export async function fetchAds(params: {
   return res.json()
 }
 
+export async function fetchAd(adId: string): Promise<Ad> {
+  const res = await fetch(`${API_BASE}/api/ads/${encodeURIComponent(adId)}`)
+  if (!res.ok) throw new Error(`Failed to fetch ad: ${res.status}`)
+  return res.json()
+}
+
 export async function fetchCompetitors(brand?: string): Promise<CompetitorsResponse> {
   const url = new URL(`${API_BASE}/api/competitors`)
   if (brand) url.searchParams.set('brand', brand)
@@ -24,3 +41,49 @@ export async function fetchCompetitors(brand?: string): Promise<CompetitorsRespo
   if (!res.ok) throw new Error(`Failed to fetch competitors: ${res.status}`)
   return res.json()
 }
+
+export async function fetchFacets(params: {
+  brand?: string
+  ad_format?: string
+}): Promise<FacetsResponse> {
+  const url = new URL(`${API_BASE}/api/facets`)
+  if (params.brand) url.searchParams.set('brand', params.brand)
+  if (params.ad_format) url.searchParams.set('ad_format', params.ad_format)
+
+  const res = await fetch(url.toString())
+  if (!res.ok) throw new Error(`Failed to fetch facets: ${res.status}`)
+  return res.json()
+}
+
+// Last full dashboard per URL. Its section ETags go back in If-None-Match so
+// the server can leave unchanged sections out of the response.
+const dashboardCache = new Map<string, DashboardResponse>()
+
+export async function fetchDashboard(params: {
+  brand?: string
+  ad_format?: string
+}): Promise<DashboardResponse> {
+  const url = new URL(`${API_BASE}/api/dashboard`)
+  url.searchParams.set('limit', '200')
+  url.searchParams.set('text_limit', String(AD_TEXT_LIMIT))
+  if (params.brand) url.searchParams.set('brand', params.brand)
+  if (params.ad_format) url.searchParams.set('ad_format', params.ad_format)
+
+  const key = url.toString()
+  const cached = dashboardCache.get(key)
+  const headers: Record<string, string> = {}
+  if (cached) headers['If-None-Match'] = Object.values(cached.etags).join(', ')
+
+  const res = await fetch(key, { headers })
+  if (res.status === 304 && cached) return cached
+  if (!res.ok) throw new Error(`Failed to fetch dashboard: ${res.status}`)
+
+  const body: DashboardResponse & { not_modified: DashboardSection[] } = await res.json()
+  const { not_modified, ...merged } = body
+  for (const section of not_modified) {
+    if (!cached) throw new Error(`Dashboard section ${section} missing from response`)
+    Object.assign(merged, { [section]: cached[section] })
+  }
+  dashboardCache.set(key, merged)
+  return merged
+}
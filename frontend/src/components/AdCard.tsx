@@ -1,3 +1,6 @@
+import { useQuery } from '@tanstack/react-query'
+import { useState } from 'react'
+import { API_BASE, fetchAd } from '../api'
 import type { Ad } from '../types'
 
 const BRAND_STYLES: Record<string, { pill: string; border: string }> = {
@@ -44,11 +47,30 @@ export function AdCard({ ad }: { ad: Ad }) {
   const themePill  = THEME_PILL[ad.message_theme] ?? 'bg-slate-100 text-slate-600'
   const isLongRunning = ad.days_running >= 60
 
+  const [expanded, setExpanded] = useState(false)
+  const { data: full } = useQuery({
+    queryKey: ['ad', ad.ad_id],
+    queryFn: () => fetchAd(ad.ad_id),
+    enabled: expanded && !!ad.body_truncated,
+    staleTime: Infinity,
+  })
+  const bodyText = expanded && full ? full.body_text : ad.body_text
+
   return (
     <div
       className={`flex flex-col bg-white rounded-xl border border-slate-200 border-l-4
                   ${brandStyle.border} shadow-sm hover:shadow-md transition-shadow duration-200`}
     >
+      {ad.thumbnail_url && (
+        <img
+          src={`${API_BASE}${ad.thumbnail_url}`}
+          alt=""
+          loading="lazy"
+          decoding="async"
+          className="w-full h-40 object-cover rounded-tr-xl bg-slate-100"
+        />
+      )}
+
       {/* Header */}
       <div className="px-4 pt-4 pb-3 border-b border-slate-100">
         <div className="flex items-start justify-between gap-2 mb-2">
@@ -95,9 +117,18 @@ export function AdCard({ ad }: { ad: Ad }) {
         <p className="text-sm font-semibold text-slate-800 mb-1 line-clamp-2 leading-snug">
           {ad.headline}
         </p>
-        <p className="text-xs text-slate-500 line-clamp-3 leading-relaxed">
-          {ad.body_text}
+        <p className={`text-xs text-slate-500 leading-relaxed ${expanded ? '' : 'line-clamp-3'}`}>
+          {bodyText}
         </p>
+        {ad.body_truncated && (
+          <button
+            type="button"
+            onClick={() => setExpanded((v) => !v)}
+            className="mt-1 text-[10px] font-semibold text-indigo-600 hover:text-indigo-700"
+          >
+            {expanded ? 'Show less' : 'Show more'}
+          </button>
+        )}
       </div>
 
       {/* Footer */}
@@ -1,6 +1,6 @@
 import { useQuery } from '@tanstack/react-query'
 import { useMemo } from 'react'
-import { fetchAds } from '../api'
+import { fetchDashboard } from '../api'
 import { useFilterStore } from '../store'
 import type { Ad } from '../types'
 import { AdCard } from './AdCard'
@@ -46,10 +46,12 @@ interface AdGridProps {
 export function AdGrid({ onCountsReady }: AdGridProps) {
   const { brand, format, dateRange } = useFilterStore()
 
+  // Shares one /api/dashboard request with CompetitorSummaryBar
   const { data, isLoading, isError } = useQuery({
-    queryKey: ['ads', brand, format],
-    queryFn: () => fetchAds({ brand: brand || undefined, ad_format: format || undefined }),
+    queryKey: ['dashboard', brand, format],
+    queryFn: () => fetchDashboard({ brand: brand || undefined, ad_format: format || undefined }),
     staleTime: 30_000,
+    select: (d) => d.ads,
   })
 
   const filtered = useMemo(() => {
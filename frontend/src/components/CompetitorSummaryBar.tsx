@@ -1,5 +1,5 @@
 import { useQuery } from '@tanstack/react-query'
-import { fetchCompetitors } from '../api'
+import { fetchDashboard } from '../api'
 import { useFilterStore } from '../store'
 import type { Competitor } from '../types'
 
@@ -104,10 +104,15 @@ function SkeletonCard() {
 
 export function CompetitorSummaryBar() {
   const brand = useFilterStore((s) => s.brand)
+  const format = useFilterStore((s) => s.format)
 
+  // Same query as AdGrid; a format change re-sends the competitors ETag, so
+  // the unchanged section isn't downloaded again
   const { data, isLoading, isError } = useQuery({
-    queryKey: ['competitors', brand],
-    queryFn: () => fetchCompetitors(brand || undefined),
+    queryKey: ['dashboard', brand, format],
+    queryFn: () => fetchDashboard({ brand: brand || undefined, ad_format: format || undefined }),
+    staleTime: 30_000,
+    select: (d) => d.competitors,
   })
 
   return (
@@ -1,5 +1,7 @@
+import { useQuery } from '@tanstack/react-query'
+import { fetchFacets } from '../api'
 import { useFilterStore } from '../store'
-import type { BrandFilter, DateRangeFilter, FormatFilter } from '../types'
+import type { BrandFilter, DateRangeFilter, FacetValue, FormatFilter } from '../types'
 
 const BRANDS: { value: BrandFilter; label: string }[] = [
   { value: '', label: 'All Brands' },
@@ -22,12 +24,28 @@ const DATE_RANGES: { value: DateRangeFilter; label: string }[] = [
   { value: '60', label: 'Last 60 days' },
 ]
 
+/** Appends "(n)" to an option label; the "All" option sums every value. */
+function withCount(label: string, value: string, facet: FacetValue[] | undefined): string {
+  if (!facet) return label
+  const count =
+    value === ''
+      ? facet.reduce((sum, f) => sum + f.count, 0)
+      : facet.find((f) => f.value === value)?.count ?? 0
+  return `${label} (${count})`
+}
+
 export function FilterBar({ totalShown, totalAll }: { totalShown: number; totalAll: number }) {
   const { brand, format, dateRange, setBrand, setFormat, setDateRange, resetFilters } =
     useFilterStore()
 
   const isFiltered = brand !== '' || format !== '' || dateRange !== 'all'
 
+  const { data: facets } = useQuery({
+    queryKey: ['facets', brand, format],
+    queryFn: () => fetchFacets({ brand: brand || undefined, ad_format: format || undefined }),
+    staleTime: 30_000,
+  })
+
   return (
     <div className="sticky top-0 z-10 bg-white border-b border-slate-200 shadow-sm">
       <div className="max-w-7xl mx-auto px-4 py-3 flex flex-wrap items-center gap-3">
@@ -44,7 +62,7 @@ export function FilterBar({ totalShown, totalAll }: { totalShown: number; totalA
         >
           {BRANDS.map((b) => (
             <option key={b.value} value={b.value}>
-              {b.label}
+              {withCount(b.label, b.value, facets?.facets.brand)}
             </option>
           ))}
         </select>
@@ -58,7 +76,7 @@ export function FilterBar({ totalShown, totalAll }: { totalShown: number; totalA
         >
           {FORMATS.map((f) => (
             <option key={f.value} value={f.value}>
-              {f.label}
+              {withCount(f.label, f.value, facets?.facets.ad_format)}
             </option>
           ))}
         </select>
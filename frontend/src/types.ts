@@ -22,6 +22,10 @@ export interface Ad {
   country: string
   source: string
   created_at: string
+  /** Set when the list was requested with text_limit and body_text was cut */
+  body_truncated?: boolean
+  /** Path of the cached creative thumbnail under API_BASE, if one has been fetched */
+  thumbnail_url?: string | null
 }
 
 export interface Competitor {
@@ -37,7 +41,8 @@ export interface Competitor {
 
 export interface AdsResponse {
   data: Ad[]
-  total: number
+  total: number | null
+  total_exact: boolean
   count: number
   limit: number
   offset: number
@@ -48,6 +53,39 @@ export interface CompetitorsResponse {
   count: number
 }
 
+export interface ChartPoint {
+  name: string
+  value: number
+}
+
+export interface TrendsResponse {
+  format_distribution: ChartPoint[]
+  theme_distribution: ChartPoint[]
+  tone_distribution: ChartPoint[]
+  weekly_spend: { week: string; week_start: string; total_spend: number; ad_count: number }[]
+  [key: string]: unknown
+}
+
+export type DashboardSection = 'ads' | 'competitors' | 'trends'
+
+export interface DashboardResponse {
+  ads: AdsResponse
+  competitors: CompetitorsResponse
+  trends: TrendsResponse
+  etags: Record<DashboardSection, string>
+  data_version: number
+}
+
+export interface FacetValue {
+  value: string | boolean
+  count: number
+}
+
+export interface FacetsResponse {
+  total: number
+  facets: Record<'brand' | 'competitor' | 'theme' | 'tone' | 'ad_format' | 'is_active', FacetValue[]>
+}
+
 export type BrandFilter = 'bebodywise' | 'man_matters' | 'little_joys' | ''
 export type FormatFilter = 'static' | 'video' | 'carousel' | ''
 export type DateRangeFilter = '7' | '30' | '60' | 'all'